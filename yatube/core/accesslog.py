@@ -0,0 +1,174 @@
+"""Структурированный access log, который не блокирует запросы.
+
+Поток запроса только кладет запись в ограниченную очередь; JSON
+форматирует и пишет на диск фоновый поток, забирая из очереди все, что
+накопилось, и записывая пачку одним вызовом write. Если диск не
+успевает и очередь заполнена, запись отбрасывается, а счетчик dropped
+(и метрика yatube_access_log_dropped_total) растет.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+from . import metrics
+
+FIELDS = (
+    'method', 'path', 'view', 'status', 'duration_ms', 'db_queries',
+    'db_ms', 'template_ms', 'cache', 'cache_hits', 'cache_misses', 'user_id',
+)
+
+DROPPED = metrics.registry.counter(
+    'yatube_access_log_dropped_total',
+    'Записи access log, отброшенные из-за полной очереди.')
+
+_STOP = object()
+
+
+class JSONFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON с полями запроса из extra."""
+
+    def format(self, record):
+        line = {
+            'ts': datetime.fromtimestamp(
+                record.created, timezone.utc).isoformat(),
+        }
+        for field in FIELDS:
+            if hasattr(record, field):
+                line[field] = getattr(record, field)
+        if record.exc_info:
+            line['exc'] = self.formatException(record.exc_info)
+        return json.dumps(line, ensure_ascii=False, default=str)
+
+
+class BufferedJSONHandler(logging.Handler):
+    """Пишет записи в файл из фонового потока пачками с ротацией по размеру.
+
+    max_bytes и backup_count работают как у RotatingFileHandler,
+    capacity - размер очереди, batch_size - наибольшая пачка.
+    """
+
+    def __init__(self, filename, max_bytes=50 * 1024 * 1024, backup_count=5,
+                 capacity=10000, batch_size=500):
+        super().__init__()
+        self.filename = os.path.abspath(filename)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.written = 0
+        self._stream = None
+        self._size = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        """Запускает фоновый поток, в том числе заново после fork."""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Очередь родителя могла остаться заблокированной его потоком.
+            self._queue = queue.Queue(self.capacity)
+            self._stream = None
+            self._thread = threading.Thread(
+                target=self._run, name='access-log-writer', daemon=True)
+            self._thread.start()
+
+    def emit(self, record):
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            DROPPED.inc()
+
+    def flush(self):
+        """Ждет, пока фоновый поток запишет все, что уже в очереди."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        super().close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            stop = _STOP in batch
+            records = [record for record in batch if record is not _STOP]
+            try:
+                if records:
+                    self._write(records)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                if self._stream is not None:
+                    self._stream.close()
+                    self._stream = None
+                return
+
+    def _write(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        data = ''.join(line + '\n' for line in lines).encode('utf-8')
+        try:
+            if (self.max_bytes and self._size
+                    and self._size + len(data) > self.max_bytes):
+                self._rotate()
+            if self._stream is None:
+                self._open()
+            self._stream.write(data)
+            self._stream.flush()
+        except OSError:
+            self.handleError(records[-1])
+            return
+        self._size += len(data)
+        self.written += len(lines)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        self._stream = open(self.filename, 'ab')
+        self._size = self._stream.tell()
+
+    def _rotate(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        if self.backup_count > 0:
+            for number in range(self.backup_count - 1, 0, -1):
+                source = f'{self.filename}.{number}'
+                if os.path.exists(source):
+                    os.replace(source, f'{self.filename}.{number + 1}')
+            if os.path.exists(self.filename):
+                os.replace(self.filename, f'{self.filename}.1')
+        elif os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+def start():
+    """Запускает писателей всех настроенных BufferedJSONHandler."""
+    loggers = [logging.root, *logging.root.manager.loggerDict.values()]
+    for logger in loggers:
+        for handler in getattr(logger, 'handlers', ()):
+            if isinstance(handler, BufferedJSONHandler):
+                handler.start()
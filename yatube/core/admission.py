@@ -0,0 +1,121 @@
+"""Допуск запросов и сброс нагрузки.
+
+AdmissionMiddleware считает запросы в работе - всего в процессе и по
+имени URL - и среднюю задержку каждого view за последние WINDOW
+секунд. Пока лимиты не превышены, пропускается все. При перегрузке
+первыми отбрасываются низкоприоритетные запросы: страницы глубже
+DEEP_PAGE и анонимные просмотры view с SHED_ANONYMOUS. Они получают
+последнюю копию страницы из общего кэша (core.pagecache.stale), а если
+ее нет - 503 с Retry-After. Остальные GET отбрасываются, только когда
+запросов в процессе больше MAX_INFLIGHT; записи (не GET/HEAD) и view с
+PROTECTED не отбрасываются никогда.
+
+Лимиты view задаются по имени URL в ADMISSION['VIEWS'] поверх
+ADMISSION['DEFAULT']. Счетчики свои у каждого процесса, поэтому и
+лимиты - на процесс сервера приложений.
+"""
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+
+from . import metrics, pagecache
+
+SHED = metrics.registry.counter(
+    'yatube_requests_shed_total', 'Запросы, отброшенные при перегрузке.',
+    ('view', 'reason', 'result'))
+
+
+def config():
+    return settings.ADMISSION
+
+
+def rules(view):
+    return {**config()['DEFAULT'], **config()['VIEWS'].get(view, {})}
+
+
+class Load:
+    """Запросы в работе и недавние задержки по view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.total = 0
+            self.inflight = collections.Counter()
+            self.samples = collections.defaultdict(collections.deque)
+
+    def enter(self, view):
+        with self._lock:
+            self.total += 1
+            self.inflight[view] += 1
+
+    def leave(self, view, duration):
+        with self._lock:
+            self.total -= 1
+            self.inflight[view] -= 1
+            self.samples[view].append((time.monotonic(), duration))
+            self._trim(view)
+
+    def latency(self, view):
+        """Средняя задержка view за окно или 0, если запросов не было."""
+        with self._lock:
+            samples = self._trim(view)
+            if not samples:
+                return 0.0
+            return sum(duration for _, duration in samples) / len(samples)
+
+    def _trim(self, view):
+        samples = self.samples[view]
+        border = time.monotonic() - config()['WINDOW']
+        while samples and samples[0][0] < border:
+            samples.popleft()
+        return samples
+
+
+load = Load()
+
+
+def low_priority(request, rule):
+    if rule['SHED_ANONYMOUS'] and not request.user.is_authenticated:
+        return True
+    page = request.GET.get('page', '')
+    return rule['DEEP_PAGE'] is not None and page.isdigit() and (
+        int(page) > rule['DEEP_PAGE'])
+
+
+def decide(request, view):
+    """Причина отказа или None, если запрос допускается."""
+    rule = rules(view)
+    if request.method not in ('GET', 'HEAD') or rule['PROTECTED']:
+        return None
+    if load.total >= config()['MAX_INFLIGHT']:
+        return 'process'
+    if not low_priority(request, rule):
+        return None
+    if load.inflight[view] >= rule['MAX_INFLIGHT']:
+        return 'inflight'
+    if load.latency(view) > rule['MAX_LATENCY']:
+        return 'latency'
+    return None
+
+
+def shed(request, view, reason):
+    """Копия страницы из кэша или 503 вместо выполнения view."""
+    response = pagecache.stale(request)
+    result = 'stale'
+    if response is None:
+        retry_after = config()['RETRY_AFTER']
+        response = render(
+            request, 'core/503.html', {'retry_after': retry_after},
+            status=503)
+        response['Retry-After'] = str(retry_after)
+        result = 'rejected'
+    patch_cache_control(response, private=True, no_cache=True)
+    SHED.inc(view=view, reason=reason, result=result)
+    return response
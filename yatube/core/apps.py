@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import generations, invalidation, mail  # noqa: F401
+        generations.install()
+        invalidation.install()
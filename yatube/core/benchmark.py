@@ -0,0 +1,344 @@
+"""Нагрузочный прогон всех страниц posts, users и about.
+
+Сценарии собираются из urlpatterns приложений, параметры адресов берутся
+из уже заполненной базы (см. команду seed). Каждый адрес проверяется
+анонимно и от имени пользователя, у постраничных лент дополнительно
+измеряется последняя страница.
+"""
+import importlib
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.testcases import LiveServerThread
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+
+from core import metrics
+from posts import counters
+from posts.models import Group, Post, User
+
+URL_MODULES = ('posts.urls', 'users.urls', 'about.urls')
+
+# Эти адреса меняют данные, поэтому их запросы выполняются строго
+# по очереди внутри раунда: сначала подписка, потом отписка.
+WRITE_VIEWS = ('posts:profile_follow', 'posts:profile_unfollow')
+
+
+class Scenario:
+    def __init__(self, name, view_name, path, auth):
+        self.name = name
+        self.view_name = view_name
+        self.path = path
+        self.auth = auth
+
+
+class Measurements:
+    """Накопленные замеры одного сценария."""
+
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.statuses = {}
+        self._lock = threading.Lock()
+
+    def add(self, latency, status, queries=None):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if queries is not None:
+                self.queries.append(queries)
+
+    def summary(self):
+        """Задержки сценария; запросы/с считает только summarize()."""
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'mean_ms': (
+                sum(latencies) / len(latencies) * 1000 if latencies else 0.0),
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            # Медиана: редкий запрос с чужой работой (промах кэша,
+            # сброс счетчиков) не сдвигает число запросов сценария.
+            'queries': (
+                percentile(sorted(self.queries), 50)
+                if self.queries else None
+            ),
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+        }
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга для отсортированного списка."""
+    if not values:
+        return 0.0
+    index = max(math.ceil(rank / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def server_timing_queries(header):
+    """Число SQL-запросов из заголовка Server-Timing, если он есть."""
+    match = re.search(r'db;[^,]*desc="(\d+) queries"', header)
+    return int(match.group(1)) if match else None
+
+
+def bench_users(count):
+    """Пользователи с наибольшим числом подписок: их лента самая тяжелая."""
+    return list(
+        User.objects.annotate(follows=Count('follower'))
+        .order_by('-follows', 'pk')[:count]
+    )
+
+
+def sample_kwargs(user):
+    """Значения параметров адресов, взятые из базы."""
+    group = (
+        Group.objects.annotate(posts=Count('group'))
+        .order_by('-posts').first()
+    )
+    authors = list(
+        User.objects.exclude(pk=user.pk).annotate(total=Count('posts'))
+        .order_by('-total')[:1]
+    )
+    author = authors[0] if authors else user
+    post = Post.objects.order_by('-pub_date').first()
+    own_post = Post.objects.filter(author=user).first()
+    samples = {
+        'slug': group.slug if group else None,
+        'username': author.username,
+        'post_id': post.pk if post else None,
+    }
+    overrides = {
+        'posts:post_edit': {'post_id': own_post.pk if own_post else None},
+    }
+    return samples, overrides
+
+
+def page_depths(client, view_name, path):
+    """Первая страница адреса и, если лента длиннее, последняя.
+
+    Адрес без GET не дает ни одной.
+    """
+    paths = [('shallow', path)]
+    if view_name in WRITE_VIEWS:
+        return paths
+    response = client.get(path)
+    if response.status_code == 405:
+        # Только POST (лайки): GET-прогоном такой адрес не измерить.
+        return []
+    page_obj = (response.context or {}).get('page_obj')
+    if page_obj and page_obj.paginator.num_pages > 1:
+        paths.append(
+            ('deep', f'{path}?page={page_obj.paginator.num_pages}'))
+    return paths
+
+
+def discover(user):
+    """Собирает сценарии; глубину лент узнает по контексту ответа."""
+    samples, overrides = sample_kwargs(user)
+    scenarios = []
+    try:
+        setup_test_environment()
+        owns_environment = True
+    except RuntimeError:
+        # Уже внутри тестового окружения, например при запуске из тестов.
+        owns_environment = False
+    try:
+        client = Client()
+        client.force_login(user)
+        for module_name in URL_MODULES:
+            module = importlib.import_module(module_name)
+            for pattern in module.urlpatterns:
+                view_name = f'{module.app_name}:{pattern.name}'
+                values = {**samples, **overrides.get(view_name, {})}
+                kwargs = {
+                    name: values.get(name)
+                    for name in pattern.pattern.converters
+                }
+                if None in kwargs.values():
+                    continue
+                path = reverse(view_name, kwargs=kwargs)
+                for depth, url in page_depths(client, view_name, path):
+                    for auth in (False, True):
+                        kind = 'auth' if auth else 'anon'
+                        scenarios.append(Scenario(
+                            f'{view_name}[{kind}][{depth}]',
+                            view_name, url, auth,
+                        ))
+    finally:
+        if owns_environment:
+            teardown_test_environment()
+    return scenarios
+
+
+def settle():
+    """Сбрасывает накопленные просмотры постов до замера запроса.
+
+    Иначе их сброс по request_finished (posts.counters) попадет в
+    случайный запрос и в его задержку и число SQL-запросов.
+    """
+    store = counters.store()
+    if isinstance(store, counters.MemoryStore):
+        store.flush()
+
+
+def run_client(scenarios, user, rounds, warmup=1):
+    """Прогон через тестовый клиент в том же процессе."""
+    clients = {False: Client(), True: Client()}
+    clients[True].force_login(user)
+    measurements = {scenario.name: Measurements() for scenario in scenarios}
+    started = time.perf_counter()
+    for round_number in range(warmup + rounds):
+        if round_number == warmup:
+            started = time.perf_counter()
+        for scenario in scenarios:
+            client = clients[scenario.auth]
+            settle()
+            with CaptureQueriesContext(connection) as queries:
+                begin = time.perf_counter()
+                response = client.get(scenario.path)
+                latency = time.perf_counter() - begin
+            if round_number >= warmup:
+                measurements[scenario.name].add(
+                    latency, response.status_code, len(queries))
+    return summarize(measurements, time.perf_counter() - started)
+
+
+def start_server():
+    server = LiveServerThread('127.0.0.1', lambda handler: handler)
+    server.daemon = True
+    server.start()
+    server.is_ready.wait()
+    if server.error:
+        raise server.error
+    return server
+
+
+def run_http(scenarios, users, rounds, concurrency, base_url=None, warmup=1):
+    """Конкурентный прогон по HTTP, по умолчанию против локального сервера.
+
+    Каждый поток ходит от имени своего пользователя, поэтому подписки
+    и отписки разных потоков не мешают друг другу.
+    """
+    server = None
+    if base_url is None:
+        server = start_server()
+        base_url = f'http://127.0.0.1:{server.port}'
+    measurements = {scenario.name: Measurements() for scenario in scenarios}
+    cookies = []
+    for user in users[:concurrency]:
+        client = Client()
+        client.force_login(user)
+        cookies.append({
+            name: morsel.value for name, morsel in client.cookies.items()})
+
+    # Пропускная способность считается с конца прогрева первого потока.
+    started = []
+
+    def worker(number):
+        sessions = {False: requests.Session(), True: requests.Session()}
+        sessions[True].cookies.update(cookies[number % len(cookies)])
+        for round_number in range(warmup + rounds):
+            if round_number == warmup:
+                started.append(time.perf_counter())
+            for scenario in scenarios:
+                settle()
+                begin = time.perf_counter()
+                response = sessions[scenario.auth].get(
+                    base_url + scenario.path, allow_redirects=False)
+                latency = time.perf_counter() - begin
+                if round_number >= warmup:
+                    measurements[scenario.name].add(
+                        latency, response.status_code,
+                        server_timing_queries(
+                            response.headers.get('Server-Timing', '')))
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker, n) for n in range(concurrency)]:
+                future.result()
+    finally:
+        if server is not None:
+            server.terminate()
+    finished = time.perf_counter()
+    return summarize(measurements, finished - min(started, default=finished))
+
+
+def summarize(measurements, elapsed):
+    """rps - замеренные запросы за время прогона без прогрева."""
+    scenarios = {
+        name: item.summary() for name, item in measurements.items()
+    }
+    total = sum(item['requests'] for item in scenarios.values())
+    return {
+        'elapsed_s': elapsed,
+        'rps': total / elapsed if elapsed else 0.0,
+        'scenarios': scenarios,
+    }
+
+
+def _samples(snapshot, name):
+    return {
+        key[0]: value
+        for key, value in snapshot.get(name, {}).get('samples', [])
+    }
+
+
+def template_timings(before, after):
+    """Время шаблонов за прогон: разница двух снимков core.metrics."""
+    durations = [
+        _samples(snapshot, metrics.TEMPLATE_DURATION.name)
+        for snapshot in (before, after)
+    ]
+    renders = [
+        _samples(snapshot, metrics.TEMPLATE_RENDERS.name)
+        for snapshot in (before, after)
+    ]
+    own = [
+        _samples(snapshot, metrics.TEMPLATE_SELF.name)
+        for snapshot in (before, after)
+    ]
+    timings = {}
+    for name, value in durations[1].items():
+        previous = durations[0].get(name, [0, 0])
+        requests = value[-1] - previous[-1]
+        if not requests:
+            continue
+        timings[name] = {
+            'requests': requests,
+            'renders': renders[1].get(name, 0) - renders[0].get(name, 0),
+            'total_ms': (value[-2] - previous[-2]) * 1000,
+            'self_ms': (own[1].get(name, 0) - own[0].get(name, 0)) * 1000,
+        }
+    return timings
+
+
+def compare(results, baseline, threshold, metric='p95_ms'):
+    """Возвращает список регрессий относительно сохраненного прогона."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current[metric] > previous[metric] * (1 + threshold):
+            regressions.append(
+                f'{name}: {metric} {current[metric]:.1f} '
+                f'> {previous[metric]:.1f} (+{threshold:.0%})'
+            )
+        # Старые прогоны хранили среднее, поэтому числа округляются.
+        if (current['queries'] is not None
+                and previous.get('queries') is not None
+                and round(current['queries']) > round(previous['queries'])):
+            regressions.append(
+                f'{name}: запросов к БД {current["queries"]:.0f} '
+                f'> {previous["queries"]:.0f}'
+            )
+    return regressions
@@ -0,0 +1,247 @@
+"""Поколения таблиц: счетчик в кэше, растущий при каждой записи в таблицу.
+
+Производные данные в кэше (число постов, списки id лент и т.п.)
+хранятся вместе с поколениями таблиц, из которых получены, и считаются
+устаревшими, как только выросло поколение любой из них. Записи
+замечает обертка execute на каждом соединении, поэтому учитываются и
+bulk_create, и update(), и сырой SQL.
+
+Запись внутри транзакции поднимает поколение только после commit.
+Пока транзакция с записями не завершена, caching_allowed() ложно:
+прочитанное в ней нельзя класть в общий кэш, после отката оно было бы
+неверным. Ложно оно и в запросе, привязанном к основной базе после
+записи пользователя (см. core.replicas).
+
+Кроме поколения у таблицы есть эпоха - она растет только от записей
+в обход сигналов модели (bulk_create, update(), сырой SQL). Данные,
+которые обработчики сигналов поддерживают сами, достаточно сверять
+с эпохой. Для этого модель регистрируется через bracket(); записи
+остальных таблиц всегда поднимают и эпоху.
+
+Записи внутри untracked() поколений не поднимают: так пишутся
+счетчики, которым можно отставать в кэше (см. posts.counters).
+
+Счетчики живут в кэше default, поэтому при нескольких процессах он
+должен быть общим (memcached, redis): с локальным кэшем процесс не
+увидит чужих записей.
+"""
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+
+from . import replicas
+
+KEY = 'generation:{}'
+BORN = 'generation-born:{}'
+
+WRITE_RE = re.compile(
+    r'^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+[`"]?(\w+)', re.I)
+TRUNCATE_RE = re.compile(r'^\s*TRUNCATE\b(.*)', re.I | re.S)
+
+_local = threading.local()
+_listeners = []
+_bracketed = {}
+
+
+def _initial():
+    # Если ключ вытеснен из кэша, новое поколение все равно больше
+    # любого из прежних, и старые записи не оживут.
+    return time.time_ns() // 1000
+
+
+def _create(name):
+    value = _initial()
+    if cache.add(KEY.format(name), value, None):
+        cache.set(BORN.format(name), value, None)
+    return cache.get(KEY.format(name))
+
+
+def current(*names):
+    """Текущие поколения (таблиц или любых других имен) в том же порядке."""
+    keys = [KEY.format(name) for name in names]
+    values = cache.get_many(keys)
+    for name, key in zip(names, keys):
+        if key not in values:
+            values[key] = _create(name)
+    return tuple(values[key] for key in keys)
+
+
+def bump(*names):
+    """Поднимает поколения и возвращает новые значения."""
+    values = []
+    for name in names:
+        try:
+            values.append(cache.incr(KEY.format(name)))
+        except ValueError:
+            # Подъем заново созданного поколения все равно виден как
+            # подъем: значение больше born().
+            _create(name)
+            values.append(cache.incr(KEY.format(name)))
+    return tuple(values)
+
+
+def born(name):
+    """Значение, с которым поколение последний раз создано, или None.
+
+    Поколение, равное своему born() и большее прежнего значения, не
+    поднимали, а создали заново: ключ вытеснили из кэша.
+    """
+    return cache.get(BORN.format(name))
+
+
+def epoch(table):
+    """Имя поколения для записей в таблицу в обход сигналов."""
+    return f'{table}:epoch'
+
+
+def written_tables(sql):
+    """Таблицы, которые меняет SQL-запрос."""
+    match = WRITE_RE.match(sql)
+    if match:
+        return {match.group(1)}
+    match = TRUNCATE_RE.match(sql)
+    if match:
+        known = {
+            model._meta.db_table
+            for model in apps.get_models(include_auto_created=True)
+        }
+        return set(re.findall(r'\w+', match.group(1))) & known
+    return set()
+
+
+def _brackets():
+    if not hasattr(_local, 'brackets'):
+        _local.brackets = {}
+    return _local.brackets
+
+
+def _enter(sender, raw=False, **kwargs):
+    # Загрузка фикстур (raw) обработчики моделей пропускают.
+    if not raw:
+        brackets = _brackets()
+        for table in _bracketed[sender]:
+            brackets[table] = brackets.get(table, 0) + 1
+
+
+def _leave(sender, raw=False, **kwargs):
+    brackets = _brackets()
+    for table in _bracketed[sender]:
+        if not raw and brackets.get(table):
+            brackets[table] -= 1
+
+
+def _reset(**kwargs):
+    # Исключение между pre_ и post_ сигналами не должно оставить
+    # таблицу навсегда в скобках.
+    _local.brackets = {}
+
+
+@contextmanager
+def untracked(*tables):
+    """Записи этого потока в tables не поднимают поколений и эпох."""
+    previous = getattr(_local, 'untracked', frozenset())
+    _local.untracked = previous | set(tables)
+    try:
+        yield
+    finally:
+        _local.untracked = previous
+
+
+def on_write(listener):
+    """listener(connection, tables) узнает о записях в обход сигналов."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def bracket(model, *related):
+    """Записи модели между ее pre_/post_ сигналами не поднимают эпоху.
+
+    related - модели, которые правит удаление model (SET_NULL): их
+    карточки и кэши обработчики сигналов model поддерживают сами.
+    """
+    _bracketed[model] = _bracketed.get(model, frozenset()) | {
+        other._meta.db_table for other in (model, *related)}
+    uid = f'core.generations:{model._meta.label}'
+    pre_save.connect(_enter, sender=model, dispatch_uid=uid)
+    post_save.connect(_leave, sender=model, dispatch_uid=uid)
+    pre_delete.connect(_enter, sender=model, dispatch_uid=uid)
+    post_delete.connect(_leave, sender=model, dispatch_uid=uid)
+
+
+class _Bump:
+    """Отложенный до commit подъем одного поколения."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self):
+        bump(self.name)
+
+
+def _pending(connection):
+    return [
+        func for _, func in connection.run_on_commit
+        if isinstance(func, _Bump)
+    ]
+
+
+def track_writes(execute, sql, params, many, context):
+    """Обертка execute: поднимает поколения измененных таблиц."""
+    result = execute(sql, params, many, context)
+    tables = written_tables(sql) - getattr(_local, 'untracked', frozenset())
+    if not tables:
+        return result
+    brackets = _brackets()
+    unbracketed = {table for table in tables if not brackets.get(table)}
+    names = tables | {epoch(table) for table in unbracketed}
+    connection = context['connection']
+    if unbracketed:
+        for listener in _listeners:
+            listener(connection, unbracketed)
+    if not connection.in_atomic_block:
+        bump(*names)
+        return result
+    pending = {func.name for func in _pending(connection)}
+    for name in names - pending:
+        connection.on_commit(_Bump(name))
+    return result
+
+
+def caching_allowed(using='default'):
+    """Можно ли читать и пополнять кэш производных данных."""
+    connection = connections[using]
+    if connection.in_atomic_block and _pending(connection):
+        return False
+    return not replicas.pinned()
+
+
+def describe(queryset):
+    """SQL запроса (с параметрами) и таблицы, из которых он читает."""
+    query = queryset.query.chain()
+    sql, params = query.get_compiler(queryset.db).as_sql()
+    tables = {queryset.model._meta.db_table}
+    tables.update(
+        join.table_name for join in query.alias_map.values())
+    return f'{sql} {params!r}', tuple(sorted(tables))
+
+
+def _install(connection, **kwargs):
+    if track_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(track_writes)
+
+
+def install():
+    """Ставит обертку на соединения этого потока и на все новые."""
+    connection_created.connect(_install, dispatch_uid='core.generations')
+    request_started.connect(_reset, dispatch_uid='core.generations')
+    for connection in connections.all():
+        _install(connection)
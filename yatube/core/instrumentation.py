@@ -0,0 +1,185 @@
+"""Счетчики одного запроса: SQL, рендеринг шаблонов и обращения к кэшу.
+
+Статистика живет в thread-local и заполняется только пока запрос
+проходит через InstrumentationMiddleware, поэтому вне запросов
+обертки стоят одну проверку атрибута.
+
+Время шаблонов считается дважды: template_time - весь рендеринг
+ответа, templates - каждый шаблон и {% include %} по имени, с полным
+временем и собственным (без вложенных include). Родитель из
+{% extends %} рендерится внутри дочернего шаблона и учтен в нем.
+Шаблоны Jinja2 учитываются только целиком, вместе с include.
+"""
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.template import base
+from django.template.backends import jinja2
+from django.template.backends.django import Template
+
+_local = threading.local()
+_MISSING = object()
+_installed = False
+
+
+class RequestStats:
+    __slots__ = (
+        'started', 'queries', 'db_time', 'template_time',
+        'cache_hits', 'cache_misses', 'templates', '_render_depth',
+        '_template_stack',
+    )
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Имя шаблона -> [число рендеров, полное время, собственное время].
+        self.templates = {}
+        self._render_depth = 0
+        self._template_stack = []
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def cache_status(self):
+        if self.cache_misses:
+            return 'partial' if self.cache_hits else 'miss'
+        return 'hit' if self.cache_hits else 'none'
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hit, {self.cache_misses} miss"',
+        ))
+
+
+def current():
+    """Статистика текущего запроса или None вне запроса."""
+    return getattr(_local, 'stats', None)
+
+
+def start():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish():
+    _local.stats = None
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка connection.execute_wrapper: считает запросы и их время."""
+    stats = current()
+    if stats is None:
+        return execute(sql, params, many, context)
+    begin = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - begin
+        stats.queries += 1
+
+
+def _timed_render(render):
+    @functools.wraps(render)
+    def wrapper(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return render(self, context, request)
+        # Вложенный render_to_string уже учтен внешним вызовом.
+        stats._render_depth += 1
+        begin = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats._render_depth -= 1
+            if not stats._render_depth:
+                stats.template_time += time.perf_counter() - begin
+    return wrapper
+
+
+def _timed_template(render):
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        stats = current()
+        if stats is None:
+            return render(self, *args, **kwargs)
+        stack = stats._template_stack
+        stack.append(0.0)
+        begin = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - begin
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            item = stats.templates.setdefault(
+                self.origin.template_name or '<string>', [0, 0.0, 0.0])
+            item[0] += 1
+            item[1] += elapsed
+            item[2] += elapsed - nested
+    return wrapper
+
+
+def _counted_get(get):
+    @functools.wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        stats = current()
+        if stats is None:
+            return get(self, key, default, version)
+        value = get(self, key, _MISSING, version)
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @functools.wraps(get_many)
+    def wrapper(self, keys, version=None):
+        keys = list(keys)
+        values = get_many(self, keys, version)
+        stats = current()
+        if stats is not None:
+            stats.cache_hits += len(values)
+            stats.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def install():
+    """Один раз оборачивает рендеринг шаблонов и методы бэкендов кэша."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    Template.render = _timed_render(Template.render)
+    # Этот render вызывают и бэкенд, и {% include %}.
+    base.Template.render = _timed_template(base.Template.render)
+    # Jinja2 встраивает include в шаблон, он учитывается целиком.
+    jinja2.Template.render = _timed_render(
+        _timed_template(jinja2.Template.render))
+    patched = set()
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        if backend in patched:
+            continue
+        patched.add(backend)
+        backend.get = _counted_get(backend.get)
+        # Базовый get_many сам вызывает get, считать его второй раз незачем.
+        if backend.get_many is not BaseCache.get_many:
+            backend.get_many = _counted_get_many(backend.get_many)
@@ -0,0 +1,255 @@
+"""Шина инвалидации кэшей процессов между воркерами и узлами.
+
+Поколения, объекты и страницы живут в кэше default; пока он общий
+(memcached, redis), запись видна всем процессам сразу. С локальным
+кэшем (LocMemCache, будущие L1-кэши) запись на одном узле оставляет
+остальные со старыми данными. Шина рассылает события записей моделей,
+подключенных через watch(), через таблицу InvalidationEvent:
+
+- сохранение и удаление через модель дают событие с pk, запись в
+  обход сигналов (bulk_create, update(), сырой SQL) - событие на всю
+  таблицу с пустым ключом;
+- приложения шлют и свои темы (например, правленые списки лент
+  posts.feeds): тема - строка, ключ - что угодно;
+- события транзакции копятся и пишутся одним bulk_create после
+  commit, больше MAX_KEYS ключей модели сворачиваются в одно событие
+  на таблицу;
+- каждый процесс не чаще раза в INTERVAL секунд (в начале запроса
+  или из poll()) читает чужие события, сворачивает их так же и
+  зовет обработчики subscribe() по разу на модель.
+
+Обработчик по умолчанию поднимает поколение таблицы, а для событий на
+всю таблицу - и ее эпоху (см. core.generations). Время события ставит
+пишущий процесс, поэтому узлы перечитывают окно GRACE секунд: оно
+покрывает расхождение часов и запись, закоммиченную позже соседних.
+
+Node - отдельный узел со своим курсором; в тестах им изображают
+соседний процесс. Старые события удаляет команда
+prune_invalidation_events.
+"""
+import datetime
+import logging
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import generations, metrics
+from .models import InvalidationEvent
+
+logger = logging.getLogger('yatube.invalidation')
+
+EVENTS = metrics.registry.counter(
+    'yatube_invalidation_events_total',
+    'События шины инвалидации: отправленные, полученные и примененные.',
+    ('direction',))
+
+_models = {}
+_handlers = {}
+
+
+def enabled():
+    return settings.INVALIDATION_BUS['ENABLED']
+
+
+def _topic(model):
+    return model if isinstance(model, str) else model._meta.label
+
+
+def subscribe(model, handler):
+    """handler(keys) - keys: множество pk строками или None (вся таблица).
+
+    Вместо модели можно передать свою тему - строку с точкой, как у
+    меток моделей, см. publish().
+    """
+    handlers = _handlers.setdefault(_topic(model), [])
+    if handler not in handlers:
+        handlers.append(handler)
+
+
+def _bump_generations(model):
+    table = model._meta.db_table
+
+    def handler(keys):
+        if keys is None:
+            generations.bump(table, generations.epoch(table))
+        else:
+            generations.bump(table)
+    return handler
+
+
+def _publish_instance(sender, instance, raw=False, **kwargs):
+    if not raw:
+        publish(sender, instance.pk, using=instance._state.db)
+
+
+def _publish_tables(connection, tables):
+    for table in tables:
+        if table in _models:
+            publish(_models[table], None, using=connection.alias)
+
+
+def watch(model):
+    """Рассылать записи модели и поднимать ее поколения по чужим."""
+    label = model._meta.label
+    _models[model._meta.db_table] = model
+    generations.bracket(model)
+    post_save.connect(
+        _publish_instance, sender=model, dispatch_uid=f'{__name__}:{label}')
+    post_delete.connect(
+        _publish_instance, sender=model, dispatch_uid=f'{__name__}:{label}')
+    subscribe(model, _bump_generations(model))
+
+
+def coalesce(events):
+    """(модель, ключ или None) -> {модель: множество ключей или None}."""
+    limit = settings.INVALIDATION_BUS['MAX_KEYS']
+    topics = {}
+    for topic, key in events:
+        keys = topics.setdefault(topic, set())
+        if keys is None:
+            continue
+        if key is None or len(keys) >= limit:
+            topics[topic] = None
+        else:
+            keys.add(key)
+    return topics
+
+
+class Node:
+    """Курсор одного процесса по таблице событий."""
+
+    def __init__(self, origin=None):
+        self._origin = origin
+        self._pid = None
+        self.cursor = None
+        self.polled = None
+        self.seen = {}
+
+    @property
+    def origin(self):
+        # После fork воркеры не должны делить имя родителя.
+        if self._origin is None or self._pid not in (None, os.getpid()):
+            self._origin = '{}:{}'.format(
+                os.uname().nodename[:40], uuid.uuid4().hex[:16])
+            self._pid = os.getpid()
+        return self._origin
+
+    def send(self, topics, using='default'):
+        now = timezone.now()
+        rows = [
+            InvalidationEvent(
+                topic=topic, key=key, origin=self.origin, created=now)
+            for topic, keys in topics.items()
+            for key in (sorted(keys) if keys is not None else [''])
+        ]
+        try:
+            InvalidationEvent.objects.using(using).bulk_create(rows)
+        except Exception:
+            logger.exception('Не удалось разослать события %s', topics)
+        else:
+            EVENTS.inc(len(rows), direction='sent')
+
+    def poll(self, force=False, using='default'):
+        """Применяет чужие события; возвращает число моделей."""
+        config = settings.INVALIDATION_BUS
+        clock = time.monotonic()
+        if not force and self.polled is not None and (
+                clock - self.polled < config['INTERVAL']):
+            return 0
+        self.polled = clock
+        now = timezone.now()
+        if self.cursor is None:
+            # Новый процесс начинает с пустым кэшем: прошлое не нужно.
+            self.cursor = now
+            return 0
+        since = self.cursor - datetime.timedelta(seconds=config['GRACE'])
+        rows = (
+            InvalidationEvent.objects.using(using)
+            .filter(created__gte=since).exclude(origin=self.origin)
+            .order_by('created', 'id')
+            .values_list('id', 'topic', 'key', 'created')
+        )
+        fresh = [row for row in rows if row[0] not in self.seen]
+        self.seen = {
+            pk: created for pk, created in self.seen.items()
+            if created >= since
+        }
+        self.seen.update((row[0], row[3]) for row in fresh)
+        self.cursor = now
+        if not fresh:
+            return 0
+        EVENTS.inc(len(fresh), direction='received')
+        topics = coalesce((topic, key or None) for _, topic, key, _ in fresh)
+        # Темы применяются в порядке их последних событий: отметка
+        # пересборки не перекроет записи, случившиеся после нее.
+        last = {topic: index for index, (_, topic, _, _) in enumerate(fresh)}
+        for topic in sorted(topics, key=last.get):
+            keys = topics[topic]
+            for handler in _handlers.get(topic, ()):
+                handler(keys)
+        EVENTS.inc(len(topics), direction='applied')
+        return len(topics)
+
+
+node = Node()
+
+
+class _Flush:
+    """Отложенная до commit отправка событий транзакции."""
+
+    def __init__(self, using):
+        self.using = using
+        self.events = []
+
+    def __call__(self):
+        node.send(coalesce(self.events), self.using)
+
+
+def publish(model, pk, using='default'):
+    """Событие записи модели; pk None - изменена вся таблица.
+
+    model может быть и темой-строкой: тогда pk - любой ключ темы.
+    """
+    if not enabled():
+        return
+    event = (_topic(model), None if pk is None else str(pk))
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        node.send(coalesce([event]), using)
+        return
+    for _, func in connection.run_on_commit:
+        if isinstance(func, _Flush):
+            func.events.append(event)
+            return
+    flush = _Flush(using)
+    flush.events.append(event)
+    transaction.on_commit(flush, using=using)
+
+
+def poll(force=False):
+    if enabled():
+        return node.poll(force)
+    return 0
+
+
+def _poll(**kwargs):
+    poll()
+
+
+def install():
+    generations.on_write(_publish_tables)
+    request_started.connect(_poll, dispatch_uid=__name__)
+
+
+def prune(older_than, using='default'):
+    """Удаляет события старше older_than секунд."""
+    border = timezone.now() - datetime.timedelta(seconds=older_than)
+    deleted, _ = InvalidationEvent.objects.using(using).filter(
+        created__lt=border).delete()
+    return deleted
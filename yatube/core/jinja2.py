@@ -0,0 +1,98 @@
+"""Окружение Jinja2 для горячих шаблонов лент (каталог jinja2/).
+
+Шаблоны повторяют одноименные шаблоны Django из templates/, а теги
+Django заменены функциями и фильтрами с тем же поведением:
+url(), static(), hole() (см. core.pagecache), thumbnail() вместо тега
+{% thumbnail %}, фильтры date, truncatechars и addclass и тег
+{% cache timeout, 'имя' %}, который пишет в тот же ключ кэша, что и
+{% cache %} Django.
+"""
+import logging
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.timezone import template_localtime
+from jinja2 import Environment, nodes, pass_context
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from . import pagecache
+from .templatetags.user_filters import addclass
+
+logger = logging.getLogger('sorl.thumbnail')
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args, kwargs=kwargs)
+
+
+def thumbnail(file_, geometry, **options):
+    """Миниатюра или None, если картинки нет или построить ее не вышло."""
+    if not file_:
+        return None
+    try:
+        return get_thumbnail(file_, geometry, **options)
+    except Exception:
+        if thumbnail_settings.THUMBNAIL_DEBUG:
+            raise
+        logger.exception('Thumbnail tag failed')
+        return None
+
+
+@pass_context
+def hole(context, name, *args):
+    return Markup(pagecache.render_hole(context.get('request'), name, args))
+
+
+def date(value, arg=None):
+    return defaultfilters.date(template_localtime(value), arg)
+
+
+def _fragment_cache():
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache timeout, 'имя'[, vary...] %} ... {% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        timeout = parser.parse_expression()
+        parser.stream.expect('comma')
+        name = parser.parse_expression()
+        vary_on = []
+        while parser.stream.skip_if('comma'):
+            vary_on.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method(
+            '_cache', [timeout, name, nodes.List(vary_on)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _cache(self, timeout, name, vary_on, caller):
+        cache = _fragment_cache()
+        key = make_template_fragment_key(name, vary_on)
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value, timeout)
+        return Markup(value)
+
+
+def environment(**options):
+    env = Environment(extensions=[FragmentCacheExtension], **options)
+    env.globals.update(
+        hole=hole, static=static, url=url, thumbnail=thumbnail)
+    env.filters.update(
+        addclass=addclass, date=date,
+        truncatechars=defaultfilters.truncatechars)
+    return env
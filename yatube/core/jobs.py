@@ -0,0 +1,221 @@
+"""Очередь фоновых задач в основной базе (модель Job).
+
+Функция с декоратором task ставится в очередь через .enqueue(*args,
+**kwargs): строка Job пишется в текущей транзакции, поэтому задача
+видна воркеру только после commit и пропадает при откате. delay -
+через сколько секунд (или run_at - когда) ее можно запускать.
+
+Команда run_worker запускает CONCURRENCY потоков, каждый берет
+готовые задачи по одной. В Postgres строки выбираются через SELECT
+... FOR UPDATE SKIP LOCKED, и воркеры не ждут друг друга; где SKIP
+LOCKED нет (SQLite), задачу получает тот, чей UPDATE с условием
+status=queued изменил строку. Упавшая задача повторяется через
+BACKOFF * 2 ** (попытка - 1) секунд, но не позже чем через
+MAX_BACKOFF, после max_attempts попыток она остается failed. Задачу
+воркера, пропавшего дольше LEASE секунд назад, забирает другой.
+Выполненные задачи хранятся RETENTION секунд.
+
+С JOB_QUEUE['EAGER'] задачи выполняются сразу после commit в том же
+процессе - для разработки без воркера.
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import Job
+
+logger = logging.getLogger('yatube.jobs')
+
+JOBS = metrics.registry.counter(
+    'yatube_jobs_total', 'Фоновые задачи по исходу.', ('name', 'result'))
+DURATION = metrics.registry.histogram(
+    'yatube_job_seconds', 'Время выполнения фоновых задач.', ('name',))
+
+_tasks = {}
+
+
+def config():
+    return settings.JOB_QUEUE
+
+
+class Task:
+    """Функция, которую можно выполнить в фоне."""
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, delay=0, run_at=None, using='default',
+                **kwargs):
+        if run_at is None:
+            run_at = timezone.now() + datetime.timedelta(seconds=delay)
+        payload = json.dumps({'args': args, 'kwargs': kwargs})
+        if config()['EAGER']:
+            transaction.on_commit(
+                lambda: self(*args, **kwargs), using=using)
+            return None
+        return Job.objects.using(using).create(
+            name=self.name, payload=payload, run_at=run_at,
+            max_attempts=self.max_attempts or config()['MAX_ATTEMPTS'])
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """Регистрирует фоновую задачу; аргументы должны ложиться в JSON."""
+    def decorator(func):
+        label = name or f'{func.__module__}.{func.__qualname__}'
+        _tasks[label] = Task(func, label, max_attempts)
+        return _tasks[label]
+    return decorator(func) if func is not None else decorator
+
+
+def backoff(attempts):
+    """Пауза перед повтором после attempts неудачных попыток."""
+    return min(
+        config()['BACKOFF'] * 2 ** (attempts - 1), config()['MAX_BACKOFF'])
+
+
+def _due(now):
+    lease = now - datetime.timedelta(seconds=config()['LEASE'])
+    return Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ) | Job.objects.filter(status=Job.RUNNING, locked_at__lt=lease)
+
+
+def claim(worker, using='default'):
+    """Берет одну готовую задачу или возвращает None."""
+    now = timezone.now()
+    jobs = _due(now).using(using).order_by('run_at', 'id')
+    taken = {'status': Job.RUNNING, 'locked_by': worker, 'locked_at': now}
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using):
+            job = jobs.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.using(using).filter(pk=job.pk).update(**taken)
+    else:
+        for job in jobs[:config()['CLAIM_BATCH']]:
+            # Условие повторяет выборку: задачу мог взять другой воркер.
+            won = Job.objects.using(using).filter(
+                pk=job.pk, status=job.status, locked_at=job.locked_at,
+            ).update(**taken)
+            if won:
+                break
+        else:
+            return None
+    for field, value in taken.items():
+        setattr(job, field, value)
+    return job
+
+
+def execute(job, using='default'):
+    """Выполняет взятую задачу и записывает исход."""
+    job.attempts += 1
+    task_ = _tasks.get(job.name)
+    begin = time.perf_counter()
+    try:
+        if task_ is None:
+            raise LookupError(f'Нет задачи {job.name}')
+        payload = json.loads(job.payload)
+        task_(*payload['args'], **payload['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        if task_ is not None and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + datetime.timedelta(
+                seconds=backoff(job.attempts))
+            result = 'retry'
+        else:
+            job.status = Job.FAILED
+            result = 'failed'
+        job.last_error = error
+        logger.warning(
+            'Задача %s упала (попытка %s): %s', job, job.attempts,
+            error.strip().splitlines()[-1])
+    else:
+        job.status = Job.DONE
+        result = 'done'
+    DURATION.observe(time.perf_counter() - begin, name=job.name)
+    JOBS.inc(name=job.name, result=result)
+    # Только свои поля: чужой воркер мог забрать задачу после LEASE.
+    mine = Job.objects.using(using).filter(
+        pk=job.pk, locked_by=job.locked_by)
+    mine.update(
+        status=job.status, attempts=job.attempts, run_at=job.run_at,
+        last_error=job.last_error, locked_by='', locked_at=None)
+    return result
+
+
+def work_once(worker, using='default'):
+    """Выполняет готовые задачи, пока они есть; возвращает их число."""
+    done = 0
+    while True:
+        job = claim(worker, using)
+        if job is None:
+            return done
+        execute(job, using)
+        done += 1
+
+
+def worker_name():
+    return '{}:{}:{}'.format(
+        os.uname().nodename[:32], os.getpid(), uuid.uuid4().hex[:8])
+
+
+def _loop(worker, stop, using):
+    while not stop.is_set():
+        try:
+            done = work_once(worker, using)
+        except Exception:
+            logger.exception('Воркер %s: ошибка очереди', worker)
+            done = 0
+        finally:
+            close_old_connections()
+        if not done:
+            stop.wait(config()['POLL_INTERVAL'])
+
+
+def run(concurrency=1, stop=None, using='default'):
+    """Запускает потоки воркера и ждет события stop."""
+    stop = stop or threading.Event()
+    threads = [
+        threading.Thread(
+            target=_loop, args=(worker_name(), stop, using), daemon=True)
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    pruned = None
+    try:
+        while any(thread.is_alive() for thread in threads):
+            if pruned is None or (
+                    time.monotonic() - pruned > config()['RETENTION']):
+                pruned = time.monotonic()
+                prune(config()['RETENTION'], using)
+            stop.wait(1)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def prune(older_than, using='default'):
+    """Удаляет выполненные задачи старше older_than секунд."""
+    border = timezone.now() - datetime.timedelta(seconds=older_than)
+    deleted, _ = Job.objects.using(using).filter(
+        status=Job.DONE, run_at__lt=border).delete()
+    return deleted
@@ -0,0 +1,56 @@
+"""Отправка почты фоновой задачей (core.jobs).
+
+QueuedEmailBackend лишь ставит письма в очередь, а воркер отправляет их
+настоящим бэкендом JOB_QUEUE['EMAIL_BACKEND']. Письмо хранится полями
+EmailMessage в JSON; письма с вложениями отправляются сразу.
+"""
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .jobs import task
+
+FIELDS = (
+    'subject', 'body', 'from_email', 'to', 'cc', 'bcc', 'reply_to',
+    'extra_headers',
+)
+
+
+def dump(message):
+    data = {field: getattr(message, field) for field in FIELDS}
+    data['alternatives'] = [
+        list(alternative)
+        for alternative in getattr(message, 'alternatives', ())]
+    return data
+
+
+def load(data):
+    data = dict(data)
+    alternatives = data.pop('alternatives', [])
+    headers = data.pop('extra_headers', {})
+    message = EmailMultiAlternatives(headers=headers, **data)
+    for content, mimetype in alternatives:
+        message.attach_alternative(content, mimetype)
+    return message
+
+
+def _backend():
+    return get_connection(settings.JOB_QUEUE['EMAIL_BACKEND'])
+
+
+@task
+def send_email(data):
+    """Отправляет письмо настоящим бэкендом."""
+    _backend().send_messages([load(data)])
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        direct = [message for message in email_messages if message.attachments]
+        for message in email_messages:
+            if not message.attachments:
+                send_email.enqueue(dump(message))
+        if direct:
+            _backend().send_messages(direct)
+        return len(email_messages)
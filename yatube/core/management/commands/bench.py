@@ -0,0 +1,88 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark, metrics
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет задержки (p50/p95/p99), число запросов к БД и пропускную '
+        'способность всех страниц posts, users и about на заполненной базе '
+        'и сравнивает их с сохраненным базовым прогоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=('client', 'http'), default='client',
+            help='client - тестовый клиент в процессе, http - '
+                 'конкурентные запросы к локальному или внешнему серверу.',
+        )
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--base-url',
+            help='Адрес уже запущенного сервера для режима http.',
+        )
+        parser.add_argument(
+            '--filter', default='',
+            help='Измерять только сценарии, содержащие эту подстроку.',
+        )
+        parser.add_argument('-o', '--output', help='Сохранить результат.')
+        parser.add_argument('--baseline', help='Базовый прогон для сравнения.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95 относительно базового прогона.',
+        )
+
+    def handle(self, *args, **options):
+        users = benchmark.bench_users(max(options['concurrency'], 1))
+        if not users:
+            raise CommandError('База пуста: сначала запустите seed.')
+        scenarios = [
+            scenario for scenario in benchmark.discover(users[0])
+            if options['filter'] in scenario.name
+        ]
+        before = metrics.registry.snapshot()
+        if options['mode'] == 'client':
+            results = benchmark.run_client(
+                scenarios, users[0], options['rounds'], options['warmup'])
+        else:
+            results = benchmark.run_http(
+                scenarios, users, options['rounds'], options['concurrency'],
+                options['base_url'], options['warmup'])
+        results['mode'] = options['mode']
+        # Внешний сервер считает шаблоны в своих процессах.
+        if options['mode'] == 'client' or not options['base_url']:
+            results['templates'] = benchmark.template_timings(
+                before, metrics.registry.snapshot())
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline:
+                regressions = benchmark.compare(
+                    results, json.load(baseline), options['threshold'])
+            if regressions:
+                raise CommandError(
+                    'Обнаружены регрессии:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"сценарий":<48} {"p50":>8} {"p95":>8} {"p99":>8} '
+            f'{"среднее":>8} {"sql":>5}'
+        )
+        for name, item in results['scenarios'].items():
+            queries = (
+                '-' if item['queries'] is None else f'{item["queries"]:.0f}')
+            self.stdout.write(
+                f'{name:<48} {item["p50_ms"]:>8.1f} {item["p95_ms"]:>8.1f} '
+                f'{item["p99_ms"]:>8.1f} {item["mean_ms"]:>8.1f} {queries:>5}'
+            )
+        self.stdout.write(
+            f'Всего: {results["rps"]:.1f} запросов/с '
+            f'за {results["elapsed_s"]:.1f} с'
+        )
@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводит сохраненные профили запросов в список самых горячих '
+        'функций.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', help='Каталог профилей, по умолчанию PROFILING["DIR"].')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--view', help='Только профили этого view.')
+        parser.add_argument(
+            '--sort', choices=('self_ms', 'total_ms'), default='self_ms')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or profiling.config()['DIR']
+        if not os.path.isdir(directory):
+            raise CommandError(f'Нет каталога профилей {directory}.')
+        functions, views = profiling.aggregate(
+            profiling.load(directory), options['view'])
+        if not views:
+            raise CommandError('Профилей не найдено.')
+        self.stdout.write(f'{"view":<32} {"профилей":>9} {"ср. мс":>9} '
+                          f'{"ср. SQL":>8}')
+        for view, item in sorted(views.items()):
+            count = item['profiles']
+            self.stdout.write(
+                f'{view:<32} {count:>9} {item["duration_ms"] / count:>9.1f} '
+                f'{item["queries"] / count:>8.1f}'
+            )
+        self.stdout.write('')
+        self.stdout.write(f'{"self мс":>10} {"total мс":>10} {"проф.":>6}  '
+                          'функция')
+        hottest = sorted(
+            functions.items(), key=lambda pair: pair[1][options['sort']],
+            reverse=True,
+        )[:options['top']]
+        for name, item in hottest:
+            self.stdout.write(
+                f'{item["self_ms"]:>10.1f} {item["total_ms"]:>10.1f} '
+                f'{item["profiles"]:>6}  {name}'
+            )
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import invalidation
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет старые события шины инвалидации; запускать по '
+        'расписанию, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int,
+            default=settings.INVALIDATION_BUS['RETENTION'],
+            help='Возраст событий в секундах.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        deleted = invalidation.prune(
+            options['older_than'], options['database'])
+        self.stdout.write(f'Удалено событий: {deleted}')
@@ -0,0 +1,40 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди core.Job: письма, '
+        'миниатюры и т.п. Останавливается по SIGTERM или Ctrl+C.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=jobs.config()['CONCURRENCY'],
+            help='Число потоков, по умолчанию JOB_QUEUE["CONCURRENCY"].',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            done = jobs.work_once(jobs.worker_name(), options['database'])
+            self.stdout.write(f'Выполнено задач: {done}')
+            return
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        self.stdout.write(
+            f'Воркер запущен, потоков: {options["concurrency"]}')
+        try:
+            jobs.run(options['concurrency'], stop, options['database'])
+        except KeyboardInterrupt:
+            stop.set()
+        self.stdout.write('Воркер остановлен')
@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает самые медленные шаблоны и include из результата '
+        'команды bench.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('results', help='JSON, сохраненный bench -o.')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument(
+            '--sort', choices=('self_ms', 'total_ms'), default='self_ms')
+
+    def handle(self, *args, **options):
+        with open(options['results'], encoding='utf-8') as results:
+            templates = json.load(results).get('templates')
+        if not templates:
+            raise CommandError(
+                'В результате нет времени шаблонов: прогон bench был '
+                'против внешнего сервера или без запросов.')
+        spent = sum(item['self_ms'] for item in templates.values())
+        self.stdout.write(
+            f'{"self мс":>10} {"доля":>6} {"total мс":>10} '
+            f'{"мс/запрос":>10} {"рендеров":>9}  шаблон'
+        )
+        slowest = sorted(
+            templates.items(), key=lambda pair: pair[1][options['sort']],
+            reverse=True,
+        )[:options['top']]
+        for name, item in slowest:
+            share = item['self_ms'] / spent if spent else 0
+            self.stdout.write(
+                f'{item["self_ms"]:>10.1f} {share:>6.1%} '
+                f'{item["total_ms"]:>10.1f} '
+                f'{item["total_ms"] / item["requests"]:>10.2f} '
+                f'{item["renders"]:>9}  {name}'
+            )
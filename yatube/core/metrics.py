@@ -0,0 +1,272 @@
+"""Счетчики и гистограммы процесса в формате Prometheus.
+
+При нескольких воркерах каждый процесс периодически сохраняет снимок
+своих метрик в общий каталог METRICS['DIR'] (файл <pid>.json), а
+/metrics складывает снимки всех процессов. Без каталога отдаются
+метрики только текущего процесса. Каталог у каждого узла свой: файлы
+завершившихся процессов collect() удаляет по их pid.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('yatube.metrics')
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def snapshot(self):
+        with self._lock:
+            samples = [
+                [list(key), self._copy(value)]
+                for key, value in self._values.items()
+            ]
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labels': list(self.labels),
+            'samples': samples,
+        }
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Счетчики корзин, затем сумма и число наблюдений.
+                counts = self._values[key] = [0] * len(self.buckets) + [0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def snapshot(self):
+        return {**super().snapshot(), 'buckets': list(self.buckets)}
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._flushed = 0.0
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(
+            Histogram, name, documentation, labels, buckets=buckets)
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def flush(self, force=False):
+        """Сохраняет снимок процесса в общий каталог не чаще интервала."""
+        directory = settings.METRICS['DIR']
+        now = time.monotonic()
+        if not directory or (
+                not force
+                and now - self._flushed < settings.METRICS['FLUSH_INTERVAL']):
+            return
+        self._flushed = now
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        # У каждого потока свой временный файл: os.replace атомарен,
+        # и параллельные сбросы не мешают друг другу.
+        with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=directory, prefix=f'{pid}.',
+                suffix='.tmp', delete=False) as output:
+            try:
+                json.dump(self.snapshot(), output)
+            except BaseException:
+                output.close()
+                os.remove(output.name)
+                raise
+        os.replace(output.name, os.path.join(directory, f'{pid}.json'))
+
+    def collect(self):
+        """Снимки всех процессов, сложенные вместе."""
+        directory = settings.METRICS['DIR']
+        if not directory:
+            return self.snapshot()
+        self.flush(force=True)
+        merged = {}
+        for name in os.listdir(directory):
+            if not _alive(name.split('.')[0]):
+                _remove(os.path.join(directory, name))
+                continue
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name),
+                          encoding='utf-8') as snapshot:
+                    merge(merged, json.load(snapshot))
+            except (OSError, ValueError):
+                continue
+        return merged
+
+
+def _alive(pid):
+    try:
+        pid = int(pid)
+    except ValueError:
+        return True
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Процесс есть, но принадлежит другому пользователю.
+        return True
+    return True
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def merge(target, snapshot):
+    for name, metric in snapshot.items():
+        into = target.setdefault(name, {**metric, 'samples': []})
+        values = {tuple(key): value for key, value in into['samples']}
+        for key, value in metric['samples']:
+            key = tuple(key)
+            if key not in values:
+                values[key] = value
+            elif metric['type'] == 'histogram':
+                values[key] = [a + b for a, b in zip(values[key], value)]
+            else:
+                values[key] += value
+        into['samples'] = [[list(key), value] for key, value in values.items()]
+    return target
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(snapshot):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f'# HELP {name} {metric["help"]}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        for key, value in sorted(metric['samples']):
+            if metric['type'] != 'histogram':
+                lines.append(
+                    f'{name}{_labels(metric["labels"], key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'], value):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    name, _labels(metric['labels'], key, ('le', bound)),
+                    cumulative))
+            lines.append('{}_bucket{} {}'.format(
+                name, _labels(metric['labels'], key, ('le', '+Inf')),
+                value[-1]))
+            labels = _labels(metric['labels'], key)
+            lines.append(f'{name}_sum{labels} {_number(value[-2])}')
+            lines.append(f'{name}_count{labels} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'yatube_requests_total', 'Обработанные запросы.',
+    ('view', 'method', 'status'))
+REQUEST_DURATION = registry.histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса.', ('view',))
+DB_QUERIES = registry.histogram(
+    'yatube_db_queries_per_request', 'Число SQL-запросов на запрос.',
+    ('view',), buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+DB_DURATION = registry.histogram(
+    'yatube_db_duration_seconds', 'Время SQL-запросов на запрос.', ('view',))
+CACHE_REQUESTS = registry.counter(
+    'yatube_cache_requests_total', 'Обращения к кэшу.', ('result',))
+TEMPLATE_DURATION = registry.histogram(
+    'yatube_template_duration_seconds',
+    'Время шаблона за запрос вместе с вложенными include.', ('template',))
+TEMPLATE_RENDERS = registry.counter(
+    'yatube_template_renders_total', 'Число рендеров шаблона.', ('template',))
+TEMPLATE_SELF = registry.counter(
+    'yatube_template_self_seconds_total',
+    'Собственное время шаблона без вложенных include.', ('template',))
@@ -0,0 +1,259 @@
+import cProfile
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_cache_control
+
+from . import (
+    admission, instrumentation, metrics, profiling, replicas, surrogate,
+)
+
+logger = logging.getLogger('yatube.request')
+
+
+class InstrumentationMiddleware:
+    """Считает SQL, рендеринг и кэш каждого запроса.
+
+    Итог уходит в заголовок Server-Timing и в лог yatube.request
+    отдельными полями записи; сама статистика доступна остальным
+    middleware как request.stats.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrumentation.install()
+
+    def __call__(self, request):
+        stats = request.stats = instrumentation.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(
+                        instrumentation.record_query))
+                response = self.get_response(request)
+        finally:
+            instrumentation.finish()
+        total = stats.elapsed
+        response['Server-Timing'] = stats.server_timing(total)
+        match = request.resolver_match
+        user = getattr(request, 'user', None)
+        logger.info(
+            '%s %s %s', request.method, request.path, response.status_code,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'duration_ms': round(total * 1000, 1),
+                'db_queries': stats.queries,
+                'db_ms': round(stats.db_time * 1000, 1),
+                'template_ms': round(stats.template_time * 1000, 1),
+                'cache': stats.cache_status,
+                'cache_hits': stats.cache_hits,
+                'cache_misses': stats.cache_misses,
+                'templates': {
+                    name: round(total * 1000, 1)
+                    for name, (_, total, _) in stats.templates.items()
+                },
+                'user_id': user.pk if user is not None else None,
+            },
+        )
+        return response
+
+
+class MetricsMiddleware:
+    """Пишет задержку, SQL и кэш каждого запроса в реестр core.metrics.
+
+    Должен стоять после InstrumentationMiddleware: берет request.stats.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.REQUESTS.inc(
+            view=view, method=request.method, status=response.status_code)
+        metrics.REQUEST_DURATION.observe(
+            time.perf_counter() - started, view=view)
+        stats = getattr(request, 'stats', None)
+        if stats is not None:
+            metrics.DB_QUERIES.observe(stats.queries, view=view)
+            metrics.DB_DURATION.observe(stats.db_time, view=view)
+            metrics.CACHE_REQUESTS.inc(stats.cache_hits, result='hit')
+            metrics.CACHE_REQUESTS.inc(stats.cache_misses, result='miss')
+            for name, (renders, total, own) in stats.templates.items():
+                metrics.TEMPLATE_DURATION.observe(total, template=name)
+                metrics.TEMPLATE_RENDERS.inc(renders, template=name)
+                metrics.TEMPLATE_SELF.inc(own, template=name)
+        try:
+            metrics.registry.flush()
+        except OSError:
+            # Снимок запишет следующий запрос; этот ответ уже готов.
+            metrics.logger.exception('Не удалось сохранить снимок метрик')
+        return response
+
+
+class ProfilingMiddleware:
+    """Сохраняет профили медленных и выборочных запросов, см. core.profiling.
+
+    Профилируются только view, чьи имена начинаются с PROFILING['VIEWS'].
+    """
+
+    def __init__(self, get_response):
+        if not profiling.config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profiler = None
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler = self.stop(request)
+        if profiler is None:
+            return response
+        duration_ms = (time.perf_counter() - started) * 1000
+        options = profiling.config()
+        mode, sampled, handle = profiler
+        if not sampled and duration_ms < options['SLOW_MS']:
+            return response
+        stats = getattr(request, 'stats', None)
+        meta = {
+            'view': request.resolver_match.view_name,
+            'path': request.get_full_path(),
+            'method': request.method,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'queries': stats.queries if stats else None,
+            'db_ms': stats.db_time * 1000 if stats else None,
+            'mode': mode,
+            'sampled': sampled,
+        }
+        if mode == 'cprofile':
+            profiling.dump(meta, profiling.functions_from_cprofile(handle))
+        else:
+            profiling.dump(
+                meta,
+                profiling.functions_from_samples(
+                    handle, options['INTERVAL_MS']),
+                handle,
+            )
+        return response
+
+    @staticmethod
+    def stop(request):
+        profiler, request.profiler = request.profiler, None
+        if profiler is None:
+            return None
+        mode, sampled, handle = profiler
+        if mode == 'cprofile':
+            handle.disable()
+        else:
+            handle = profiling.sampler().unregister(threading.get_ident())
+        return mode, sampled, handle
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        options = profiling.config()
+        if not request.resolver_match.view_name.startswith(
+                tuple(options['VIEWS'])):
+            return None
+        sampled = random.random() < options['SAMPLE_RATE']
+        if options['MODE'] == 'cprofile':
+            if not sampled:
+                return None
+            handle = cProfile.Profile()
+            handle.enable()
+            request.profiler = ('cprofile', sampled, handle)
+        else:
+            profiling.sampler().register(threading.get_ident())
+            request.profiler = ('sampler', sampled, None)
+        return None
+
+
+class SurrogateKeyMiddleware:
+    """Заголовки кэширования для ответов, помеченных surrogate.tag()."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        keys = surrogate.keys_of(request)
+        if not keys or request.method not in ('GET', 'HEAD') or (
+                response.status_code != 200):
+            return response
+        config = settings.SURROGATE
+        response[config['HEADER']] = ' '.join(keys)
+        # Без ESI в теле остаются дырки конкретного пользователя.
+        shared = not response.cookies and (
+            settings.PAGE_CACHE['ESI'] or not request.user.is_authenticated)
+        if not shared:
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        patch_cache_control(
+            response, public=True, max_age=config['BROWSER_MAX_AGE'])
+        control = [f'max-age={config["MAX_AGE"]}']
+        if response.has_header('Surrogate-Control'):
+            control.insert(0, response['Surrogate-Control'])
+        response['Surrogate-Control'] = ', '.join(control)
+        return response
+
+
+class ReplicaMiddleware:
+    """Привязывает пользователя к основной базе после его записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = replicas.config()
+        pinned = config['COOKIE'] in request.COOKIES
+        with replicas.routing(pinned) as state:
+            response = self.get_response(request)
+        if state.wrote and config['DATABASES']:
+            response.set_cookie(
+                config['COOKIE'], '1', max_age=config['PIN_SECONDS'],
+                httponly=True, samesite='Lax')
+        return response
+
+
+class AdmissionMiddleware:
+    """Отбрасывает низкоприоритетные запросы при перегрузке.
+
+    Стоит после AuthenticationMiddleware: приоритет зависит от
+    request.user. Лимиты - в ADMISSION, см. core.admission.
+    """
+
+    def __init__(self, get_response):
+        if not admission.config()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.admitted = None
+        try:
+            return self.get_response(request)
+        finally:
+            if request.admitted is not None:
+                view, started = request.admitted
+                admission.load.leave(view, time.perf_counter() - started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = request.resolver_match.view_name
+        reason = admission.decide(request, view)
+        if reason is not None:
+            return admission.shed(request, view, reason)
+        admission.load.enter(view)
+        request.admitted = (view, time.perf_counter())
+        return None
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvalidationEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=100, verbose_name='Модель')),
+                ('key', models.CharField(blank=True, max_length=64, verbose_name='Ключ')),
+                ('origin', models.CharField(max_length=64, verbose_name='Процесс')),
+                ('created', models.DateTimeField(db_index=True, verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'Событие инвалидации',
+                'verbose_name_plural': 'События инвалидации',
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import models
+
+
+class InvalidationEvent(models.Model):
+    """Запись модели на одном из узлов, см. core.invalidation."""
+    topic = models.CharField(max_length=100, verbose_name="Модель")
+    # Пустой ключ - изменена вся таблица.
+    key = models.CharField(max_length=64, blank=True, verbose_name="Ключ")
+    origin = models.CharField(max_length=64, verbose_name="Процесс")
+    created = models.DateTimeField(db_index=True, verbose_name="Время")
+
+    class Meta:
+        verbose_name = 'Событие инвалидации'
+        verbose_name_plural = 'События инвалидации'
+
+    def __str__(self):
+        return f'{self.topic}:{self.key or "*"}'
+
+
+class Job(models.Model):
+    """Фоновая задача, см. core.jobs."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Провалена'),
+    )
+
+    name = models.CharField(max_length=200, verbose_name="Задача")
+    # Аргументы в JSON: поле JSONField в Django 2.2 есть только у Postgres.
+    payload = models.TextField(default='{}', verbose_name="Аргументы")
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=QUEUED,
+        verbose_name="Состояние")
+    run_at = models.DateTimeField(verbose_name="Запустить не раньше")
+    attempts = models.PositiveIntegerField(
+        default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(
+        default=5, verbose_name="Попыток не больше")
+    locked_by = models.CharField(
+        max_length=64, blank=True, verbose_name="Воркер")
+    locked_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Взята")
+    last_error = models.TextField(blank=True, verbose_name="Ошибка")
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name="Создана")
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,216 @@
+"""Общий кэш страниц с «дырками» для частей, зависящих от пользователя.
+
+Представление с декоратором shared_page рендерится один раз на адрес:
+вместо фрагментов, отмеченных тегом {% hole 'имя' аргументы %}, в
+закэшированное тело попадают метки. Каждый запрос - и анонимный, и
+авторизованный - берет общее тело и вторым проходом заполняет метки
+маленькими шаблонами дырок: меню пользователя, кнопка подписки, форма
+комментария с csrf-токеном. С PAGE_CACHE['ESI'] метки становятся
+тегами <esi:include>, и дырки собирает прокси через core.views.fragment.
+
+Ключ страницы содержит поколения таблиц, из которых она собрана
+(см. core.generations), поэтому запись в них делает его недостижимым.
+Вместе с телом хранятся ключи суррогатного кэша (core.surrogate).
+Имена пользователей сверяются только с эпохой auth_user, чтобы вход
+(запись last_login) не сбрасывал все страницы: переименование станет
+видно по истечении PAGE_CACHE['TIMEOUT'].
+
+Метки ставятся при любом рендере такого представления, даже когда
+страница мимо кэша (HEAD, привязка к основной базе, транзакция с
+записями): тогда дырки заполняются сразу, но фрагменты {% cache %} в
+шаблоне все равно сохраняют метки, а не чужую форму с csrf-токеном.
+Поэтому дырки внутри {% cache %} допустимы только в шаблонах страниц
+shared_page.
+
+Последнее тело каждого адреса еще STALE_TIMEOUT секунд хранится без
+поколений: его отдает core.admission вместо отброшенного запроса.
+"""
+import functools
+import html
+import json
+import re
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import generations, metrics, surrogate
+
+# Метка не может прийти из пользовательских данных: те экранируются.
+HOLE_RE = re.compile(r'<!--hole:(\w+):(.*?)-->')
+
+REQUESTS = metrics.registry.counter(
+    'yatube_page_cache_total', 'Обращения к общему кэшу страниц.',
+    ('view', 'result'))
+
+_holes = {}
+
+
+def is_registered(name):
+    return name in _holes
+
+
+def register(name, template, context=None, prefetch=None, args=()):
+    """Дырка name: шаблон и функция (request, *args) -> контекст.
+
+    prefetch(request, [args, ...]) получает аргументы всех дырок name
+    на странице до их заполнения - чтобы загрузить данные разом.
+    args - преобразователи аргументов (int, str) по одному на каждый:
+    адрес фрагмента для ESI открыт всем, и его аргументы проверяются.
+    """
+    _holes[name] = (template, context, prefetch, tuple(args))
+
+
+def parse_args(name, values):
+    """Аргументы дырки из строк адреса фрагмента; ValueError - не те."""
+    converters = _holes[name][3]
+    if len(values) != len(converters):
+        raise ValueError(
+            f'{name}: ждали {len(converters)} аргументов, '
+            f'получили {len(values)}')
+    return [convert(value) for convert, value in zip(converters, values)]
+
+
+def render_hole(request, name, args):
+    """Дырка для этого запроса или метка, если страница идет в кэш."""
+    args = list(args)
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(
+            f'<!--hole:{name}:{escape(json.dumps(args))}-->')
+    template, context, _, _ = _holes[name]
+    values = context(request, *args) if context else {}
+    return render_to_string(template, values, request)
+
+
+def _esi(name, args):
+    url = reverse('fragment', args=[name])
+    if args:
+        url += '?' + urlencode({'arg': args}, doseq=True)
+    return f'<esi:include src="{escape(url)}"/>'
+
+
+def _prefetch(request, body):
+    marks = {}
+    for name, args in HOLE_RE.findall(body):
+        marks.setdefault(name, []).append(json.loads(html.unescape(args)))
+    for name, args in marks.items():
+        prefetch = _holes[name][2]
+        if prefetch is not None:
+            prefetch(request, args)
+
+
+def fill(request, body, esi=None):
+    """Второй проход: метки дырок заменяются фрагментами запроса.
+
+    esi=False заполняет дырки сразу и с PAGE_CACHE['ESI'].
+    """
+    if esi is None:
+        esi = settings.PAGE_CACHE['ESI']
+    if not esi:
+        _prefetch(request, body)
+
+    def replace(match):
+        args = json.loads(html.unescape(match.group(2)))
+        if esi:
+            return _esi(match.group(1), args)
+        return render_hole(request, match.group(1), args)
+    return HOLE_RE.sub(replace, body)
+
+
+def page_key(request, tables):
+    return 'page:{}:{}:{}'.format(
+        request.path, request.GET.get('page', ''),
+        '.'.join(map(str, generations.current(*tables))))
+
+
+def stale_key(request):
+    return 'stale:{}:{}'.format(request.path, request.GET.get('page', ''))
+
+
+def stale(request):
+    """Последняя, возможно устаревшая, копия страницы или None."""
+    if not settings.PAGE_CACHE['ENABLED'] or request.method != 'GET':
+        return None
+    body = cache.get(stale_key(request))
+    if body is None:
+        return None
+    return _respond(request, body, 'stale')
+
+
+def _cacheable(request):
+    return (
+        settings.PAGE_CACHE['ENABLED'] and request.method == 'GET'
+        and generations.caching_allowed()
+    )
+
+
+def _respond(request, body, result):
+    response = HttpResponse(fill(request, body))
+    response['X-Page-Cache'] = result
+    if settings.PAGE_CACHE['ESI']:
+        response['Surrogate-Control'] = 'content="ESI/1.0"'
+    return response
+
+
+def shared_page(*tables):
+    """Кэширует страницу для всех пользователей сразу.
+
+    tables - имена поколений, от которых зависит общее тело страницы.
+    """
+    def decorator(view):
+        label = f'{view.__module__}.{view.__name__}'
+
+        def render(request, *args, **kwargs):
+            request.punch_holes = True
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                request.punch_holes = False
+
+        def filled(request, response):
+            # Ответ мимо кэша: дырки этого запроса заполняются сразу.
+            if not response.streaming:
+                response.content = fill(
+                    request, response.content.decode(response.charset),
+                    esi=False)
+            return response
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable(request):
+                REQUESTS.inc(view=label, result='bypass')
+                return filled(request, render(request, *args, **kwargs))
+            key = page_key(request, tables)
+            cached = cache.get(key)
+            if cached is not None:
+                body, keys = cached
+                surrogate.tag(request, *keys)
+                REQUESTS.inc(view=label, result='hit')
+                return _respond(request, body, 'hit')
+            response = render(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return filled(request, response)
+            REQUESTS.inc(view=label, result='miss')
+            body = response.content.decode(response.charset)
+            cache.set(
+                key, (body, surrogate.keys_of(request)),
+                settings.PAGE_CACHE['TIMEOUT'])
+            cache.set(
+                stale_key(request), body,
+                settings.PAGE_CACHE['STALE_TIMEOUT'])
+            return _respond(request, body, 'miss')
+        return wrapper
+    return decorator
+
+
+def _user_menu(request, view_name=None):
+    return {'view_name': view_name}
+
+
+register(
+    'user_menu', 'includes/holes/user_menu.html', _user_menu, args=(str,))
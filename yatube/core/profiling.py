@@ -0,0 +1,171 @@
+"""Профили медленных и случайно выбранных запросов.
+
+Два режима. sampler - фоновый поток раз в INTERVAL_MS снимает стеки
+потоков, которые сейчас обрабатывают запросы; это дешево, поэтому
+в этом режиме можно следить за всеми запросами и сохранять только те,
+что медленнее SLOW_MS. cprofile - точный, но дорогой профиль, поэтому
+он включается только для доли SAMPLE_RATE запросов.
+
+Каждый профиль - JSON-файл с метаданными запроса и временем по
+функциям: self_ms (в самой функции) и total_ms (вместе с вызванными).
+"""
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+
+MAX_STACK_DEPTH = 64
+
+
+def config():
+    return settings.PROFILING
+
+
+def _frame_name(code):
+    return f'{code.co_filename}:{code.co_firstlineno}({code.co_name})'
+
+
+class StackSampler:
+    """Периодически снимает стеки зарегистрированных потоков."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._pid = None
+
+    def register(self, thread_id):
+        samples = Counter()
+        with self._lock:
+            self._ensure_thread()
+            self._targets[thread_id] = samples
+            self._wakeup.notify()
+        return samples
+
+    def unregister(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _ensure_thread(self):
+        # После fork поток родителя в дочернем процессе не существует.
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._targets:
+                    self._wakeup.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame):
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+
+_sampler = None
+
+
+def sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = StackSampler(config()['INTERVAL_MS'] / 1000)
+    return _sampler
+
+
+def functions_from_samples(samples, interval_ms):
+    functions = {}
+    for stack, count in samples.items():
+        for name in set(stack):
+            item = functions.setdefault(name, {'self_ms': 0, 'total_ms': 0})
+            item['total_ms'] += count * interval_ms
+        functions[stack[-1]]['self_ms'] += count * interval_ms
+    return functions
+
+
+def functions_from_cprofile(profile):
+    functions = {}
+    for (filename, line, name), row in pstats.Stats(profile).stats.items():
+        _, _, self_time, total_time, _ = row
+        functions[f'{filename}:{line}({name})'] = {
+            'self_ms': self_time * 1000,
+            'total_ms': total_time * 1000,
+        }
+    return functions
+
+
+def dump(meta, functions, stacks=None):
+    """Сохраняет профиль и удаляет самые старые сверх MAX_FILES."""
+    directory = config()['DIR']
+    os.makedirs(directory, exist_ok=True)
+    view = re.sub(r'[^\w.-]+', '_', meta['view'] or 'unknown')
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(
+        directory, f'{stamp}-{os.getpid()}-{view}.json')
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump({
+            **meta,
+            'functions': functions,
+            'stacks': {
+                ';'.join(stack): count
+                for stack, count in (stacks or {}).items()
+            },
+        }, output)
+    profiles = sorted(
+        name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in profiles[:-config()['MAX_FILES']]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+    return path
+
+
+def load(directory):
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                yield json.load(f)
+
+
+def aggregate(profiles, view=None):
+    """Суммирует время функций по всем профилям (или одного view)."""
+    functions = {}
+    views = {}
+    for profile in profiles:
+        if view and profile['view'] != view:
+            continue
+        summary = views.setdefault(
+            profile['view'], {'profiles': 0, 'duration_ms': 0, 'queries': 0})
+        summary['profiles'] += 1
+        summary['duration_ms'] += profile['duration_ms']
+        summary['queries'] += profile['queries'] or 0
+        for name, item in profile['functions'].items():
+            total = functions.setdefault(
+                name, {'self_ms': 0, 'total_ms': 0, 'profiles': 0})
+            total['self_ms'] += item['self_ms']
+            total['total_ms'] += item['total_ms']
+            total['profiles'] += 1
+    return functions, views
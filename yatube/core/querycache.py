@@ -0,0 +1,103 @@
+"""Кэш результатов запросов ORM по желанию.
+
+cached(queryset) возвращает копию запроса, результаты которой (список
+объектов, get(), exists(), count()) берутся из кэша. Ключ - SQL с
+параметрами и поколения всех таблиц запроса (см. core.generations),
+поэтому любая запись в эти таблицы, в том числе bulk_create и
+update(), делает запись кэша недостижимой. nocache() отключает кэш
+для отдельного запроса.
+
+Попадания и промахи считаются в метрике yatube_query_cache_total.
+"""
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Manager, QuerySet
+
+from . import generations, metrics
+
+TIMEOUT = 5 * 60
+
+REQUESTS = metrics.registry.counter(
+    'yatube_query_cache_total', 'Обращения к кэшу запросов ORM.',
+    ('model', 'result'))
+
+
+class CachedQuerySet(QuerySet):
+    cache_timeout = TIMEOUT
+    cache_enabled = True
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.cache_timeout = self.cache_timeout
+        clone.cache_enabled = self.cache_enabled
+        return clone
+
+    def nocache(self):
+        clone = self._chain()
+        clone.cache_enabled = False
+        return clone
+
+    def _cache_key(self, kind):
+        """Ключ результата или None, если кэш сейчас использовать нельзя."""
+        if not self.cache_enabled or not generations.caching_allowed(
+                self.db):
+            return None
+        try:
+            sql, tables = generations.describe(self)
+        except EmptyResultSet:
+            return None
+        return 'qs:{}:{}:{}'.format(
+            kind, md5(sql.encode()).hexdigest(),
+            '.'.join(map(str, generations.current(*tables))),
+        )
+
+    def _cached(self, kind, compute):
+        key = self._cache_key(kind)
+        label = self.model._meta.label
+        if key is None:
+            REQUESTS.inc(model=label, result='bypass')
+            return compute()
+        value = cache.get(key)
+        if value is not None:
+            REQUESTS.inc(model=label, result='hit')
+            return value
+        REQUESTS.inc(model=label, result='miss')
+        value = compute()
+        cache.set(key, value, self.cache_timeout)
+        return value
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            self._result_cache = self._cached(
+                'rows', lambda: list(self._iterable_class(self)))
+        super()._fetch_all()
+
+    def exists(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        return self._cached('exists', super().exists)
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        return self._cached('count', super().count)
+
+
+def cached(queryset, timeout=None):
+    """Копия запроса (или менеджера), результаты которой кэшируются."""
+    if isinstance(queryset, Manager):
+        queryset = queryset.all()
+    clone = CachedQuerySet(
+        model=queryset.model, query=queryset.query.chain(),
+        using=queryset._db, hints=queryset._hints,
+    )
+    clone._for_write = queryset._for_write
+    clone._prefetch_related_lookups = queryset._prefetch_related_lookups
+    clone._known_related_objects = queryset._known_related_objects
+    clone._iterable_class = queryset._iterable_class
+    clone._fields = queryset._fields
+    if timeout is not None:
+        clone.cache_timeout = timeout
+    return clone
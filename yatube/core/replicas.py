@@ -0,0 +1,168 @@
+"""Чтение лент с реплик базы с привязкой к основной после записи.
+
+Представления с декоратором use_replicas читают с одной из реплик
+REPLICAS['DATABASES']; все записи и остальные чтения идут в default.
+Реплика выбирается один раз на запрос из тех, чье отставание
+(REPLICAS['LAG_CHECK'], проверка не чаще CHECK_INTERVAL секунд) не
+больше MAX_LAG. Если здоровых реплик нет, чтение уходит в default.
+
+Чтобы пользователь видел свои изменения, ReplicaMiddleware после
+запроса с записью ставит cookie REPLICAS['COOKIE'] на PIN_SECONDS:
+пока она жива, все его чтения идут в default. Внутри запроса после
+первой записи - тоже.
+
+Кэши производных данных (core.generations) реплик не различают:
+прочитанное с отстающей реплики сразу после записи может попасть в
+кэш под новым поколением. Поэтому привязанный запрос кэши обходит, а
+MAX_LAG стоит держать маленьким.
+"""
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger('yatube.replicas')
+
+ROUTES = metrics.registry.counter(
+    'yatube_db_reads_total', 'Чтения представлений с репликами по базам.',
+    ('target',))
+
+LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_local = threading.local()
+_health = {}
+
+
+def config():
+    return settings.REPLICAS
+
+
+def replication_lag(connection):
+    """Отставание реплики в секундах; вне Postgres реплик нет."""
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        return float(cursor.fetchone()[0] or 0)
+
+
+def healthy(alias):
+    """Отставание реплики в пределах MAX_LAG; ошибка - нездорова."""
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked and now - checked[0] < config()['CHECK_INTERVAL']:
+        return checked[1]
+    try:
+        lag = import_string(config()['LAG_CHECK'])(connections[alias])
+    except Exception as error:
+        logger.warning('Реплика %s недоступна: %s', alias, error)
+        ok = False
+    else:
+        ok = lag <= config()['MAX_LAG']
+        if not ok:
+            logger.warning('Реплика %s отстает на %.1f с', alias, lag)
+    _health[alias] = (now, ok)
+    return ok
+
+
+def reset():
+    _health.clear()
+
+
+class _State:
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+        self.reads = False
+        self.replica = None
+
+
+def state():
+    return getattr(_local, 'state', None)
+
+
+def pinned():
+    """Запрос привязан к default: кэши могли набраться с реплики."""
+    current = state()
+    return bool(
+        current and current.pinned and config()['DATABASES'])
+
+
+@contextmanager
+def routing(pinned=False):
+    """Состояние маршрутизации одного запроса."""
+    previous = state()
+    _local.state = _State(pinned)
+    try:
+        yield _local.state
+    finally:
+        _local.state = previous
+
+
+def use_replicas(view):
+    """Чтения представления можно отдать реплике."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        current = state()
+        if current is None:
+            return view(request, *args, **kwargs)
+        current.reads = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            current.reads = False
+    return wrapper
+
+
+def _choose(current):
+    """База для чтений запроса: выбирается при первом чтении."""
+    if current.replica is not None:
+        return current.replica
+    aliases = []
+    if current.pinned:
+        target = 'pinned'
+    else:
+        aliases = [
+            alias for alias in config()['DATABASES'] if healthy(alias)]
+        target = 'replica' if aliases else 'fallback'
+    ROUTES.inc(target=target)
+    current.replica = random.choice(aliases) if aliases else 'default'
+    return current.replica
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not config()['DATABASES']:
+            return None
+        # Без явного 'default' Django читал бы связанные объекты с той
+        # же базы, откуда пришел экземпляр, то есть с реплики.
+        current = state()
+        if current is None or not current.reads or current.wrote:
+            return 'default'
+        return _choose(current)
+
+    def db_for_write(self, model, **hints):
+        current = state()
+        if current is not None:
+            current.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default, объекты с них можно связывать.
+        return True
@@ -0,0 +1,152 @@
+"""Ключи суррогатного кэша для обратного прокси (Varnish, Fastly, nginx).
+
+Представления помечают ответ ключами через tag(): id постов, автор,
+группа, "index". core.middleware.SurrogateKeyMiddleware отдает их в заголовке
+SURROGATE['HEADER'] вместе с Cache-Control и Surrogate-Control: общий
+ответ прокси хранит SURROGATE['MAX_AGE'], а ответ с данными
+пользователя помечается private. При записи моделей обработчики
+сигналов зовут purge(): ключи уходят в прокси фоновой задачей
+(core.jobs) через транспорт SURROGATE['TRANSPORT'], поэтому медленный
+или недоступный прокси не задерживает запрос, а сбой повторяется.
+
+LocalPurgeServer - HTTP-заглушка прокси для тестов и локальной отладки.
+"""
+import functools
+import logging
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .jobs import task
+
+logger = logging.getLogger('yatube.surrogate')
+
+PURGES = metrics.registry.counter(
+    'yatube_surrogate_purges_total', 'Сбросы ключей в обратном прокси.',
+    ('result',))
+
+
+def tag(request, *keys):
+    """Добавляет ключи к ответу на запрос."""
+    if not hasattr(request, 'surrogate_keys'):
+        request.surrogate_keys = set()
+    request.surrogate_keys.update(str(key) for key in keys)
+
+
+def keys_of(request):
+    return sorted(getattr(request, 'surrogate_keys', ()))
+
+
+class NullTransport:
+    """Прокси нет: сбрасывать нечего."""
+
+    def purge(self, keys):
+        pass
+
+
+class HTTPPurgeTransport:
+    """Запрос PURGE с ключами в заголовке, как ждут xkey в Varnish и
+    аналогичные правила nginx."""
+
+    def __init__(self, url, method='PURGE', header='Surrogate-Key',
+                 timeout=2.0, batch_size=200):
+        self.url = url
+        self.method = method
+        self.header = header
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+    def purge(self, keys):
+        for start in range(0, len(keys), self.batch_size):
+            request = urllib.request.Request(
+                self.url, method=self.method,
+                headers={self.header: ' '.join(
+                    keys[start:start + self.batch_size])})
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+
+
+@functools.lru_cache(maxsize=None)
+def transport():
+    config = settings.SURROGATE
+    return import_string(config['TRANSPORT'])(**config.get('OPTIONS', {}))
+
+
+def _reset_transport(setting, **kwargs):
+    if setting == 'SURROGATE':
+        transport.cache_clear()
+
+
+setting_changed.connect(_reset_transport)
+
+
+@task
+def send(keys):
+    """Сбрасывает ключи в прокси; при сбое задача повторяется."""
+    try:
+        transport().purge(keys)
+    except Exception:
+        PURGES.inc(result='error')
+        logger.warning('Не удалось сбросить ключи %s', ' '.join(keys))
+        raise
+    PURGES.inc(result='ok')
+
+
+def purge(*keys, using='default'):
+    """Ставит сброс ключей в очередь; задача видна после commit."""
+    keys = sorted({str(key) for key in keys})
+    if keys:
+        send.enqueue(keys, using=using)
+
+
+class _PurgeHandler(BaseHTTPRequestHandler):
+    recorder = None
+
+    def do_PURGE(self):
+        keys = self.headers.get(self.recorder.header, '').split()
+        with self.recorder.lock:
+            self.recorder.purged.append(keys)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalPurgeServer:
+    """Заглушка прокси: принимает PURGE и запоминает ключи в purged.
+
+    with LocalPurgeServer() as server:
+        ... HTTPPurgeTransport(server.url) ...
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, header='Surrogate-Key'):
+        self.header = header
+        self.purged = []
+        self.lock = threading.Lock()
+        handler = type('Handler', (_PurgeHandler,), {'recorder': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def keys(self):
+        with self.lock:
+            return {key for batch in self.purged for key in batch}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
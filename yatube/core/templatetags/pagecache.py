@@ -0,0 +1,11 @@
+from django import template
+
+from core import pagecache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, *args):
+    """Фрагмент, зависящий от пользователя, см. core.pagecache."""
+    return pagecache.render_hole(context.get('request'), name, args)
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from django.test import TestCase
+from django.urls import reverse
+
+from core.accesslog import BufferedJSONHandler, JSONFormatter
+from posts.models import Post, User
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class BlockedHandler(BufferedJSONHandler):
+    """Писатель, который ждет разрешения перед каждой пачкой."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.allowed = threading.Event()
+
+    def _write(self, records):
+        self.allowed.wait()
+        super()._write(records)
+
+
+class AccessLogTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def attach(self, handler):
+        handler.setFormatter(JSONFormatter())
+        logger = logging.getLogger('yatube.request')
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel(logging.INFO)
+
+        def detach():
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+            handler.close()
+        self.addCleanup(detach)
+        return handler
+
+    def read(self, path):
+        with open(path, encoding='utf-8') as log:
+            return [json.loads(line) for line in log]
+
+    def test_request_written_as_json(self):
+        """Запрос попадает в файл строкой JSON со всеми полями."""
+        path = os.path.join(TEMP_DIR, 'access.log')
+        handler = self.attach(BufferedJSONHandler(path))
+        self.client.force_login(self.user)
+        self.client.get(reverse('posts:index'))
+        handler.flush()
+        line = self.read(path)[-1]
+        self.assertEqual(line['view'], 'posts:index')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['user_id'], self.user.pk)
+        self.assertIn(line['cache'], ('hit', 'miss', 'partial', 'none'))
+        for field in ('ts', 'duration_ms', 'db_ms', 'db_queries'):
+            with self.subTest(field=field):
+                self.assertIn(field, line)
+
+    def test_full_queue_drops_records(self):
+        """При полной очереди записи отбрасываются, а не ждут диска."""
+        path = os.path.join(TEMP_DIR, 'dropped.log')
+        handler = self.attach(BlockedHandler(path, capacity=2))
+        logger = logging.getLogger('yatube.request')
+        for number in range(10):
+            logger.info('запись %s', number, extra={'status': number})
+        self.assertGreaterEqual(handler.dropped, 10 - 2 - 1)
+        handler.allowed.set()
+        handler.flush()
+        self.assertEqual(len(self.read(path)), 10 - handler.dropped)
+
+    def test_rotation(self):
+        """Файл больше max_bytes уходит в резервную копию."""
+        path = os.path.join(TEMP_DIR, 'rotated.log')
+        handler = self.attach(
+            BufferedJSONHandler(path, max_bytes=200, backup_count=2))
+        logger = logging.getLogger('yatube.request')
+        for number in range(20):
+            logger.info('запись', extra={'path': '/' + 'x' * 50})
+            handler.flush()
+        self.assertTrue(os.path.exists(path + '.1'))
+        self.assertTrue(os.path.exists(path + '.2'))
+        self.assertFalse(os.path.exists(path + '.3'))
+        self.assertLessEqual(os.path.getsize(path), 200)
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core import admission
+from posts.models import Post, User
+
+
+def limits(total=None, **views):
+    """ADMISSION с заменой лимитов процесса и отдельных view."""
+    config = dict(settings.ADMISSION, VIEWS=dict(settings.ADMISSION['VIEWS']))
+    if total is not None:
+        config['MAX_INFLIGHT'] = total
+    for name, rule in views.items():
+        config['VIEWS'][f'posts:{name}'] = {
+            **settings.ADMISSION['VIEWS'].get(f'posts:{name}', {}), **rule}
+    return override_settings(ADMISSION=config)
+
+
+class AdmissionTest(TestCase):
+
+    def setUp(self):
+        admission.load.reset()
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(author=self.author, text='Пост')
+
+    def test_deep_pages_shed_first(self):
+        """При перегрузке view отбрасываются только глубокие страницы."""
+        with limits(index={'DEEP_PAGE': 1, 'MAX_INFLIGHT': 0}):
+            response = self.client.get('/?page=2')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(
+                response['Retry-After'],
+                str(settings.ADMISSION['RETRY_AFTER']))
+            self.assertIn('no-cache', response['Cache-Control'])
+            self.assertEqual(self.client.get('/?page=1').status_code, 200)
+        self.assertEqual(self.client.get('/?page=2').status_code, 200)
+        self.assertEqual(admission.load.total, 0)
+
+    def test_slow_view_sheds_anonymous_profiles(self):
+        """Медленный профиль отдается только авторизованным."""
+        admission.load.enter('posts:profile')
+        admission.load.leave(
+            'posts:profile', settings.ADMISSION['DEFAULT']['MAX_LATENCY'] + 1)
+        self.assertEqual(
+            self.client.get('/profile/author/').status_code, 503)
+        self.client.force_login(self.author)
+        self.assertEqual(
+            self.client.get('/profile/author/').status_code, 200)
+        with override_settings(
+                ADMISSION=dict(settings.ADMISSION, WINDOW=0)):
+            self.client.logout()
+            self.assertEqual(
+                self.client.get('/profile/author/').status_code, 200)
+
+    def test_writes_and_follow_feed_are_protected(self):
+        """Перегрузка процесса не трогает записи и ленту подписок."""
+        self.client.force_login(self.author)
+        with limits(total=0):
+            self.assertEqual(self.client.get('/').status_code, 503)
+            self.assertEqual(self.client.get('/follow/').status_code, 200)
+            response = self.client.post('/create/', {'text': 'Новый'})
+            self.assertEqual(response.status_code, 302)
+        self.assertTrue(Post.objects.filter(text='Новый').exists())
+
+
+class StaleCopyTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        admission.load.reset()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Старый пост')
+
+    def test_shed_request_gets_cached_copy(self):
+        """Отброшенный запрос получает последнюю копию страницы."""
+        self.assertEqual(
+            self.client.get('/profile/author/')['X-Page-Cache'], 'miss')
+        with limits(profile={'MAX_INFLIGHT': 0}):
+            response = self.client.get('/profile/author/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+        self.assertContains(response, 'Старый пост')
+        with limits(profile={'MAX_INFLIGHT': 0}):
+            response = self.client.get('/profile/author/?page=2')
+        self.assertEqual(response.status_code, 503)
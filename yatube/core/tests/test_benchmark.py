@@ -0,0 +1,105 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from core import benchmark
+from posts.models import Follow, Group, Post, User
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class BenchCommandTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {i}')
+            for i in range(2 * settings.POSTS_PER_PAGE)
+        )
+        Post.objects.create(author=cls.user, text='Свой пост')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def test_bench_covers_urls(self):
+        """Прогон обходит все адреса и сохраняет перцентили и запросы."""
+        path = os.path.join(TEMP_DIR, 'bench.json')
+        call_command('bench', rounds=2, output=path, stdout=StringIO())
+        with open(path, encoding='utf-8') as output:
+            results = json.load(output)
+        scenarios = results['scenarios']
+        for name in (
+            'posts:index[anon][shallow]',
+            'posts:index[auth][deep]',
+            'posts:follow_index[auth][deep]',
+            'posts:post_edit[auth][shallow]',
+            'posts:profile_unfollow[auth][shallow]',
+            'users:signup[anon][shallow]',
+            'about:tech[anon][shallow]',
+        ):
+            with self.subTest(name=name):
+                self.assertIn(name, scenarios)
+                self.assertEqual(scenarios[name]['requests'], 2)
+        self.assertNotIn('posts:post_like[auth][shallow]', scenarios)
+        for name, scenario in scenarios.items():
+            with self.subTest(name=name):
+                self.assertNotIn('405', scenario['statuses'])
+        signup = scenarios['users:signup[anon][shallow]']
+        self.assertEqual(signup['queries'], 0)
+        index = scenarios['posts:index[anon][shallow]']
+        self.assertEqual(index['statuses'], {'200': 2})
+        self.assertGreater(index['queries'], 0)
+        self.assertLessEqual(index['p50_ms'], index['p99_ms'])
+        self.assertGreater(index['mean_ms'], 0)
+        self.assertGreater(results['rps'], 0)
+        self.assertIn('posts/includes/post_list.html', results['templates'])
+        report = StringIO()
+        call_command('template_report', path, top=3, stdout=report)
+        self.assertEqual(len(report.getvalue().splitlines()), 4)
+
+    def test_compare_reports_regressions(self):
+        """Рост p95 сверх порога и лишние запросы считаются регрессией."""
+        baseline = {'scenarios': {
+            'a': {'p95_ms': 10.0, 'queries': 3},
+            'b': {'p95_ms': 10.0, 'queries': 3},
+            'c': {'p95_ms': 10.0, 'queries': 5.0},
+        }}
+        results = {'scenarios': {
+            'a': {'p95_ms': 11.0, 'queries': 3},
+            'b': {'p95_ms': 13.0, 'queries': 4},
+            # Среднее старого прогона с одним лишним запросом - не рост.
+            'c': {'p95_ms': 10.0, 'queries': 5.2},
+        }}
+        regressions = benchmark.compare(results, baseline, threshold=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(item.startswith('b:') for item in regressions))
+
+    def test_bench_fails_against_faster_baseline(self):
+        """Команда завершается ошибкой при регрессии."""
+        path = os.path.join(TEMP_DIR, 'baseline.json')
+        with open(path, 'w', encoding='utf-8') as baseline:
+            json.dump({'scenarios': {
+                'about:tech[anon][shallow]': {
+                    'p95_ms': 0.0001, 'queries': 0},
+            }}, baseline)
+        with self.assertRaises(CommandError):
+            call_command(
+                'bench', rounds=1, filter='about:tech', baseline=path,
+                stdout=StringIO())
@@ -0,0 +1,61 @@
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from core import generations
+from posts.models import Group, Post, User
+
+
+class GenerationsTest(TransactionTestCase):
+
+    def test_written_tables(self):
+        """Из SQL извлекаются изменяемые таблицы."""
+        cases = (
+            ('INSERT INTO "posts_post" ("text") VALUES (%s)', {'posts_post'}),
+            ('UPDATE "posts_group" SET "title" = %s', {'posts_group'}),
+            ('DELETE FROM `posts_follow` WHERE 1', {'posts_follow'}),
+            ('TRUNCATE "posts_post", "posts_group" CASCADE',
+             {'posts_post', 'posts_group'}),
+            ('SELECT * FROM "posts_post"', set()),
+        )
+        for sql, tables in cases:
+            with self.subTest(sql=sql):
+                self.assertEqual(generations.written_tables(sql), tables)
+
+    def test_write_bumps_generation(self):
+        """Запись поднимает поколение, в транзакции - после commit."""
+        before, = generations.current('posts_group')
+        Group.objects.create(title='Группа', slug='one', description='-')
+        after, = generations.current('posts_group')
+        self.assertGreater(after, before)
+        with transaction.atomic():
+            self.assertTrue(generations.caching_allowed())
+            Group.objects.create(title='Группа', slug='two', description='-')
+            self.assertFalse(generations.caching_allowed())
+            self.assertEqual(generations.current('posts_group'), (after,))
+        self.assertTrue(generations.caching_allowed())
+        self.assertGreater(generations.current('posts_group')[0], after)
+
+    def test_rollback_keeps_generation(self):
+        """Откат не поднимает поколение и снимает запрет кэширования."""
+        before = generations.current('posts_group')
+        try:
+            with transaction.atomic():
+                Group.objects.create(title='Г', slug='g', description='-')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(generations.current('posts_group'), before)
+        self.assertFalse(connection.run_on_commit)
+
+    def test_epoch_ignores_signalled_writes(self):
+        """Эпоха постов растет только от записей в обход сигналов."""
+        user = User.objects.create_user(username='author')
+        epoch = generations.epoch('posts_post')
+        before = generations.current('posts_post', epoch)
+        post = Post.objects.create(author=user, text='Пост')
+        post.delete()
+        after = generations.current('posts_post', epoch)
+        self.assertGreater(after[0], before[0])
+        self.assertEqual(after[1], before[1])
+        Post.objects.bulk_create([Post(author=user, text='Пачка')])
+        self.assertGreater(generations.current(epoch)[0], after[1])
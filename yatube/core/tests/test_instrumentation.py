@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.benchmark import server_timing_queries
+from posts.models import Post, User
+
+
+class InstrumentationMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит время БД, шаблонов и обращения к кэшу."""
+        response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'tpl;dur=', 'cache;desc='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+        self.assertGreater(server_timing_queries(header), 0)
+        self.assertRegex(header, r'[1-9]\d* miss')
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(response['Server-Timing'], r'[1-9]\d* hit')
+
+    def test_structured_log_fields(self):
+        """Запрос пишется в лог yatube.request отдельными полями."""
+        self.client.force_login(self.user)
+        with self.assertLogs('yatube.request', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        record = logs.records[0]
+        self.assertEqual(record.view, 'posts:index')
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.user_id, self.user.pk)
+        self.assertGreater(record.db_queries, 0)
+        self.assertGreaterEqual(record.duration_ms, record.db_ms)
+
+    def test_templates_timed_by_name(self):
+        """Каждый шаблон и include учтен по имени в логе и метриках."""
+        with self.assertLogs('yatube.request', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        templates = logs.records[0].templates
+        for name in (
+            'posts/index.html',
+            'posts/includes/post_list.html',
+            'includes/header.html',
+        ):
+            with self.subTest(name=name):
+                self.assertIn(name, templates)
+        self.assertGreaterEqual(
+            templates['posts/index.html'],
+            templates['posts/includes/post_list.html'])
+        with override_settings(DEBUG=True):
+            text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_template_renders_total'
+            '{template="posts/includes/post_list.html"}', text)
@@ -0,0 +1,168 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import generations, invalidation
+from core.models import InvalidationEvent
+from posts import feeds, identity, readmodel
+from posts.models import Follow, Group, Post, User
+
+
+class InvalidationBusTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        bus = dict(settings.INVALIDATION_BUS, ENABLED=True, MAX_KEYS=3)
+        self.settings_ = override_settings(INVALIDATION_BUS=bus)
+        self.settings_.enable()
+        self.addCleanup(self.settings_.disable)
+        self.author = User.objects.create_user(username='author')
+        # Соседний узел с тем же кодом, но своим курсором.
+        self.other = invalidation.Node('other')
+        self.other.poll(force=True)
+        self.received = []
+        self.handler = self.received.append
+        invalidation.subscribe(Group, self.handler)
+        self.addCleanup(
+            invalidation._handlers['posts.Group'].remove, self.handler)
+
+    def events(self):
+        return set(InvalidationEvent.objects.values_list('topic', 'key'))
+
+    def test_saves_and_deletes(self):
+        """Записи через модель рассылаются с pk, свои не применяются."""
+        InvalidationEvent.objects.all().delete()
+        group = Group.objects.create(title='Группа', slug='g', description='')
+        reader = User.objects.create_user(username='reader')
+        follow = Follow.objects.create(user=reader, author=self.author)
+        follow_pk = follow.pk
+        follow.delete()
+        self.assertEqual(self.events(), {
+            ('posts.Group', str(group.pk)), ('auth.User', str(reader.pk)),
+            ('posts.Follow', str(follow_pk))})
+        self.assertEqual(InvalidationEvent.objects.count(), 4)
+        self.assertEqual(invalidation.node.poll(force=True), 0)
+        self.assertEqual(self.received, [])
+        table = Group._meta.db_table
+        before, = generations.current(table)
+        self.assertEqual(self.other.poll(force=True), 3)
+        self.assertEqual(self.received, [{str(group.pk)}])
+        self.assertGreater(generations.current(table)[0], before)
+        self.assertEqual(self.other.poll(force=True), 0)
+
+    def test_bulk_writes_coalesce(self):
+        """Массовая запись дает одно событие на таблицу."""
+        InvalidationEvent.objects.all().delete()
+        Group.objects.bulk_create(
+            Group(title=str(i), slug=f'g{i}', description='')
+            for i in range(50))
+        Group.objects.update(description='Описание')
+        self.assertEqual(self.events(), {('posts.Group', '')})
+        self.other.poll(force=True)
+        self.assertEqual(self.received, [None])
+
+    def test_transaction_sends_once(self):
+        """События транзакции уходят одним пакетом после commit."""
+        InvalidationEvent.objects.all().delete()
+        with transaction.atomic():
+            for i in range(5):
+                Group.objects.create(title=str(i), slug=f'g{i}')
+            self.assertFalse(InvalidationEvent.objects.exists())
+        self.assertEqual(self.events(), {('posts.Group', '')})
+        with transaction.atomic():
+            Group.objects.create(title='Откат', slug='rollback')
+            transaction.set_rollback(True)
+        self.assertEqual(InvalidationEvent.objects.count(), 1)
+
+    def test_forgets_cached_objects(self):
+        """Чужая запись убирает объект из кэша identity."""
+        post = Post.objects.create(author=self.author, text='Текст')
+        self.assertEqual(identity.hydrate([post.pk])[0].text, 'Текст')
+        # Другой узел правит пост: строка в базе и событие от его имени.
+        Post.objects.filter(pk=post.pk).update(text='Новый')
+        epoch, = generations.current(generations.epoch(Post._meta.db_table))
+        cache.set(identity.object_key(Post, post.pk, epoch), post)
+        InvalidationEvent.objects.all().delete()
+        InvalidationEvent.objects.create(
+            topic='posts.Post', key=str(post.pk), origin='remote',
+            created=timezone.now())
+        self.assertEqual(identity.hydrate([post.pk])[0].text, 'Текст')
+        self.other.poll(force=True)
+        self.assertEqual(identity.hydrate([post.pk])[0].text, 'Новый')
+
+    def test_interval_and_prune(self):
+        """Опрос не чаще INTERVAL, старые события удаляются."""
+        Group.objects.create(title='Группа', slug='g')
+        self.assertEqual(self.other.poll(), 0)
+        self.assertEqual(invalidation.prune(60), 0)
+        self.assertGreater(invalidation.prune(0), 0)
+        self.assertFalse(InvalidationEvent.objects.exists())
+
+
+class FeedBusTest(TransactionTestCase):
+    """Ленты соседнего узла с локальным кэшем после чужих записей."""
+
+    def setUp(self):
+        cache.clear()
+        bus = dict(settings.INVALIDATION_BUS, ENABLED=True)
+        self.settings_ = override_settings(INVALIDATION_BUS=bus)
+        self.settings_.enable()
+        self.addCleanup(self.settings_.disable)
+        self.author = User.objects.create_user(username='author')
+        self.posts = [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(15)
+        ]
+        self.other = invalidation.Node('other')
+        self.other.poll(force=True)
+        self.step = settings.POSTS_PER_PAGE
+
+    def page(self, number):
+        start = (number - 1) * self.step
+        return [post.pk for post in feeds.LatestPosts()[
+            start:start + self.step]]
+
+    def expected(self, number):
+        pks = list(Post.objects.order_by('-pub_date', '-pk').values_list(
+            'pk', flat=True))
+        return pks[(number - 1) * self.step:number * self.step]
+
+    def remotely(self, write):
+        """write() на другом узле: здешний кэш списков ее не видел."""
+        self.assertEqual(self.page(2), self.expected(2))
+        key = feeds.feed_key({})
+        keys = [key, generations.KEY.format(key)]
+        stale = cache.get_many(keys)
+        write()
+        cache.set_many(stale)
+
+    def test_remote_create_and_delete(self):
+        """Чужие новый и удаленный посты видны в страницах и их числе."""
+        for write in (
+            lambda: Post.objects.create(author=self.author, text='Новый'),
+            lambda: self.posts[3].delete(),
+        ):
+            with self.subTest(write=write):
+                self.remotely(write)
+                self.assertNotEqual(
+                    len(feeds.LatestPosts()), Post.objects.count())
+                self.other.poll(force=True)
+                self.assertEqual(self.page(1), self.expected(1))
+                self.assertEqual(self.page(2), self.expected(2))
+                self.assertEqual(
+                    len(feeds.LatestPosts()), Post.objects.count())
+
+    def test_remote_rebuild_marks_items_fresh(self):
+        """Пересборка FeedItem на другом узле доходит и сюда."""
+        self.assertTrue(readmodel.is_fresh())
+        Post.objects.bulk_create([Post(author=self.author, text='Пачка')])
+        marker = cache.get(readmodel.MARKER)
+        with self.assertLogs('yatube.readmodel', 'WARNING'):
+            self.assertFalse(readmodel.is_fresh())
+        readmodel.rebuild()
+        cache.set(readmodel.MARKER, marker)
+        self.other.poll(force=True)
+        self.assertTrue(readmodel.is_fresh())
+        self.assertEqual(self.page(1), self.expected(1))
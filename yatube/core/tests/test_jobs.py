@@ -0,0 +1,140 @@
+import datetime
+from io import StringIO
+
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+CALLS = []
+FAILURES = {'left': 0}
+
+
+@jobs.task(name='tests.record', max_attempts=3)
+def record(value, suffix=''):
+    if FAILURES['left']:
+        FAILURES['left'] -= 1
+        raise RuntimeError('Сбой')
+    CALLS.append(f'{value}{suffix}')
+
+
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+        FAILURES['left'] = 0
+
+    def make_due(self):
+        Job.objects.update(run_at=timezone.now())
+
+    def test_enqueue_and_run(self):
+        """Задача с аргументами выполняется воркером один раз."""
+        job = record.enqueue('пост', suffix='!')
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(jobs.work_once('test'), 1)
+        self.assertEqual(CALLS, ['пост!'])
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(jobs.work_once('test'), 0)
+
+    def test_scheduled_job_waits(self):
+        """Отложенная задача не берется раньше срока."""
+        record.enqueue('позже', delay=60)
+        self.assertEqual(jobs.work_once('test'), 0)
+        self.make_due()
+        self.assertEqual(jobs.work_once('test'), 1)
+        self.assertEqual(CALLS, ['позже'])
+
+    def test_retries_with_backoff(self):
+        """Упавшая задача повторяется с растущей паузой, потом failed."""
+        FAILURES['left'] = 1
+        record.enqueue('повтор')
+        before = timezone.now()
+        with self.assertLogs('yatube.jobs', 'WARNING'):
+            jobs.work_once('test')
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError', job.last_error)
+        self.assertGreaterEqual(
+            job.run_at,
+            before + datetime.timedelta(seconds=jobs.backoff(1)))
+        self.assertEqual(jobs.backoff(3), 4 * jobs.backoff(1))
+        self.make_due()
+        jobs.work_once('test')
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        FAILURES['left'] = 3
+        record.enqueue('провал')
+        with self.assertLogs('yatube.jobs', 'WARNING'):
+            for _ in range(3):
+                self.make_due()
+                jobs.work_once('test')
+        self.assertEqual(
+            Job.objects.get(status=Job.FAILED).attempts, 3)
+
+    def test_lost_worker_lease(self):
+        """Задачу пропавшего воркера забирает другой."""
+        job = record.enqueue('сирота')
+        lease = settings.JOB_QUEUE['LEASE']
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, locked_by='dead',
+            locked_at=timezone.now() - datetime.timedelta(seconds=lease + 1))
+        self.assertEqual(jobs.work_once('alive'), 1)
+        self.assertEqual(CALLS, ['сирота'])
+
+    def test_queued_email(self):
+        """Письмо уходит в очередь, воркер отправляет его целиком."""
+        connection = mail.get_connection('core.mail.QueuedEmailBackend')
+        message = mail.EmailMultiAlternatives(
+            'Сброс пароля', 'Текст', 'from@yatube.ru', ['to@yatube.ru'],
+            connection=connection, headers={'X-Test': '1'})
+        message.attach_alternative('<b>Текст</b>', 'text/html')
+        message.send()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Job.objects.get().name, 'core.mail.send_email')
+        queue = dict(
+            settings.JOB_QUEUE,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+        with override_settings(JOB_QUEUE=queue):
+            jobs.work_once('test')
+        sent, = mail.outbox
+        self.assertEqual(sent.subject, 'Сброс пароля')
+        self.assertEqual(sent.to, ['to@yatube.ru'])
+        self.assertEqual(sent.extra_headers, {'X-Test': '1'})
+        self.assertEqual(sent.alternatives, [('<b>Текст</b>', 'text/html')])
+
+    def test_run_worker_once(self):
+        """run_worker --once выполняет очередь и выходит."""
+        record.enqueue('команда')
+        out = StringIO()
+        call_command('run_worker', '--once', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertEqual(CALLS, ['команда'])
+
+
+class JobCommitTest(TransactionTestCase):
+
+    def setUp(self):
+        CALLS.clear()
+        FAILURES['left'] = 0
+
+    def test_rollback_drops_job(self):
+        """Задача из откаченной транзакции не выполняется."""
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic():
+                record.enqueue('откат')
+                1 / 0
+        self.assertFalse(Job.objects.exists())
+
+    def test_eager_mode(self):
+        """С EAGER задача выполняется после commit без воркера."""
+        queue = dict(settings.JOB_QUEUE, EAGER=True)
+        with override_settings(JOB_QUEUE=queue):
+            with transaction.atomic():
+                record.enqueue('сразу')
+                self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, ['сразу'])
+        self.assertFalse(Job.objects.exists())
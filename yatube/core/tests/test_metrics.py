@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from core.metrics import Registry, exposition
+from core.views import metrics as metrics_view
+from posts.models import Post, User
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class MetricsRegistryTest(TestCase):
+
+    def test_histogram_exposition(self):
+        """Гистограмма выводится накопленными корзинами Prometheus."""
+        registry = Registry()
+        histogram = registry.histogram(
+            'latency_seconds', 'Задержка.', ('view',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='posts:index')
+        text = exposition(registry.snapshot())
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn(
+            'latency_seconds_bucket{view="posts:index",le="0.1"} 1', text)
+        self.assertIn(
+            'latency_seconds_bucket{view="posts:index",le="1"} 2', text)
+        self.assertIn(
+            'latency_seconds_bucket{view="posts:index",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_count{view="posts:index"} 3', text)
+
+    def test_label_escaping(self):
+        """Кавычки в значениях меток экранируются."""
+        registry = Registry()
+        registry.counter('hits_total', 'Хиты.', ('path',)).inc(path='a"b')
+        self.assertIn(
+            'hits_total{path="a\\"b"} 1', exposition(registry.snapshot()))
+
+
+class MetricsEndpointTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def scrape(self):
+        with override_settings(
+                METRICS=dict(settings.METRICS, TOKEN='secret')):
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_scrape_needs_token(self):
+        """Без токена метрики не отдаются, кроме отладки с INTERNAL_IPS."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        factory = RequestFactory()
+        with override_settings(DEBUG=True):
+            self.assertEqual(metrics_view(factory.get(url)).status_code, 200)
+            with self.assertRaises(Http404):
+                metrics_view(factory.get(url, REMOTE_ADDR='10.0.0.1'))
+        metrics_ = dict(settings.METRICS, TOKEN='secret')
+        with override_settings(METRICS=metrics_, DEBUG=True):
+            for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+                with self.assertRaises(Http404):
+                    metrics_view(factory.get(url, **headers))
+
+    def count(self, text, prefix):
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    def test_views_are_instrumented(self):
+        """Запросы к ленте видны в счетчиках и гистограммах."""
+        prefix = ('yatube_requests_total'
+                  '{view="posts:index",method="GET",status="200"}')
+        before = self.count(self.scrape(), prefix)
+        self.client.get(reverse('posts:index'))
+        text = self.scrape()
+        self.assertEqual(self.count(text, prefix), before + 1)
+        for name in (
+            'yatube_request_duration_seconds_bucket{view="posts:index"',
+            'yatube_db_queries_per_request_count{view="posts:index"}',
+            'yatube_cache_requests_total{result="miss"}',
+        ):
+            with self.subTest(name=name):
+                self.assertIn(name, text)
+
+    @override_settings(METRICS={'DIR': TEMP_DIR, 'FLUSH_INTERVAL': 60})
+    def test_workers_are_aggregated(self):
+        """Снимки других воркеров из общего каталога складываются."""
+        prefix = 'yatube_requests_total{view="about:tech"'
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        with open(os.path.join(TEMP_DIR, '1.json'), 'w') as snapshot:
+            json.dump({'yatube_requests_total': {
+                'type': 'counter',
+                'help': 'Обработанные запросы.',
+                'labels': ['view', 'method', 'status'],
+                'samples': [[['about:tech', 'GET', '200'], 40]],
+            }}, snapshot)
+        own = self.count(self.scrape(), prefix) - 40
+        self.client.get(reverse('about:tech'))
+        self.assertEqual(self.count(self.scrape(), prefix), own + 41)
+
+    @override_settings(METRICS={'DIR': TEMP_DIR, 'FLUSH_INTERVAL': 60})
+    def test_dead_workers_are_dropped(self):
+        """Снимок завершившегося процесса удаляется и не складывается."""
+        worker = subprocess.Popen([sys.executable, '-c', ''])
+        worker.wait()
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        dead = os.path.join(TEMP_DIR, f'{worker.pid}.json')
+        with open(dead, 'w') as snapshot:
+            json.dump({'dead_total': {
+                'type': 'counter', 'help': 'Мертвый.', 'labels': [],
+                'samples': [[[], 1]],
+            }}, snapshot)
+        self.assertNotIn('dead_total', self.scrape())
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(
+            os.path.exists(os.path.join(TEMP_DIR, f'{os.getpid()}.json')))
+
+    @override_settings(METRICS={'DIR': TEMP_DIR, 'FLUSH_INTERVAL': 0})
+    def test_concurrent_flushes(self):
+        """Параллельные сбросы не мешают друг другу и запросам."""
+        registry = Registry()
+        registry.counter('hits_total', 'Хиты.').inc()
+        errors = []
+
+        def flush():
+            try:
+                for _ in range(50):
+                    registry.flush(force=True)
+            except OSError as error:
+                errors.append(error)
+        threads = [threading.Thread(target=flush) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            [name for name in os.listdir(TEMP_DIR) if name.endswith('.tmp')],
+            [])
+        with mock.patch.object(
+                metrics.registry, 'flush', side_effect=OSError('диск')):
+            with self.assertLogs('yatube.metrics', 'ERROR'):
+                response = self.client.get(reverse('about:tech'))
+        self.assertEqual(response.status_code, 200)
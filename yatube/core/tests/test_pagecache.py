@@ -0,0 +1,137 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase, override_settings
+
+from posts import likes
+from posts.models import Comment, Follow, Post, User
+
+
+class SharedPageTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = Post.objects.create(author=self.author, text='Первый')
+        self.anon = Client()
+        self.clients = {}
+        for user in (self.author, self.reader):
+            self.clients[user.username] = Client(enforce_csrf_checks=True)
+            self.clients[user.username].force_login(user)
+
+    def test_one_body_for_everybody(self):
+        """Аноним и пользователи читают одно тело с разными дырками."""
+        response = self.anon.get('/')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Войти')
+        response = self.clients['reader'].get('/')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(response, 'Войти')
+        self.assertNotContains(response, '<!--hole')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.anon.get('/')['X-Page-Cache'], 'hit')
+
+    def test_follow_button_and_post_actions(self):
+        """Кнопка подписки, правка и форма комментария - свои у каждого."""
+        profile = '/profile/author/'
+        self.assertNotContains(self.anon.get(profile), 'Подписаться')
+        response = self.clients['reader'].get(profile)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Отписаться')
+        self.assertNotContains(
+            self.clients['author'].get(profile), 'Подписаться')
+        detail = f'/posts/{self.post.pk}/'
+        self.assertNotContains(self.anon.get(detail), 'Добавить комментарий')
+        self.assertNotContains(
+            self.clients['reader'].get(detail), 'Редактировать запись')
+        response = self.clients['author'].get(detail)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Редактировать запись')
+        token = re.search(
+            r'name="csrfmiddlewaretoken" value="([^"]+)"',
+            response.content.decode()).group(1)
+        response = self.clients['author'].post(
+            f'{detail}comment/',
+            {'text': 'Комментарий', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.filter(post=self.post).exists())
+
+    def test_writes_invalidate_pages(self):
+        """Новый пост сбрасывает общие страницы."""
+        self.anon.get('/group/none/')
+        self.anon.get('/profile/author/')
+        Post.objects.create(author=self.author, text='Второй')
+        response = self.anon.get('/profile/author/')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Второй')
+        self.assertEqual(self.anon.get('/group/none/').status_code, 404)
+
+    def test_bypass_keeps_fragments_shared(self):
+        """Рендер мимо кэша не кладет свои дырки во фрагмент {% cache %}."""
+        likes.like(self.reader, self.post.pk)
+        reader = self.clients['reader']
+        self.assertFalse(reader.head('/').has_header('X-Page-Cache'))
+        response = self.anon.get('/')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertNotContains(response, 'class="text-danger"')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        page_cache = dict(settings.PAGE_CACHE, ENABLED=False)
+        with override_settings(PAGE_CACHE=page_cache):
+            response = reader.get('/')
+        self.assertContains(response, 'class="text-danger"')
+        self.assertNotContains(response, '<!--hole')
+
+    def test_esi(self):
+        """С ESI дырки отдаются прокси отдельными фрагментами."""
+        page_cache = dict(settings.PAGE_CACHE, ESI=True)
+        with override_settings(PAGE_CACHE=page_cache):
+            response = self.clients['reader'].get('/profile/author/')
+            self.assertTrue(
+                response['Surrogate-Control'].startswith('content="ESI/1.0"'))
+            self.assertContains(
+                response, '<esi:include src="/fragments/follow_button/'
+                          '?arg=author"/>')
+            self.assertNotContains(response, 'Пользователь: reader')
+            fragment = self.clients['reader'].get(
+                '/fragments/follow_button/?arg=author')
+            self.assertContains(fragment, 'Отписаться')
+            self.assertEqual(fragment['Cache-Control'], 'private, no-store')
+            self.assertEqual(
+                self.anon.get('/fragments/unknown/').status_code, 404)
+
+    def test_fragment_arguments_are_checked(self):
+        """Фрагмент с чужими аргументами - 400, а не ошибка сервера."""
+        reader = self.clients['reader']
+        self.assertEqual(
+            reader.get(f'/fragments/post_actions/?arg={self.post.pk}')
+            .status_code, 404)
+        page_cache = dict(settings.PAGE_CACHE, ESI=True)
+        with override_settings(PAGE_CACHE=page_cache):
+            for url in (
+                '/fragments/like_button/',
+                '/fragments/like_button/?arg=abc',
+                '/fragments/like_button/?arg=1&arg=2',
+                '/fragments/post_actions/',
+                '/fragments/follow_button/',
+            ):
+                with self.subTest(url=url):
+                    self.assertEqual(reader.get(url).status_code, 400)
+            self.assertEqual(
+                reader.get('/fragments/post_actions/?arg=0').status_code,
+                404)
+            # Автор поста - из базы: чужой author_id в адресе не поможет.
+            response = reader.get(
+                f'/fragments/post_actions/?arg={self.post.pk}'
+                f'&arg={self.reader.pk}')
+            self.assertEqual(response.status_code, 400)
+            response = reader.get(
+                f'/fragments/post_actions/?arg={self.post.pk}')
+            self.assertNotContains(response, 'Редактировать запись')
+            response = self.clients['author'].get(
+                f'/fragments/post_actions/?arg={self.post.pk}')
+            self.assertContains(response, 'Редактировать запись')
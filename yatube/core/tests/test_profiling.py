@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import profiling
+from posts.models import Post, User
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def profiling_settings(**options):
+    return override_settings(PROFILING={
+        **settings.PROFILING,
+        'ENABLED': True,
+        'DIR': TEMP_DIR,
+        **options,
+    })
+
+
+class ProfilingMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def profiles(self):
+        return list(profiling.load(TEMP_DIR))
+
+    @profiling_settings(MODE='sampler', SLOW_MS=0, INTERVAL_MS=1)
+    def test_slow_requests_are_saved(self):
+        """Запрос медленнее порога сохраняется с именем view и SQL."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('about:author'))
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 1)
+        self.assertEqual(profiles[0]['view'], 'posts:index')
+        self.assertGreater(profiles[0]['queries'], 0)
+
+    @profiling_settings(MODE='sampler', SLOW_MS=10 ** 6)
+    def test_fast_requests_are_skipped(self):
+        """Быстрые запросы без выборки не сохраняются."""
+        self.client.get(reverse('posts:index'))
+        self.assertFalse(os.path.exists(TEMP_DIR) and self.profiles())
+
+    @profiling_settings(MODE='cprofile', SAMPLE_RATE=1, MAX_FILES=2)
+    def test_cprofile_rotation_and_report(self):
+        """Каталог профилей ротируется, отчет показывает горячие функции."""
+        for _ in range(3):
+            self.client.get(reverse('posts:index'))
+        profiles = self.profiles()
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(profiles[0]['functions'])
+        out = StringIO()
+        call_command('profile_report', top=50, sort='total_ms', stdout=out)
+        self.assertIn('posts:index', out.getvalue())
+        self.assertIn('render', out.getvalue())
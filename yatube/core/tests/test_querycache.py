@@ -0,0 +1,57 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from core import metrics
+from core.querycache import cached
+from posts.models import Follow, Group, User
+
+
+class QueryCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    def test_results_cached_until_table_write(self):
+        """Повторный запрос идет в кэш, запись в таблицу его сбрасывает."""
+        self.assertEqual(cached(Group.objects).get(slug='group'), self.group)
+        with self.assertNumQueries(0):
+            group = cached(Group.objects).get(slug='group')
+        self.assertEqual(group.title, 'Группа')
+        Group.objects.filter(pk=self.group.pk).update(title='Новое')
+        self.assertEqual(
+            cached(Group.objects).get(slug='group').title, 'Новое')
+
+    def test_exists_and_count(self):
+        """exists() и count() кэшируются и сбрасываются при подписке."""
+        follows = cached(Follow.objects.filter(
+            user=self.reader, author=self.author))
+        self.assertFalse(follows.exists())
+        self.assertEqual(follows.count(), 0)
+        with self.assertNumQueries(0):
+            self.assertFalse(follows.exists())
+            self.assertEqual(follows.count(), 0)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(follows.exists())
+        self.assertEqual(
+            list(follows.values_list('author', flat=True)), [self.author.pk])
+
+    def test_nocache_and_stats(self):
+        """nocache() всегда идет в базу, обращения видны в метриках."""
+        def count(result):
+            samples = metrics.registry.snapshot()['yatube_query_cache_total']
+            return dict(
+                (tuple(key), value) for key, value in samples['samples']
+            ).get(('posts.Group', result), 0)
+
+        before = {result: count(result) for result in ('hit', 'bypass')}
+        queryset = cached(Group.objects.filter(slug='group'))
+        list(queryset)
+        list(queryset.all())
+        with self.assertNumQueries(1):
+            list(queryset.nocache())
+        self.assertEqual(count('hit'), before['hit'] + 1)
+        self.assertEqual(count('bypass'), before['bypass'] + 1)
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import replicas
+from posts.models import Post, User
+
+LAG = {'replica': 0.0}
+
+
+def fake_lag(replica):
+    """Отставание реплики, которое задает тест."""
+    if LAG[replica.alias] is None:
+        raise ConnectionError('Реплика недоступна')
+    return LAG[replica.alias]
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Реплика - копия SQLite')
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = dict(
+            connections.databases['default'],
+            NAME=os.path.join(cls.directory, 'replica.sqlite3'),
+            TEST={})
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections.databases['replica']
+        if hasattr(connections._connections, 'replica'):
+            del connections._connections.replica
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        cache.clear()
+        replicas.reset()
+        LAG['replica'] = 0.0
+        config = dict(
+            settings.REPLICAS, DATABASES=['replica'],
+            LAG_CHECK=f'{__name__}.fake_lag', CHECK_INTERVAL=0)
+        self.settings_ = override_settings(REPLICAS=config)
+        self.settings_.enable()
+        self.addCleanup(self.settings_.disable)
+        self.author = User.objects.create_user(username='author')
+        self.old = Post.objects.create(author=self.author, text='Старый')
+        self.replicate()
+        # Этого поста реплика еще не получила.
+        self.new = Post.objects.create(author=self.author, text='Новый')
+        self.client.force_login(self.author)
+
+    @staticmethod
+    def replicate():
+        """Снимок default в реплику вместо потоковой репликации."""
+        for alias in ('default', 'replica'):
+            connections[alias].ensure_connection()
+        connections['default'].connection.backup(
+            connections['replica'].connection)
+
+    def profile(self, client):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = client.get('/profile/author/')
+        return response, len(queries)
+
+    def test_feeds_read_from_replica(self):
+        """Ленты читаются с реплики, записи идут в default."""
+        response, queries = self.profile(Client())
+        self.assertGreater(queries, 0)
+        self.assertContains(response, 'Старый')
+        self.assertNotContains(response, 'Новый')
+        self.assertNotIn(settings.REPLICAS['COOKIE'], response.cookies)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_writer_is_pinned_to_primary(self):
+        """После записи автор видит свои изменения."""
+        response = self.client.post(
+            f'/posts/{self.old.pk}/edit/', {'text': 'Исправленный'})
+        self.assertEqual(response.status_code, 302)
+        cookie = response.cookies[settings.REPLICAS['COOKIE']]
+        self.assertEqual(cookie['max-age'], settings.REPLICAS['PIN_SECONDS'])
+        response, queries = self.profile(self.client)
+        self.assertEqual(queries, 0)
+        self.assertContains(response, 'Исправленный')
+        self.assertContains(response, 'Новый')
+
+    def test_lagging_replica_falls_back(self):
+        """Отстающая или недоступная реплика не используется."""
+        for lag in (settings.REPLICAS['MAX_LAG'] + 1, None):
+            replicas.reset()
+            LAG['replica'] = lag
+            cache.clear()
+            response, queries = self.profile(Client())
+            self.assertEqual(queries, 0)
+            self.assertContains(response, 'Новый')
@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase, override_settings
+
+from core import jobs
+from core.models import Job
+from core.surrogate import LocalPurgeServer
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class SurrogateKeyTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.server = LocalPurgeServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        settings_ = override_settings(SURROGATE=dict(
+            settings.SURROGATE,
+            TRANSPORT='core.surrogate.HTTPPurgeTransport',
+            OPTIONS={'url': self.server.url}),
+            JOB_QUEUE=dict(settings.JOB_QUEUE, EAGER=True))
+        settings_.enable()
+        self.addCleanup(settings_.disable)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, text='Первый', group=self.group)
+        self.anon = Client()
+        self.client.force_login(self.reader)
+
+    def test_headers(self):
+        """Аноним получает общий ответ с ключами, пользователь - private."""
+        post = f'post-{self.post.pk}'
+        for result in ('miss', 'hit'):
+            response = self.anon.get('/')
+            self.assertEqual(response['X-Page-Cache'], result)
+            self.assertEqual(response['Surrogate-Key'], f'index {post}')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=0')
+            self.assertEqual(response['Surrogate-Control'], 'max-age=86400')
+        response = self.client.get(f'/group/{self.group.slug}/')
+        self.assertEqual(
+            response['Surrogate-Key'], f'group-{self.group.pk} {post}')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('Surrogate-Control'))
+        response = self.anon.get(f'/posts/{self.post.pk}/')
+        self.assertEqual(
+            response['Surrogate-Key'], f'author-{self.author.pk} {post}')
+        self.assertFalse(
+            self.anon.get('/about/author/').has_header('Surrogate-Key'))
+
+    def test_esi_pages_are_shared(self):
+        """С ESI и страница пользователя уходит в общий кэш прокси."""
+        page_cache = dict(settings.PAGE_CACHE, ESI=True)
+        with override_settings(PAGE_CACHE=page_cache):
+            response = self.client.get('/profile/author/')
+        self.assertEqual(
+            response['Surrogate-Control'],
+            'content="ESI/1.0", max-age=86400')
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_writes_purge_keys(self):
+        """Записи сбрасывают ключи всех страниц, где видны изменения."""
+        other = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        self.server.purged.clear()
+        self.post.group = other
+        self.post.save()
+        self.assertEqual(self.server.keys(), {
+            f'post-{self.post.pk}', 'index', f'author-{self.author.pk}',
+            f'group-{self.group.pk}', f'group-{other.pk}'})
+        self.server.purged.clear()
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        group_pk = self.group.pk
+        self.group.delete()
+        self.assertEqual(self.server.keys(), {
+            f'post-{self.post.pk}', f'follow-{self.reader.pk}',
+            f'group-{group_pk}'})
+
+    def test_rename_purges_author_pages(self):
+        """Новое имя автора сбрасывает его профиль и страницы постов."""
+        self.server.purged.clear()
+        self.author.first_name = 'Лев'
+        self.author.save()
+        self.assertEqual(self.server.keys(), {
+            f'author-{self.author.pk}', f'post-{self.post.pk}'})
+        self.server.purged.clear()
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(self.server.keys(), set())
+
+    def test_purge_goes_through_queue(self):
+        """Без EAGER ключи сбрасывает воркер, а не запрос."""
+        queue = dict(settings.JOB_QUEUE, EAGER=False)
+        with override_settings(JOB_QUEUE=queue):
+            self.server.purged.clear()
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий')
+            self.assertEqual(self.server.keys(), set())
+            self.assertEqual(jobs.work_once('test'), 1)
+        self.assertEqual(self.server.keys(), {f'post-{self.post.pk}'})
+
+    def test_failed_purge_is_retried(self):
+        """Недоступный прокси не ломает запись, задача повторяется."""
+        queue = dict(settings.JOB_QUEUE, EAGER=False)
+        surrogate = dict(settings.SURROGATE, OPTIONS={
+            'url': 'http://127.0.0.1:9/', 'timeout': 0.5})
+        with override_settings(JOB_QUEUE=queue, SURROGATE=surrogate):
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий')
+            job = Job.objects.get()
+            self.assertEqual(jobs.execute(jobs.claim('test')), 'retry')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
@@ -0,0 +1,88 @@
+import datetime
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from core import throttle
+from posts.models import Follow, Post, User
+
+
+def rates(**scopes):
+    return override_settings(THROTTLE=dict(
+        settings.THROTTLE, RATES={**settings.THROTTLE['RATES'], **scopes}))
+
+
+class TokenBucketTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills(self):
+        """BURST запросов подряд, дальше - по одному за интервал."""
+        interval = throttle.parse_rate('60/m')
+        self.assertEqual(interval, 1000)
+        now = timezone.now()
+        with mock.patch.object(timezone, 'now', return_value=now):
+            for _ in range(3):
+                self.assertEqual(throttle.consume('key', interval, 3), 0)
+            self.assertAlmostEqual(
+                throttle.consume('key', interval, 3), 1.0, places=2)
+            # Отказ не тратит жетон.
+            self.assertAlmostEqual(
+                throttle.consume('key', interval, 3), 1.0, places=2)
+        later = now + datetime.timedelta(seconds=1)
+        with mock.patch.object(timezone, 'now', return_value=later):
+            self.assertEqual(throttle.consume('key', interval, 3), 0)
+            self.assertGreater(throttle.consume('key', interval, 3), 0)
+        idle = now + datetime.timedelta(minutes=1)
+        with mock.patch.object(timezone, 'now', return_value=idle):
+            for _ in range(3):
+                self.assertEqual(throttle.consume('key', interval, 3), 0)
+
+    def test_anonymous_requests_keyed_by_ip(self):
+        """Анонимы делят ведро по IP."""
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(throttle.ident(request), 'ip:10.0.0.1')
+
+
+class ThrottledViewsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='bot')
+        self.author = User.objects.create_user(username='author')
+        self.client.force_login(self.user)
+
+    def test_post_create_limited(self):
+        """Лишний пост получает 429, форма по GET не ограничена."""
+        with rates(post_create={'RATE': '1/h', 'BURST': 2}):
+            for number in range(2):
+                response = self.client.post(
+                    '/create/', {'text': f'Пост {number}'})
+                self.assertEqual(response.status_code, 302)
+            response = self.client.post('/create/', {'text': 'Лишний'})
+            self.assertEqual(response.status_code, 429)
+            self.assertTrue(
+                3590 <= int(response['Retry-After']) <= 3600,
+                response['Retry-After'])
+            self.assertEqual(self.client.get('/create/').status_code, 200)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_limits_are_per_user_and_scope(self):
+        """Ведра у каждого пользователя и view свои."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        limit = {'RATE': '1/h', 'BURST': 1}
+        with rates(profile_follow=limit, add_comment=limit):
+            self.client.get('/profile/author/follow/')
+            self.assertEqual(
+                self.client.get('/profile/author/follow/').status_code, 429)
+            response = self.client.post(
+                f'/posts/{post.pk}/comment/', {'text': 'Комментарий'})
+            self.assertEqual(response.status_code, 302)
+            self.client.force_login(self.author)
+            self.client.get('/profile/bot/follow/')
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertEqual(post.comments.count(), 1)
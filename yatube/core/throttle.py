@@ -0,0 +1,94 @@
+"""Ограничение частоты записей: token bucket в кэше.
+
+Представление с декоратором throttle(scope) тратит жетон из ведра
+пользователя (анонима - по IP) для этого scope. Ведро вмещает BURST
+жетонов и наполняется со скоростью RATE ('30/h': 30 жетонов в час);
+без жетона ответ - 429 с Retry-After. Лимиты - THROTTLE['RATES'][scope],
+scope без лимита не ограничивается.
+
+Ведро хранится как одно число - момент, когда оно снова станет
+полным (алгоритм GCRA), и меняется только атомарным cache.incr, так
+что процессы с общим кэшем (Redis, Memcached) делят один лимит.
+Отказ возвращает жетон обратно decr. Истекший ключ или пустое ведро
+лишь разрешают запрос, поэтому гонки могут пропустить лишний жетон,
+но не запретить лишнего.
+"""
+import functools
+
+from django.conf import settings
+from django.core.cache import caches
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import metrics
+
+THROTTLED = metrics.registry.counter(
+    'yatube_throttled_total', 'Запросы, отклоненные лимитом частоты.',
+    ('scope',))
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def config():
+    return settings.THROTTLE
+
+
+def parse_rate(rate):
+    """'30/h' -> интервал между жетонами в миллисекундах."""
+    count, period = rate.split('/')
+    return PERIODS[period[0]] * 1000 // int(count)
+
+
+def ident(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return 'ip:{}'.format(request.META.get('REMOTE_ADDR', ''))
+
+
+def consume(key, interval, burst):
+    """Берет жетон; возвращает 0 или сколько секунд ждать следующего."""
+    cache = caches[config()['CACHE']]
+    now = int(timezone.now().timestamp() * 1000)
+    # Ключ нужен, пока ведро не наполнится.
+    timeout = interval * burst // 1000 + 1
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        full_at = None
+    if full_at is None or full_at - interval < now:
+        # Ведро было полным: отсчет заново от текущего момента.
+        full_at = now + interval
+        cache.set(key, full_at, timeout)
+    else:
+        cache.touch(key, timeout)
+    wait = full_at - now - interval * burst
+    if wait <= 0:
+        return 0
+    cache.decr(key, interval)
+    return wait / 1000
+
+
+def throttle(scope, methods=('POST',)):
+    """Ограничивает частоту запросов methods (None - всех) к view."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = config()['RATES'].get(scope)
+            if rate is None or not config()['ENABLED'] or (
+                    methods is not None and request.method not in methods):
+                return view(request, *args, **kwargs)
+            wait = consume(
+                f'throttle:{scope}:{ident(request)}',
+                parse_rate(rate['RATE']), rate['BURST'])
+            if not wait:
+                return view(request, *args, **kwargs)
+            THROTTLED.inc(scope=scope)
+            retry_after = max(1, int(wait + 0.999))
+            response = render(
+                request, 'core/429.html', {'retry_after': retry_after},
+                status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        return wrapper
+    return decorator
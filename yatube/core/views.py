@@ -1,4 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
+
+from . import pagecache
+from .metrics import exposition, registry
 
 
 def page_not_found(request, exception):
@@ -15,3 +23,45 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def _may_scrape(request):
+    token = settings.METRICS.get('TOKEN')
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return hmac.compare_digest(header, f'Bearer {token}')
+    # Без токена - только локальная отладка: за прокси на том же хосте
+    # REMOTE_ADDR всегда 127.0.0.1.
+    return settings.DEBUG and (
+        request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS)
+
+
+def metrics(request):
+    """Метрики всех воркеров в текстовом формате Prometheus.
+
+    Отдаются с заголовком Authorization: Bearer METRICS['TOKEN'], а без
+    токена - только при DEBUG с адресов INTERNAL_IPS.
+    """
+    if not _may_scrape(request):
+        raise Http404
+    return HttpResponse(
+        exposition(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@require_GET
+def fragment(request, name):
+    """Одна дырка страницы для <esi:include>, см. core.pagecache.
+
+    Без PAGE_CACHE['ESI'] фрагменты не отдаются: их никто не включает.
+    """
+    if not settings.PAGE_CACHE['ESI'] or not pagecache.is_registered(name):
+        raise Http404('Нет такого фрагмента.')
+    try:
+        args = pagecache.parse_args(name, request.GET.getlist('arg'))
+    except ValueError:
+        return HttpResponseBadRequest('Неверные аргументы фрагмента.')
+    response = HttpResponse(pagecache.render_hole(request, name, args))
+    response['Cache-Control'] = 'private, no-store'
+    return response
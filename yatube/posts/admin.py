@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Comment, Follow, Post, Group
+from .models import Comment, Follow, Like, Post, Group
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -44,7 +44,17 @@ class FollowAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class LikeAdmin(admin.ModelAdmin):
+    list_display = (
+        'post',
+        'user',
+        'created',
+    )
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(Like, LikeAdmin)
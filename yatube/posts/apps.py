@@ -3,3 +3,21 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from core import generations, invalidation
+
+        from . import counters, feeds, identity, readmodel
+        from . import holes, signals  # noqa: F401
+        from .models import Comment, Follow, Group, Post, User
+        for model in {*identity.MODELS, *readmodel.SOURCES}:
+            generations.bracket(model)
+        # Удаление группы обнуляет group_id ее постов (signals.drop_group).
+        generations.bracket(Group, Post)
+        for model in (Post, Group, User, Comment, Follow):
+            invalidation.watch(model)
+        for model in identity.MODELS:
+            invalidation.subscribe(model, identity.forget(model))
+        invalidation.subscribe(feeds.TOPIC, feeds.forget)
+        invalidation.subscribe(readmodel.TOPIC, readmodel.synced)
+        counters.install()
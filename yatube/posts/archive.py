@@ -0,0 +1,120 @@
+"""Холодный слой карточек лент: ArchivedFeedItem.
+
+Почти все чтения лент приходятся на свежие посты, поэтому карточки
+старше FEED_ARCHIVE_DAYS дней команда archive_feed_items переносит из
+FeedItem в ArchivedFeedItem. Каждая карточка архива старше любой
+горячей, так что лента - это FeedItem, а за ее концом - архив:
+первые страницы архив не трогают вовсе (см. readmodel.page).
+
+В Postgres архив разбит на годовые секции по pub_date (миграция 0009);
+секции на годы вперед создает roll_feed_partitions, а запросы архива
+с границей по дате читают только нужные секции. В SQLite архив -
+обычная таблица.
+"""
+import datetime
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.querycache import cached
+
+from .models import ArchivedFeedItem, FeedItem
+
+BATCH_SIZE = 2000
+TABLE = ArchivedFeedItem._meta.db_table
+
+
+def bound():
+    """Дата самой новой карточки архива или None, если он пуст."""
+    dates = cached(ArchivedFeedItem.objects).order_by(
+        '-pub_date').values_list('pub_date', flat=True)[:1]
+    return dates[0] if dates else None
+
+
+def model_for(pub_date):
+    """Таблица, в которой должна лежать карточка поста с этой датой."""
+    edge = bound()
+    if edge is not None and pub_date <= edge:
+        return ArchivedFeedItem
+    return FeedItem
+
+
+def move(before, using='default'):
+    """Переносит в архив карточки старше before; возвращает их число."""
+    fields = [field.attname for field in FeedItem._meta.concrete_fields]
+    old = FeedItem.objects.using(using).filter(
+        pub_date__lt=before).order_by('pk')
+    moved, last_pk = 0, 0
+    while True:
+        with transaction.atomic(using):
+            rows = list(
+                old.filter(pk__gt=last_pk).values(*fields)[:BATCH_SIZE])
+            if not rows:
+                return moved
+            ArchivedFeedItem.objects.using(using).bulk_create(
+                ArchivedFeedItem(**row) for row in rows)
+            FeedItem.objects.using(using).filter(
+                pk__in=[row['post_id'] for row in rows]).delete()
+        moved += len(rows)
+        last_pk = rows[-1]['post_id']
+
+
+def partition_name(year):
+    return f'{TABLE}_y{year}'
+
+
+def partitioned(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = to_regclass(%s)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def roll(until, using='default'):
+    """Создает годовые секции архива до года until включительно.
+
+    Возвращает имена созданных секций. Год, строки которого уже лежат
+    в секции по умолчанию, пропускается: Postgres не даст его выделить.
+    """
+    connection = connections[using]
+    if not partitioned(using):
+        return []
+    years = [until]
+    for model in (FeedItem, ArchivedFeedItem):
+        first = model.objects.using(using).order_by(
+            'pub_date').values_list('pub_date', flat=True).first()
+        if first is not None:
+            years.append(first.year)
+    start = min(years)
+    created = []
+    with connection.cursor() as cursor:
+        for year in range(start, until + 1):
+            name = partition_name(year)
+            cursor.execute('SELECT to_regclass(%s)', [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            low, high = (
+                datetime.datetime(value, 1, 1, tzinfo=datetime.timezone.utc)
+                for value in (year, year + 1))
+            cursor.execute(
+                f'SELECT 1 FROM {TABLE}_default '
+                'WHERE pub_date >= %s AND pub_date < %s LIMIT 1', [low, high])
+            if cursor.fetchone() is not None:
+                continue
+            cursor.execute(
+                f'CREATE TABLE {connection.ops.quote_name(name)} '
+                f'PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [low, high])
+            created.append(name)
+    return created
+
+
+def archive(days, using='default'):
+    """Секции на год вперед и перенос карточек старше days дней."""
+    before = timezone.now() - datetime.timedelta(days=days)
+    created = roll(timezone.now().year + 1, using)
+    return created, move(before, using)
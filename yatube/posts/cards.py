@@ -0,0 +1,76 @@
+"""Легкие карточки постов для лент.
+
+Вместо экземпляров моделей лента может собираться из кортежей
+values_list() таблицы FeedItem: именованные кортежи не заводят
+_state, __dict__ и объекты полей, а автор и группа на странице
+создаются по одному разу. Карточки отдают ровно то, что читает
+posts/includes/post_list.html и страницы лент.
+"""
+from typing import NamedTuple, Optional
+
+COLUMNS = (
+    'post_id', 'pub_date', 'text', 'image', 'thumbnail_url',
+    'comment_count', 'views', 'author_id', 'author_username',
+    'author_first_name', 'author_last_name', 'group_id', 'group_slug',
+    'group_title',
+)
+
+
+class AuthorCard(NamedTuple):
+    id: int
+    username: str
+    first_name: str
+    last_name: str
+
+    def __str__(self):
+        return self.username
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+
+class GroupCard(NamedTuple):
+    id: int
+    slug: str
+    title: str
+
+    def __str__(self):
+        return self.title
+
+
+class PostCard(NamedTuple):
+    pk: int
+    pub_date: object
+    text: str
+    image: str
+    thumbnail_url: str
+    comment_count: int
+    views: int
+    author: AuthorCard
+    group: Optional[GroupCard]
+
+    def __str__(self):
+        return self.text[:15]
+
+    @property
+    def id(self):
+        return self.pk
+
+
+def from_rows(rows):
+    """Карточки из строк values_list(*COLUMNS)."""
+    authors, groups, cards = {}, {}, []
+    for (pk, pub_date, text, image, thumbnail_url, comment_count, views,
+         author_id, username, first_name, last_name,
+         group_id, slug, title) in rows:
+        author = authors.get(author_id)
+        if author is None:
+            author = authors[author_id] = AuthorCard(
+                author_id, username, first_name, last_name)
+        group = groups.get(group_id)
+        if group is None and group_id is not None:
+            group = groups[group_id] = GroupCard(group_id, slug, title)
+        cards.append(PostCard(
+            pk, pub_date, text, image, thumbnail_url, comment_count, views,
+            author, group))
+    return cards
@@ -0,0 +1,205 @@
+"""Счетчики просмотров постов с отложенной записью.
+
+Просмотр post_detail не пишет в базу: приращения копятся и раз в
+VIEW_COUNTS['FLUSH_INTERVAL'] секунд уходят туда пачкой - одним UPDATE
+с CASE на таблицу (Post, FeedItem, ArchivedFeedItem), сколько бы постов
+ни просмотрели. Строка популярного поста меняется раз за сброс, а не на
+каждый просмотр.
+
+Где копятся приращения, решает VIEW_COUNTS['STORE'] - это выбор между
+точностью и надежностью:
+
+- memory: в памяти процесса, без обращений к кэшу. Процесс сам
+  сбрасывает их после ответа, когда прошел интервал или накопилось
+  MAX_PENDING просмотров; остановка или падение процесса теряет
+  несброшенное.
+- cache: атомарный cache.incr в общем кэше, по корзинам длиной в
+  интервал. Переживает перезапуск процессов; закрытые корзины
+  сбрасывает команда rollup_view_counts (по cron), корзины старше
+  RETENTION секунд пропадают.
+
+Сброс не поднимает поколений таблиц (generations.untracked): ленты и
+страницы в кэше показывают просмотры с опозданием до своего TIMEOUT.
+За кэширующим прокси просмотры страниц из его кэша не считаются.
+"""
+import collections
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from core import generations
+
+from .models import ArchivedFeedItem, FeedItem, Post
+
+MODELS = (Post, FeedItem, ArchivedFeedItem)
+BATCH_SIZE = 500
+LOCK = 'views:lock'
+ROLLED = 'views:rolled'
+
+logger = logging.getLogger('yatube.counters')
+
+
+def config():
+    return settings.VIEW_COUNTS
+
+
+def write(counts, using='default'):
+    """Прибавляет просмотры {id поста: число}; возвращает число постов."""
+    pks = sorted(pk for pk, count in counts.items() if count)
+    tables = [model._meta.db_table for model in MODELS]
+    with generations.untracked(*tables):
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            delta = Case(
+                *(When(pk=pk, then=Value(counts[pk])) for pk in batch),
+                default=Value(0), output_field=PositiveIntegerField())
+            for model in MODELS:
+                # using() без роутера: сброс не привязывает к основной базе.
+                model.objects.using(using).filter(pk__in=batch).update(
+                    views=F('views') + delta)
+    return len(pks)
+
+
+class MemoryStore:
+    """Приращения в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+        self._pending = 0
+        self._flushed = time.monotonic()
+
+    def add(self, pk):
+        with self._lock:
+            self._counts[pk] += 1
+            self._pending += 1
+
+    def due(self):
+        return self._pending > 0 and (
+            self._pending >= config()['MAX_PENDING']
+            or time.monotonic() - self._flushed >= config()['FLUSH_INTERVAL']
+        )
+
+    def flush(self, using='default'):
+        with self._lock:
+            counts, self._counts = self._counts, collections.Counter()
+            pending, self._pending = self._pending, 0
+            self._flushed = time.monotonic()
+        try:
+            return write(counts, using)
+        except Exception:
+            # Просмотры вернутся в следующий сброс.
+            with self._lock:
+                self._counts.update(counts)
+                self._pending += pending
+            raise
+
+
+class CacheStore:
+    """Приращения в общем кэше по корзинам длиной FLUSH_INTERVAL.
+
+    Корзина - счетчики views:<корзина>:<id> и список id постов с
+    ненулевым счетчиком (views:<корзина>:id:<n>). В закрытую корзину
+    никто не пишет, поэтому ее можно прочитать и удалить без гонок.
+    """
+
+    @staticmethod
+    def slot():
+        return int(time.time() // config()['FLUSH_INTERVAL'])
+
+    def add(self, pk):
+        slot, timeout = self.slot(), config()['RETENTION']
+        key = f'views:{slot}:{pk}'
+        if not cache.add(key, 1, timeout):
+            cache.incr(key)
+            return
+        cache.add(f'views:{slot}:n', 0, timeout)
+        number = cache.incr(f'views:{slot}:n')
+        cache.set(f'views:{slot}:id:{number}', pk, timeout)
+
+    def due(self):
+        return False
+
+    def flush(self, using='default'):
+        # Корзина закрыта, когда прошла и следующая: запас на
+        # запросы, начатые до ее конца.
+        last = self.slot() - 2
+        if not cache.add(LOCK, 1, config()['FLUSH_INTERVAL'] * 10):
+            return 0
+        try:
+            oldest = last - config()['RETENTION'] // config()[
+                'FLUSH_INTERVAL']
+            first = max(cache.get(ROLLED, oldest), oldest) + 1
+            counts = collections.Counter()
+            keys = []
+            for slot in range(first, last + 1):
+                counts.update(self._read(slot, keys))
+            written = write(counts, using)
+            cache.set(ROLLED, last, None)
+            cache.delete_many(keys)
+            return written
+        finally:
+            cache.delete(LOCK)
+
+    @staticmethod
+    def _read(slot, keys):
+        number = cache.get(f'views:{slot}:n')
+        if not number:
+            return {}
+        id_keys = [f'views:{slot}:id:{n}' for n in range(1, number + 1)]
+        pks = cache.get_many(id_keys).values()
+        count_keys = {f'views:{slot}:{pk}': pk for pk in pks}
+        counts = cache.get_many(list(count_keys))
+        keys.extend([f'views:{slot}:n', *id_keys, *count_keys])
+        return {count_keys[key]: count for key, count in counts.items()}
+
+
+STORES = {'memory': MemoryStore, 'cache': CacheStore}
+_store = None
+
+
+def store():
+    global _store
+    kind = STORES[config()['STORE']]
+    if not isinstance(_store, kind):
+        _store = kind()
+    return _store
+
+
+def hit(pk):
+    store().add(pk)
+
+
+def flush(using='default'):
+    """Сбрасывает накопленные просмотры; возвращает число постов."""
+    return store().flush(using)
+
+
+def counted(view):
+    """Считает просмотр поста view(request, post_id) с ответом 200."""
+    @functools.wraps(view)
+    def wrapper(request, post_id, *args, **kwargs):
+        response = view(request, post_id, *args, **kwargs)
+        if request.method == 'GET' and response.status_code == 200:
+            hit(post_id)
+        return response
+    return wrapper
+
+
+def _flush_if_due(**kwargs):
+    if not store().due():
+        return
+    try:
+        flush()
+    except Exception:
+        logger.exception('Не удалось записать просмотры постов')
+
+
+def install():
+    request_finished.connect(_flush_if_due, dispatch_uid='posts.counters')
@@ -0,0 +1,183 @@
+"""Списки id самых новых постов каждой ленты в кэше.
+
+Лента - все посты, посты группы или посты автора. Для каждой в кэше
+лежат id и время публикации FEED_PAGES страниц самых новых постов.
+Первые страницы лент собираются из этих списков запросом по id, более
+глубокие - обычным запросом с OFFSET. Пока таблица карточек FeedItem
+свежая (см. posts.readmodel), страницы читаются из нее, а списки лишь
+подсказывают, с какого поста начать срез.
+
+Сигналы сохранения и удаления поста правят списки его лент на месте
+(см. posts.signals). Список действителен, пока не выросли эпоха
+таблицы постов (запись в обход сигналов, см. core.generations) и
+версия самой ленты, которую поднимает каждая правка. Если версия
+ушла дальше, чем на одну правку, значит, список правили параллельно,
+и он пересобирается при следующем чтении.
+
+Правленые ленты расходятся по шине core.invalidation (тема TOPIC):
+соседние узлы с локальным кэшем поднимают у себя их версии, а если
+ключей в событии слишком много - общее поколение ALL всех лент.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from core import generations, invalidation
+
+from . import readmodel
+from .identity import hydrate
+from .models import Post
+from .paginator import estimated_count
+
+FEED_PAGES = 5
+TIMEOUT = 24 * 60 * 60
+EPOCH = generations.epoch(Post._meta.db_table)
+ALL = 'feed:*'
+TOPIC = 'posts.feeds'
+
+
+def length():
+    return FEED_PAGES * settings.POSTS_PER_PAGE
+
+
+def feed_key(filters):
+    return 'feed:' + ','.join(
+        f'{name}={value}' for name, value in sorted(filters.items()))
+
+
+def post_feeds(post):
+    """Фильтры всех лент, в которые входит пост."""
+    feeds = [{}, {'author_id': post.author_id}]
+    if post.group_id is not None:
+        feeds.append({'group_id': post.group_id})
+    return feeds
+
+
+def ordered(queryset):
+    # Порядок списков и запасного запроса должен совпадать до id,
+    # иначе посты с одинаковым временем на стыке страниц задвоятся.
+    return queryset.order_by('-pub_date', '-pk')
+
+
+def rebuild(filters, epoch=None, version=None):
+    """Собирает список ленты из базы и кладет в кэш."""
+    key = feed_key(filters)
+    if epoch is None:
+        *epoch, version = generations.current(EPOCH, ALL, key)
+    rows = ordered(Post.objects.filter(**filters)).values_list(
+        'pk', 'pub_date')[:length()]
+    items = [(pk, pub_date.timestamp()) for pk, pub_date in rows]
+    entry = {
+        'epoch': epoch,
+        'version': version,
+        'items': items,
+        'complete': len(items) < length(),
+    }
+    cache.set(key, entry, TIMEOUT)
+    return entry
+
+
+def latest(filters):
+    """Актуальный список ленты или None, если кэшу сейчас нельзя верить."""
+    if not generations.caching_allowed():
+        return None
+    key = feed_key(filters)
+    *epoch, version = generations.current(EPOCH, ALL, key)
+    entry = cache.get(key)
+    if entry is not None and (
+            entry['epoch'], entry['version']) == (epoch, version):
+        return entry
+    return rebuild(filters, epoch, version)
+
+
+def _add(entry, pk, timestamp):
+    items = [item for item in entry['items'] if item[0] != pk]
+    position = len(items)
+    for index, (other_pk, other_timestamp) in enumerate(items):
+        if (timestamp, pk) > (other_timestamp, other_pk):
+            position = index
+            break
+    if position == len(items) and not entry['complete']:
+        # Пост старше всего списка: между ними могут быть другие посты.
+        return items
+    items.insert(position, (pk, timestamp))
+    if len(items) > length():
+        entry['complete'] = False
+        del items[length():]
+    return items
+
+
+def apply(filters, pk, timestamp=None):
+    """Добавляет пост в список ленты (или убирает при timestamp=None).
+
+    Вызывается после commit, чтобы параллельная пересборка, прочитавшая
+    базу до записи, оказалась со старой версией.
+    """
+    key = feed_key(filters)
+    version, = generations.bump(key)
+    entry = cache.get(key)
+    epoch = list(generations.current(EPOCH, ALL))
+    if entry is None or entry['epoch'] != epoch or (
+            entry['version'] != version - 1):
+        return
+    if timestamp is None:
+        items = [item for item in entry['items'] if item[0] != pk]
+    else:
+        items = _add(entry, pk, timestamp)
+    if not entry['complete'] and len(items) < length() // 2:
+        cache.delete(key)
+        return
+    entry.update(version=version, items=items)
+    cache.set(key, entry, TIMEOUT)
+
+
+def announce(feeds, using='default'):
+    """Рассылает соседним узлам ленты, которые правит запись поста."""
+    for filters in feeds:
+        invalidation.publish(TOPIC, feed_key(filters), using=using)
+
+
+def forget(keys):
+    """Обработчик шины: списки лент, правленые на другом узле, устарели."""
+    if keys is None:
+        generations.bump(ALL)
+    else:
+        generations.bump(*keys)
+
+
+class LatestPosts:
+    """Лента для Paginator: страницы из начала ленты берутся по id."""
+
+    def __init__(self, **filters):
+        self.filters = filters
+        self.queryset = ordered(Post.objects.filter(**filters))
+
+    def __len__(self):
+        entry = latest(self.filters)
+        if entry is not None and entry['complete']:
+            return len(entry['items'])
+        return estimated_count(self.queryset)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if readmodel.is_fresh():
+            start = index.start or 0
+            return readmodel.page(
+                self.filters, start, index.stop, self._boundary(start),
+                cards=settings.FEED_CARDS)
+        entry = latest(self.filters)
+        if entry is None or index.stop is None or (
+                index.stop > len(entry['items']) and not entry['complete']):
+            # С большим OFFSET дешевле пройти только по id.
+            return hydrate(
+                self.queryset.values_list('pk', flat=True)[index])
+        return hydrate(pk for pk, _ in entry['items'][index])
+
+    def _boundary(self, start):
+        """id первого поста среза, если он есть в списке ленты."""
+        if not start:
+            return None
+        entry = latest(self.filters)
+        if entry is not None and start < len(entry['items']):
+            return entry['items'][start][0]
+        return None
@@ -0,0 +1,63 @@
+"""Дырки страниц posts в общем кэше страниц (см. core.pagecache).
+
+Аргументы приходят из метки в кэше или из адреса <esi:include>; из
+адреса их проверяет и приводит pagecache.parse_args по args дырки.
+"""
+from core import pagecache
+from core.querycache import cached
+
+from . import likes
+from .forms import CommentForm
+from .identity import get_post_or_404
+from .models import Follow
+
+
+def follow_button(request, username):
+    user = request.user
+    can_follow = user.is_authenticated and user.username != username
+    following = can_follow and cached(Follow.objects.filter(
+        user=user, author__username=username)).exists()
+    return {
+        'username': username,
+        'can_follow': can_follow,
+        'following': following,
+    }
+
+
+def post_actions(request, post_id):
+    # Автора берем из поста, а не из адреса фрагмента.
+    post = get_post_or_404(int(post_id))
+    return {
+        'post_id': post.pk,
+        'is_author': request.user.pk == post.author_id,
+        'form': CommentForm(),
+    }
+
+
+def like_button(request, post_id):
+    post_id = int(post_id)
+    likes.prefetch(request, [post_id])
+    return {
+        'post_id': post_id,
+        'count': request.like_counts[post_id],
+        'liked': post_id in request.liked_posts,
+    }
+
+
+def prefetch_likes(request, marks):
+    likes.prefetch(request, [post_id for post_id, in marks])
+
+
+pagecache.register('switcher', 'posts/includes/switcher.html')
+pagecache.register(
+    'follow_button', 'posts/includes/holes/follow_button.html',
+    follow_button, args=(str,))
+pagecache.register(
+    'post_actions', 'posts/includes/holes/post_actions.html', post_actions,
+    args=(int,))
+pagecache.register(
+    'like_button', 'posts/includes/holes/like_button.html', like_button,
+    prefetch_likes, args=(int,))
+pagecache.register(
+    'like_badge', 'posts/includes/holes/like_badge.html', like_button,
+    prefetch_likes, args=(int,))
@@ -0,0 +1,128 @@
+"""Кэш отдельных постов, пользователей и групп.
+
+Объект лежит в кэше под ключом с номером схемы VERSION и эпохой своей
+таблицы (см. core.generations): сохранение и удаление через модель
+удаляют ключ сигналом, а запись в обход сигналов поднимает эпоху и
+разом устаревает все объекты таблицы.
+
+hydrate() собирает посты по списку id: один get_many на посты, один на
+их авторов и группы и по одному запросу id__in на каждую модель только
+для того, чего в кэше не оказалось.
+"""
+import copy
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+
+from core import generations
+
+from .models import Group, Post, User
+
+# Поднять при изменении набора полей, чтобы не читать старые объекты.
+VERSION = 2
+TIMEOUT = 15 * 60
+# Пароль и прочие поля пользователя в общий кэш не попадают.
+USER_FIELDS = ('id', 'username', 'first_name', 'last_name')
+MODELS = (Post, User, Group)
+# Метка отсутствующего в базе объекта, чтобы не искать его каждый раз.
+ABSENT = 'absent'
+
+
+def object_key(model, pk, epoch):
+    return f'obj:{VERSION}:{model._meta.label_lower}:{epoch}:{pk}'
+
+
+def _queryset(model):
+    if model is User:
+        return User.objects.only(*USER_FIELDS)
+    return model._default_manager.all()
+
+
+def _bare(instance):
+    # Связанные объекты кэшируются отдельно, со своими ключами.
+    clone = copy.copy(instance)
+    clone._state = copy.copy(instance._state)
+    clone._state.fields_cache = {}
+    return clone
+
+
+def _load(model, pks, epoch):
+    """Объекты модели по pk: из кэша, недостающие - одним запросом."""
+    pks = set(pks)
+    if not pks:
+        return {}
+    keys = {pk: object_key(model, pk, epoch) for pk in pks}
+    cached = cache.get_many(keys.values())
+    found = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = pks - found.keys()
+    if missing:
+        fetched = _queryset(model).in_bulk(missing)
+        cache.set_many({
+            keys[pk]: _bare(fetched[pk]) if pk in fetched else ABSENT
+            for pk in missing
+        }, TIMEOUT)
+        found.update(fetched)
+    return {pk: obj for pk, obj in found.items() if obj != ABSENT}
+
+
+def hydrate(ids):
+    """Посты с авторами и группами в порядке ids; удаленные пропускаются."""
+    ids = list(ids)
+    if not ids:
+        return []
+    if not generations.caching_allowed():
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+    epochs = dict(zip(MODELS, generations.current(
+        *(generations.epoch(model._meta.db_table) for model in MODELS))))
+    posts = _load(Post, ids, epochs[Post])
+    users = _load(
+        User, {post.author_id for post in posts.values()}, epochs[User])
+    groups = _load(
+        Group, {post.group_id for post in posts.values()} - {None},
+        epochs[Group])
+    result = []
+    for pk in ids:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        if post.author_id in users:
+            post.author = users[post.author_id]
+        if post.group_id in groups:
+            post.group = groups[post.group_id]
+        result.append(post)
+    return result
+
+
+def get_post_or_404(pk):
+    posts = hydrate([pk])
+    if not posts:
+        raise Http404('Пост не найден.')
+    return posts[0]
+
+
+def invalidate(instance):
+    """Удаляет объект из кэша сразу и еще раз после commit.
+
+    Второе удаление убирает копию, которую параллельный запрос мог
+    прочитать из базы до commit и положить в кэш.
+    """
+    model = type(instance)._meta.concrete_model
+    epoch, = generations.current(generations.epoch(model._meta.db_table))
+    key = object_key(model, instance.pk, epoch)
+    cache.delete(key)
+    transaction.on_commit(
+        lambda: cache.delete(key), using=instance._state.db)
+
+
+def forget(model):
+    """Обработчик core.invalidation: убирает из кэша чужие записи модели."""
+    table = model._meta.db_table
+
+    def handler(keys):
+        # Для всей таблицы шина уже подняла эпоху.
+        if keys is not None:
+            epoch, = generations.current(generations.epoch(table))
+            cache.delete_many([object_key(model, pk, epoch) for pk in keys])
+    return handler
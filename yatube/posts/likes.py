@@ -0,0 +1,122 @@
+"""Лайки постов со счетчиками по шардам.
+
+Лайк - строка Like с уникальной парой (user, post), поэтому like() и
+unlike() идемпотентны: повторный клик ничего не меняет.
+
+Число лайков поста хранится в LIKES['SHARDS'] строках LikeCounter:
+лайк прибавляет единицу к случайной из них, и одновременные клики по
+популярному посту обновляют разные строки, а не ждут блокировки одной.
+При чтении строки складываются; суммы кэшируются на COUNT_TIMEOUT
+секунд под поколением поста (core.generations), которое лайк поднимает
+после commit. Сумма, прочитанная до commit чужого лайка, ложится под
+старое поколение, и ее уже никто не прочтет. Лайк сбрасывает и ключ
+поста в кэширующем прокси.
+
+prefetch() узнает лайки пользователя и суммы для всех постов страницы
+сразу - по запросу на каждое, а не на каждый пост; дырки like_button и
+like_badge (posts.holes) берут их из request. В лентах стоит like_badge:
+число и отметка без формы - в ней нет CSRF-токена, который меняется с
+каждым ответом; кнопка с формой есть на странице поста.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from core import generations, surrogate
+
+from .models import Like, LikeCounter
+from .surrogates import post_key
+
+KEY = 'likes:{}:{}'
+GENERATION = 'likes:{}'
+
+
+def config():
+    return settings.LIKES
+
+
+def _add(post_id, delta):
+    shard = random.randrange(config()['SHARDS'])
+    counter = LikeCounter.objects.filter(post_id=post_id, shard=shard)
+    if not counter.update(count=F('count') + delta):
+        try:
+            with transaction.atomic():
+                LikeCounter.objects.create(
+                    post_id=post_id, shard=shard, count=delta)
+        except IntegrityError:
+            # Шард успел создать параллельный запрос.
+            counter.update(count=F('count') + delta)
+    # Второй подъем - после commit, см. identity.invalidate.
+    generations.bump(GENERATION.format(post_id))
+    transaction.on_commit(
+        lambda: generations.bump(GENERATION.format(post_id)))
+    surrogate.purge(post_key(post_id))
+
+
+def like(user, post_id):
+    """Ставит лайк; False, если он уже был."""
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Like.objects.create(user=user, post_id=post_id)
+        except IntegrityError:
+            return False
+        _add(post_id, 1)
+    return True
+
+
+def unlike(user, post_id):
+    """Снимает лайк; False, если его не было."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(user=user, post_id=post_id).delete()
+        if not deleted:
+            return False
+        _add(post_id, -1)
+    return True
+
+
+def cache_keys(post_ids):
+    """Ключи сумм в кэше {id: ключ} под текущими поколениями постов."""
+    post_ids = list(post_ids)
+    versions = generations.current(
+        *(GENERATION.format(pk) for pk in post_ids))
+    return {
+        pk: KEY.format(pk, version)
+        for pk, version in zip(post_ids, versions)
+    }
+
+
+def counts(post_ids):
+    """Число лайков постов {id: число}: из кэша, остальное одним запросом."""
+    keys = cache_keys(post_ids)
+    found = cache.get_many(keys.values())
+    result = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in keys if pk not in result]
+    if missing:
+        sums = dict(
+            LikeCounter.objects.filter(post_id__in=missing)
+            .values_list('post_id').annotate(total=Sum('count')))
+        fetched = {pk: sums.get(pk, 0) for pk in missing}
+        if generations.caching_allowed():
+            cache.set_many(
+                {keys[pk]: total for pk, total in fetched.items()},
+                config()['COUNT_TIMEOUT'])
+        result.update(fetched)
+    return result
+
+
+def prefetch(request, post_ids):
+    """Загружает в request лайки и их число для еще не известных постов."""
+    if not hasattr(request, 'like_counts'):
+        request.like_counts, request.liked_posts = {}, set()
+    post_ids = {int(pk) for pk in post_ids} - request.like_counts.keys()
+    if not post_ids:
+        return
+    request.like_counts.update(counts(post_ids))
+    if request.user.is_authenticated:
+        request.liked_posts.update(Like.objects.filter(
+            user=request.user, post_id__in=post_ids,
+        ).values_list('post_id', flat=True))
@@ -0,0 +1,126 @@
+"""Общие помощники для команд массовой выгрузки и загрузки данных."""
+import time
+from contextlib import contextmanager
+
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+from posts.models import (Comment, Follow, Group, Like, LikeCounter, Post,
+                          User)
+
+# Порядок важен: модели идут после тех, на которые ссылаются.
+MODELS = (User, Group, Post, Comment, Follow, Like, LikeCounter)
+
+
+@contextmanager
+def preserve_auto_now(*models):
+    """Отключает auto_now/auto_now_add, чтобы сохранить переданные даты."""
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(
+                    field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+@contextmanager
+def snapshot(using='default'):
+    """Читает все таблицы в одной транзакции, чтобы ссылки сходились.
+
+    На PostgreSQL уровень READ COMMITTED дал бы каждому запросу свой
+    снимок, поэтому транзакция переводится в REPEATABLE READ.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, '
+                    'READ ONLY')
+        yield
+
+
+@contextmanager
+def deferred_indexes(models, using='default'):
+    """Удаляет вторичные индексы на время загрузки и создаёт их заново.
+
+    Работает только на PostgreSQL: там DDL транзакционен, и при ошибке
+    индексы вернутся вместе с откатом. На остальных СУБД ничего не делает.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    definitions = []
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(
+                'SELECT indexname, indexdef FROM pg_indexes '
+                'WHERE tablename = %s AND indexname NOT IN ('
+                '  SELECT cls.relname FROM pg_constraint con'
+                '  JOIN pg_class cls ON cls.oid = con.conindid)',
+                [model._meta.db_table],
+            )
+            definitions.extend(cursor.fetchall())
+        for name, _ in definitions:
+            cursor.execute(
+                'DROP INDEX %s' % connection.ops.quote_name(name))
+    yield
+    with connection.cursor() as cursor:
+        for _, definition in definitions:
+            cursor.execute(definition)
+
+
+def reset_sequences(models, using='default'):
+    """Сдвигает счётчики первичных ключей после вставки с явными id."""
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+class Throughput:
+    """Считает строки и скорость обработки по каждой модели."""
+
+    def __init__(self):
+        self.rows = {}
+        self.started = time.perf_counter()
+        self._model_started = {}
+        self._elapsed = {}
+
+    def start(self, label):
+        self.rows.setdefault(label, 0)
+        self._model_started[label] = time.perf_counter()
+
+    def add(self, label, count):
+        self.rows[label] += count
+
+    def stop(self, label):
+        self._elapsed[label] = (
+            time.perf_counter() - self._model_started.pop(label)
+        )
+
+    def report(self):
+        lines = []
+        for label, rows in self.rows.items():
+            elapsed = self._elapsed.get(label) or 1e-9
+            lines.append(
+                f'{label}: {rows} строк за {elapsed:.2f} с '
+                f'({rows / elapsed:.0f} строк/с)'
+            )
+        total = sum(self.rows.values())
+        elapsed = time.perf_counter() - self.started
+        lines.append(
+            f'Всего: {total} строк за {elapsed:.2f} с '
+            f'({total / max(elapsed, 1e-9):.0f} строк/с)'
+        )
+        return '\n'.join(lines)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит карточки старых постов из FeedItem в архив '
+        'ArchivedFeedItem; в Postgres заодно создает секции архива.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.FEED_ARCHIVE_DAYS,
+            help='Возраст карточек в днях, по умолчанию FEED_ARCHIVE_DAYS.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        created, moved = archive.archive(
+            options['days'], options['database'])
+        for name in created:
+            self.stdout.write(f'Создана секция {name}')
+        self.stdout.write(f'Перенесено в архив карточек: {moved}')
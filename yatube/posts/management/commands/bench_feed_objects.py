@@ -0,0 +1,109 @@
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.test import RequestFactory
+
+from posts import cards
+from posts.models import FeedItem, Post
+
+PAGE = (
+    "{% for post in page %}"
+    "{% include 'posts/includes/post_list.html' %}"
+    "{% endfor %}"
+)
+
+
+def anonymous_request():
+    """Запрос анонима: дырки ленты (лайки) рисуются как на сайте."""
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    return request
+
+
+def load_models(ids):
+    return list(
+        Post.objects.select_related('author', 'group').filter(pk__in=ids)
+        .order_by('-pub_date', '-pk'))
+
+
+def load_items(ids):
+    return list(FeedItem.objects.filter(pk__in=ids))
+
+
+def load_cards(ids):
+    return cards.from_rows(
+        FeedItem.objects.filter(pk__in=ids).values_list(*cards.COLUMNS))
+
+
+LOADERS = (
+    ('Post + select_related', load_models),
+    ('FeedItem', load_items),
+    ('posts.cards', load_cards),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает сборку страниц ленты из экземпляров моделей и из '
+        'легких карточек posts.cards: процессорное время загрузки и '
+        'отрисовки и пик памяти на страницу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=100)
+        parser.add_argument('--rounds', type=int, default=3)
+
+    def handle(self, *args, **options):
+        step = settings.POSTS_PER_PAGE
+        ids = list(
+            FeedItem.objects.values_list('pk', flat=True)
+            [:options['pages'] * step])
+        if not ids:
+            raise CommandError(
+                'FeedItem пуст: запустите seed или rebuild_feed_items.')
+        pages = [ids[start:start + step] for start in range(0, len(ids), step)]
+        template = engines['django'].from_string(PAGE)
+        self.stdout.write(
+            f'{"путь":<24}{"загрузка, мс":>14}{"отрисовка, мс":>16}'
+            f'{"память, КиБ":>14}')
+        for name, load in LOADERS:
+            loading = rendering = float('inf')
+            for _ in range(options['rounds']):
+                load_time, render_time = self.measure(load, template, pages)
+                loading = min(loading, load_time)
+                rendering = min(rendering, render_time)
+            memory = self.peak_memory(load, pages)
+            self.stdout.write(
+                f'{name:<24}{loading * 1000 / len(pages):>14.2f}'
+                f'{rendering * 1000 / len(pages):>16.2f}'
+                f'{memory / 1024:>14.1f}')
+
+    @staticmethod
+    def measure(load, template, pages):
+        loading = rendering = 0.0
+        for page_ids in pages:
+            started = time.process_time()
+            page = load(page_ids)
+            loaded = time.process_time()
+            template.render({'page': page}, anonymous_request())
+            rendering += time.process_time() - loaded
+            loading += loaded - started
+        return loading, rendering
+
+    @staticmethod
+    def peak_memory(load, pages):
+        """Средний пик выделенной памяти при загрузке одной страницы."""
+        total = 0
+        for page_ids in pages:
+            tracemalloc.start()
+            try:
+                page = load(page_ids)
+                total += tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            del page
+        return total / len(pages)
@@ -0,0 +1,90 @@
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.template.backends.django import Template
+from django.test import Client
+from django.urls import reverse
+
+from core import benchmark
+
+PAGES = (
+    ('posts:index', (), 'posts/index.html'),
+    ('posts:group_posts', ('slug',), 'posts/group_list.html'),
+    ('posts:profile', ('username',), 'posts/profile.html'),
+    ('posts:follow_index', (), 'posts/follow.html'),
+    ('posts:post_detail', ('post_id',), 'posts/post_detail.html'),
+)
+
+
+@contextmanager
+def captured_contexts():
+    """Контексты, которые представления передают шаблонам Django."""
+    contexts = {}
+    render = Template.render
+
+    def capture(self, context=None, request=None):
+        contexts.setdefault(self.origin.template_name, dict(context or {}))
+        return render(self, context, request)
+    Template.render = capture
+    try:
+        yield contexts
+    finally:
+        Template.render = render
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время рендеринга горячих шаблонов лент в Django и '
+        'Jinja2 с одним и тем же контекстом, снятым с настоящих страниц.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=200)
+        parser.add_argument('--page', type=int, default=2)
+
+    def handle(self, *args, **options):
+        users = benchmark.bench_users(1)
+        if not users:
+            raise CommandError('База пуста: сначала запустите seed.')
+        client = Client()
+        client.force_login(users[0])
+        samples, _ = benchmark.sample_kwargs(users[0])
+        self.stdout.write(
+            f'{"шаблон":<28}{"Django, мс":>12}{"Jinja2, мс":>12}'
+            f'{"ускорение":>11}')
+        for view_name, params, template in PAGES:
+            kwargs = {name: samples[name] for name in params}
+            with captured_contexts() as contexts:
+                response = client.get(
+                    reverse(view_name, kwargs=kwargs),
+                    {'page': options['page']})
+            if template not in contexts:
+                raise CommandError(
+                    f'{template} отрисован не Django: выключите '
+                    'JINJA2_TEMPLATES.')
+            context = contexts[template]
+            times = [
+                self.measure(
+                    engines[alias].get_template(template), context,
+                    response.wsgi_request, options['rounds'])
+                for alias in ('django', 'jinja2')
+            ]
+            self.stdout.write(
+                f'{template:<28}{times[0] * 1000:>12.3f}'
+                f'{times[1] * 1000:>12.3f}{times[0] / times[1]:>10.1f}x')
+
+    @staticmethod
+    def measure(template, context, request, rounds):
+        """Среднее время рендеринга без кэша фрагмента главной."""
+        key = make_template_fragment_key('index_page')
+        total = 0.0
+        for _ in range(rounds):
+            cache.delete(key)
+            begin = time.perf_counter()
+            template.render(dict(context), request)
+            total += time.perf_counter() - begin
+        return total / rounds
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from ._bulk import MODELS, Throughput, snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает пользователей, группы, посты, комментарии '
+        'и подписки в NDJSON: одна строка на запись. Файлы картинок '
+        'не копируются, сохраняются только их пути.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output', default='-',
+            help='Файл для выгрузки, "-" для stdout.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк забирать из курсора за раз.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        if output == '-':
+            stream, report = self.stdout, self.stderr
+        else:
+            stream = open(output, 'w', encoding='utf-8')
+            report = self.stdout
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        throughput = Throughput()
+        try:
+            with snapshot(options['database']):
+                for model in MODELS:
+                    label = model._meta.label_lower
+                    attnames = [f.attname for f in model._meta.concrete_fields]
+                    rows = (
+                        model._default_manager.using(options['database'])
+                        .order_by('pk')
+                        .values_list(*attnames)
+                        .iterator(chunk_size=options['chunk_size'])
+                    )
+                    throughput.start(label)
+                    for row in rows:
+                        stream.write(encoder.encode({
+                            'model': label,
+                            'fields': dict(zip(attnames, row)),
+                        }) + '\n')
+                        throughput.add(label, 1)
+                    throughput.stop(label)
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        report.write(throughput.report())
@@ -0,0 +1,84 @@
+import json
+import sys
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+
+from ._bulk import (MODELS, Throughput, deferred_indexes, preserve_auto_now,
+                    reset_sequences)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку dump_yatube пачками через bulk_create. '
+        'Проверка внешних ключей откладывается до конца загрузки, '
+        'вторичные индексы на PostgreSQL пересоздаются после вставки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл NDJSON, "-" для stdin.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк вставлять одним запросом.',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['input'] == '-':
+            stream = sys.stdin
+        else:
+            stream = open(options['input'], encoding='utf-8')
+        using = options['database']
+        connection = connections[using]
+        throughput = Throughput()
+        try:
+            with transaction.atomic(using=using), \
+                    connection.constraint_checks_disabled(), \
+                    deferred_indexes(MODELS, using), \
+                    preserve_auto_now(*MODELS):
+                self.load(stream, options['batch_size'], using, throughput)
+                reset_sequences(MODELS, using)
+                connection.check_constraints(
+                    table_names=[m._meta.db_table for m in MODELS])
+        except (DatabaseError, ValueError) as error:
+            raise CommandError(f'Загрузка прервана: {error}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(throughput.report())
+        call_command('rebuild_feed_items', database=using, stdout=self.stdout)
+
+    def load(self, stream, batch_size, using, throughput):
+        model, fields, batch = None, None, []
+        for line in stream:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            label = record['model']
+            if model is None or label != model._meta.label_lower:
+                self.flush(model, batch, using, throughput)
+                if model is not None:
+                    throughput.stop(model._meta.label_lower)
+                model = apps.get_model(label)
+                fields = {f.attname: f for f in model._meta.concrete_fields}
+                batch = []
+                throughput.start(label)
+            batch.append(model(**{
+                name: fields[name].to_python(value)
+                for name, value in record['fields'].items()
+            }))
+            if len(batch) >= batch_size:
+                self.flush(model, batch, using, throughput)
+                batch = []
+        if model is not None:
+            self.flush(model, batch, using, throughput)
+            throughput.stop(model._meta.label_lower)
+
+    @staticmethod
+    def flush(model, batch, using, throughput):
+        if not batch:
+            return
+        model._default_manager.using(using).bulk_create(batch)
+        throughput.add(model._meta.label_lower, len(batch))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import readmodel
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает таблицу карточек лент FeedItem из постов, '
+        'например после загрузки данных в обход сигналов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--thumbnails', action='store_true',
+            help='Сразу построить миниатюры картинок (долго).',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        total = readmodel.rebuild(
+            options['database'], thumbnails=options['thumbnails'])
+        self.stdout.write(f'Карточек лент: {total}')
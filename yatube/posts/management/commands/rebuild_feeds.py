@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает в кэше списки самых новых постов: общей ленты, '
+        'каждой группы и каждого автора.'
+    )
+
+    def handle(self, *args, **options):
+        groups = (
+            Post.objects.exclude(group=None).order_by()
+            .values_list('group_id', flat=True).distinct()
+        )
+        authors = (
+            Post.objects.order_by()
+            .values_list('author_id', flat=True).distinct()
+        )
+        filters = (
+            [{}]
+            + [{'group_id': pk} for pk in groups]
+            + [{'author_id': pk} for pk in authors]
+        )
+        for item in filters:
+            feeds.rebuild(item)
+        self.stdout.write(f'Пересобрано лент: {len(filters)}')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает годовые секции архива карточек лент в Postgres на '
+        'годы вперед; запускать по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--years-ahead', type=int, default=1)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not archive.partitioned(options['database']):
+            self.stdout.write('Архив не секционирован: секции не нужны.')
+            return
+        created = archive.roll(
+            timezone.now().year + options['years_ahead'],
+            options['database'])
+        for name in created:
+            self.stdout.write(f'Создана секция {name}')
+        self.stdout.write(f'Новых секций: {len(created)}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Записывает в базу накопленные просмотры постов. Нужна с '
+        'VIEW_COUNTS["STORE"] = "cache": запускайте по cron чаще '
+        'RETENTION.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        written = counters.flush(options['database'])
+        self.stdout.write(f'Обновлены просмотры постов: {written}')
@@ -0,0 +1,314 @@
+import itertools
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, time, timedelta, timezone
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max
+from faker import Faker
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post, User
+
+from ._bulk import MODELS, Throughput, preserve_auto_now, reset_sequences
+
+IMAGE_POOL_SIZE = 8
+CHUNK_SIZE = 50000
+
+# Заполняется до запуска процессов и наследуется ими при fork.
+_context = {}
+
+
+def _rng(kind, chunk):
+    return random.Random(f'{_context["seed"]}:{kind}:{chunk}')
+
+
+def _pub_date(index):
+    """Даты постов растут вместе с id и равномерно покрывают период."""
+    span = _context['span'].total_seconds()
+    offset = span * index / max(_context['posts'], 1)
+    return _context['start'] + timedelta(seconds=offset)
+
+
+def _text(rng, low, high):
+    words = rng.choices(_context['vocabulary'], k=rng.randint(low, high))
+    return ' '.join(words).capitalize() + '.'
+
+
+def _posts(chunk, size):
+    rng = _rng('posts', chunk)
+    users, groups = _context['users'], _context['groups']
+    images = _context['images']
+    for index in range(chunk * CHUNK_SIZE, chunk * CHUNK_SIZE + size):
+        author = users[rng.choices(
+            _context['ranks'], cum_weights=_context['weights'])[0]]
+        group = None
+        if groups and rng.random() < 0.7:
+            group = groups[rng.randrange(len(groups))]
+        image = ''
+        if images and rng.random() < _context['image_ratio']:
+            image = images[rng.randrange(len(images))]
+        yield Post(
+            pk=_context['post_offset'] + index + 1,
+            text=_text(rng, 8, 60),
+            pub_date=_pub_date(index),
+            author_id=author,
+            group_id=group,
+            image=image,
+        )
+
+
+def _comments(chunk, size):
+    rng = _rng('comments', chunk)
+    users, posts = _context['users'], _context['posts']
+    for index in range(chunk * CHUNK_SIZE, chunk * CHUNK_SIZE + size):
+        # Свежие посты комментируют чаще старых.
+        post = posts - 1 - min(int(rng.expovariate(5 / posts)), posts - 1)
+        yield Comment(
+            pk=_context['comment_offset'] + index + 1,
+            post_id=_context['post_offset'] + post + 1,
+            author_id=users[rng.randrange(len(users))],
+            text=_text(rng, 3, 25),
+            created=_pub_date(post) + timedelta(
+                minutes=rng.expovariate(1 / 600)),
+        )
+
+
+def _follows(chunk, size):
+    """Подписки на популярных авторов распределены по степенному закону.
+
+    Каждый кусок отвечает за свой диапазон подписчиков, поэтому пары
+    (user, author) уникальны без общей памяти между процессами. Если
+    уникальных пар куска не набралось за size * 3 попыток, подписок
+    будет меньше: команда предупредит об этом.
+    """
+    rng = _rng('follows', chunk)
+    users = _context['users']
+    chunks = -(-_context['follows'] // CHUNK_SIZE)
+    per_chunk = -(-len(users) // chunks)
+    followers = users[chunk * per_chunk:(chunk + 1) * per_chunk]
+    seen = set()
+    for _ in range(size * 3):
+        if len(seen) >= size or not followers:
+            break
+        user = followers[rng.randrange(len(followers))]
+        author = users[rng.choices(
+            _context['ranks'], cum_weights=_context['weights'])[0]]
+        if user != author and (user, author) not in seen:
+            seen.add((user, author))
+            yield Follow(
+                pk=_context['follow_offset'] + chunk * CHUNK_SIZE + len(seen),
+                user_id=user,
+                author_id=author,
+            )
+
+
+GENERATORS = {
+    'posts.post': _posts,
+    'posts.comment': _comments,
+    'posts.follow': _follows,
+}
+
+
+def _insert_chunk(label, chunk, size):
+    model = {m._meta.label_lower: m for m in MODELS}[label]
+    using = _context['database']
+    rows = GENERATORS[label](chunk, size)
+    inserted = 0
+    with transaction.atomic(using=using), preserve_auto_now(Post, Comment):
+        while True:
+            batch = list(itertools.islice(rows, _context['batch_size']))
+            if not batch:
+                break
+            model._default_manager.using(using).bulk_create(batch)
+            inserted += len(batch)
+    return label, inserted
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу правдоподобными данными для нагрузочных тестов: '
+        'число подписчиков подчиняется степенному закону, даты постов '
+        'растянуты на несколько лет. Одинаковые параметры и --seed дают '
+        'одинаковые данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--years', type=float, default=5,
+            help='На сколько лет назад растягивать даты публикаций.',
+        )
+        parser.add_argument(
+            '--end', type=lambda value: datetime.combine(
+                datetime.strptime(value, '%Y-%m-%d'), time(),
+                tzinfo=timezone.utc),
+            help='Дата последнего поста (ГГГГ-ММ-ДД), по умолчанию сегодня.',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов.',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с картинкой, от 0 до 1.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Число процессов; на SQLite всегда один.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images должно быть от 0 до 1.')
+        using = options['database']
+        end = options['end'] or datetime.combine(
+            datetime.now(timezone.utc).date(), time(), tzinfo=timezone.utc)
+        span = timedelta(days=365.25 * options['years'])
+        throughput = Throughput()
+        faker = Faker('ru_RU')
+        faker.seed_instance(options['seed'])
+        _context.update(
+            seed=options['seed'],
+            database=using,
+            batch_size=options['batch_size'],
+            start=end - span,
+            span=span,
+            posts=options['posts'],
+            follows=options['follows'],
+            image_ratio=options['images'],
+            vocabulary=faker.words(2000),
+            post_offset=self.max_pk(Post, using),
+            comment_offset=self.max_pk(Comment, using),
+            follow_offset=self.max_pk(Follow, using),
+        )
+        _context['users'] = self.create_users(
+            faker, options['users'], using, throughput)
+        _context['groups'] = self.create_groups(
+            faker, options['groups'], using, throughput)
+        _context['images'] = (
+            self.create_images() if options['images'] else [])
+        ranks = list(range(len(_context['users'])))
+        _rng('authors', 0).shuffle(ranks)
+        _context['ranks'] = ranks
+        _context['weights'] = list(itertools.accumulate(
+            1 / (rank + 1) ** options['alpha'] for rank in range(len(ranks))))
+
+        workers = options['workers']
+        if connections[using].vendor == 'sqlite':
+            workers = 1
+        for model, total in ((Post, options['posts']),
+                             (Comment, options['comments']),
+                             (Follow, options['follows'])):
+            if model is Comment and not options['posts']:
+                continue
+            if total and _context['users']:
+                self.run_chunks(
+                    model._meta.label_lower, total, workers, throughput)
+        reset_sequences(MODELS, using)
+        self.stdout.write(throughput.report())
+        call_command('rebuild_feed_items', database=using, stdout=self.stdout)
+
+    @staticmethod
+    def max_pk(model, using):
+        return model._default_manager.using(using).aggregate(
+            top=Max('pk'))['top'] or 0
+
+    def create_users(self, faker, count, using, throughput):
+        throughput.start('auth.user')
+        password = make_password('yatube-seed')
+        first_names = [faker.first_name() for _ in range(200)]
+        last_names = [faker.last_name() for _ in range(200)]
+        rng = _rng('users', 0)
+        offset = self.max_pk(User, using)
+        joined = _context['start'] - timedelta(days=30)
+        users = (
+            User(
+                pk=offset + index,
+                username=f'seed{offset + index}',
+                email=f'seed{offset + index}@example.com',
+                first_name=rng.choice(first_names),
+                last_name=rng.choice(last_names),
+                password=password,
+                date_joined=joined,
+            )
+            for index in range(1, count + 1)
+        )
+        while True:
+            batch = list(itertools.islice(users, _context['batch_size']))
+            if not batch:
+                break
+            User.objects.using(using).bulk_create(batch)
+            throughput.add('auth.user', len(batch))
+        throughput.stop('auth.user')
+        return list(range(offset + 1, offset + count + 1))
+
+    def create_groups(self, faker, count, using, throughput):
+        throughput.start('posts.group')
+        offset = self.max_pk(Group, using)
+        groups = Group.objects.using(using).bulk_create(
+            Group(
+                pk=offset + index,
+                title=' '.join(faker.words(2)).capitalize(),
+                slug=f'seed-{offset + index}',
+                description=faker.sentence(),
+            )
+            for index in range(1, count + 1)
+        )
+        throughput.add('posts.group', len(groups))
+        throughput.stop('posts.group')
+        return list(range(offset + 1, offset + count + 1))
+
+    def create_images(self):
+        rng = _rng('images', 0)
+        folder = os.path.join(settings.MEDIA_ROOT, 'posts', 'seed')
+        os.makedirs(folder, exist_ok=True)
+        names = []
+        for index in range(IMAGE_POOL_SIZE):
+            name = f'posts/seed/seed_{index}.jpg'
+            color = tuple(rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (960, 339), color).save(
+                os.path.join(settings.MEDIA_ROOT, name), 'JPEG')
+            names.append(name)
+        return names
+
+    def run_chunks(self, label, total, workers, throughput):
+        chunks = [
+            (chunk, min(CHUNK_SIZE, total - chunk * CHUNK_SIZE))
+            for chunk in range(-(-total // CHUNK_SIZE))
+        ]
+        throughput.start(label)
+        if workers == 1 or len(chunks) == 1:
+            for chunk, size in chunks:
+                throughput.add(label, _insert_chunk(label, chunk, size)[1])
+        else:
+            # Дочерние процессы должны открыть собственные соединения.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('fork')) as pool:
+                futures = [
+                    pool.submit(_insert_chunk, label, chunk, size)
+                    for chunk, size in chunks
+                ]
+                for future in as_completed(futures):
+                    throughput.add(label, future.result()[1])
+        throughput.stop(label)
+        created = throughput.rows[label]
+        if created < total:
+            self.stderr.write(self.style.WARNING(
+                f'{label}: создано {created} строк из {total} - не хватило '
+                f'уникальных пар, увеличьте --users.'))
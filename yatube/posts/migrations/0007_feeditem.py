@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_auto_20220605_1512'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_item', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('text', models.TextField(verbose_name='Текст поста')),
+                ('image', models.ImageField(blank=True, upload_to='posts/', verbose_name='Картинка')),
+                ('thumbnail_url', models.CharField(blank=True, max_length=255, verbose_name='Адрес миниатюры')),
+                ('author_username', models.CharField(max_length=150)),
+                ('author_first_name', models.CharField(blank=True, max_length=150)),
+                ('author_last_name', models.CharField(blank=True, max_length=150)),
+                ('group_slug', models.SlugField(blank=True)),
+                ('group_title', models.CharField(blank=True, max_length=200)),
+                ('comment_count', models.PositiveIntegerField(default=0, verbose_name='Число комментариев')),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор поста')),
+                ('group', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Карточка ленты',
+                'verbose_name_plural': 'Карточки ленты',
+                'ordering': ['-pub_date', '-post'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['-pub_date', '-post'], name='feeditem_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['author', '-pub_date', '-post'], name='feeditem_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['group', '-pub_date', '-post'], name='feeditem_group_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+from django.db.models import Count
+
+BATCH_SIZE = 2000
+
+
+def fill_feed_items(apps, schema_editor):
+    """Карточки для уже существующих постов; миниатюры - при выводе."""
+    Post = apps.get_model('posts', 'Post')
+    FeedItem = apps.get_model('posts', 'FeedItem')
+    using = schema_editor.connection.alias
+    posts = (
+        Post.objects.using(using).order_by('pk')
+        .select_related('author', 'group')
+        .annotate(comment_count=Count('comments'))
+    )
+    last_pk = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        FeedItem.objects.using(using).bulk_create(
+            FeedItem(
+                post_id=post.pk,
+                author_id=post.author_id,
+                group_id=post.group_id,
+                pub_date=post.pub_date,
+                text=post.text,
+                image=post.image.name or '',
+                author_username=post.author.username,
+                author_first_name=post.author.first_name,
+                author_last_name=post.author.last_name,
+                group_slug=post.group.slug if post.group else '',
+                group_title=post.group.title if post.group else '',
+                comment_count=post.comment_count,
+            )
+            for post in batch
+        )
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_feeditem'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+PARTITIONED_SQL = [
+    'DROP TABLE posts_archivedfeeditem',
+    '''
+    CREATE TABLE posts_archivedfeeditem (
+        post_id integer NOT NULL REFERENCES posts_post (id)
+            DEFERRABLE INITIALLY DEFERRED,
+        author_id integer NOT NULL REFERENCES {users} (id)
+            DEFERRABLE INITIALLY DEFERRED,
+        group_id integer NULL REFERENCES posts_group (id)
+            DEFERRABLE INITIALLY DEFERRED,
+        pub_date timestamp with time zone NOT NULL,
+        text text NOT NULL,
+        image varchar(100) NOT NULL,
+        thumbnail_url varchar(255) NOT NULL,
+        author_username varchar(150) NOT NULL,
+        author_first_name varchar(150) NOT NULL,
+        author_last_name varchar(150) NOT NULL,
+        group_slug varchar(50) NOT NULL,
+        group_title varchar(200) NOT NULL,
+        comment_count integer NOT NULL CHECK (comment_count >= 0),
+        PRIMARY KEY (post_id, pub_date)
+    ) PARTITION BY RANGE (pub_date)
+    ''',
+    '''
+    CREATE INDEX archiveditem_date_idx
+    ON posts_archivedfeeditem (pub_date DESC, post_id DESC)
+    ''',
+    '''
+    CREATE INDEX archiveditem_author_idx
+    ON posts_archivedfeeditem (author_id, pub_date DESC, post_id DESC)
+    ''',
+    '''
+    CREATE INDEX archiveditem_group_idx
+    ON posts_archivedfeeditem (group_id, pub_date DESC, post_id DESC)
+    ''',
+    '''
+    CREATE TABLE posts_archivedfeeditem_default
+    PARTITION OF posts_archivedfeeditem DEFAULT
+    ''',
+]
+
+
+def partition_archive(apps, schema_editor):
+    """В Postgres архив - таблица, разбитая по годам pub_date.
+
+    Первичный ключ секционированной таблицы обязан включать ключ
+    секций, поэтому он (post_id, pub_date); уникальность post_id
+    держит код: карточка переносится из FeedItem один раз.
+    Годовые секции создает команда roll_feed_partitions.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    users = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    for statement in PARTITIONED_SQL:
+        schema_editor.execute(
+            statement.format(users=schema_editor.quote_name(users)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_fill_feeditem'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='feeditem',
+            options={'ordering': ['-pub_date', '-post_id'], 'verbose_name': 'Карточка ленты', 'verbose_name_plural': 'Карточки ленты'},
+        ),
+        migrations.CreateModel(
+            name='ArchivedFeedItem',
+            fields=[
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('text', models.TextField(verbose_name='Текст поста')),
+                ('image', models.ImageField(blank=True, upload_to='posts/', verbose_name='Картинка')),
+                ('thumbnail_url', models.CharField(blank=True, max_length=255, verbose_name='Адрес миниатюры')),
+                ('author_username', models.CharField(max_length=150)),
+                ('author_first_name', models.CharField(blank=True, max_length=150)),
+                ('author_last_name', models.CharField(blank=True, max_length=150)),
+                ('group_slug', models.SlugField(blank=True)),
+                ('group_title', models.CharField(blank=True, max_length=200)),
+                ('comment_count', models.PositiveIntegerField(default=0, verbose_name='Число комментариев')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='archived_feed_item', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('author', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор поста')),
+                ('group', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Архивная карточка ленты',
+                'verbose_name_plural': 'Архивные карточки ленты',
+                'ordering': ['-pub_date', '-post_id'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedfeeditem',
+            index=models.Index(fields=['-pub_date', '-post'], name='archiveditem_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedfeeditem',
+            index=models.Index(fields=['author', '-pub_date', '-post'], name='archiveditem_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedfeeditem',
+            index=models.Index(fields=['group', '-pub_date', '-post'], name='archiveditem_group_idx'),
+        ),
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
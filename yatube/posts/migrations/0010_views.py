@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_archivedfeeditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedfeeditem',
+            name='views',
+            field=models.PositiveIntegerField(default=0, verbose_name='Просмотры'),
+        ),
+        migrations.AddField(
+            model_name='feeditem',
+            name='views',
+            field=models.PositiveIntegerField(default=0, verbose_name='Просмотры'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='views',
+            field=models.PositiveIntegerField(default=0, verbose_name='Просмотры'),
+        ),
+    ]
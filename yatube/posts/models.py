@@ -46,6 +46,10 @@ class Post(models.Model):
         blank=True,
         verbose_name="Картинка",
     )
+    views = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Просмотры",
+    )
 
     class Meta:
         ordering = ['-pub_date']
@@ -55,6 +59,16 @@ class Post(models.Model):
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Просмотры пишет только posts.counters: правка поста не должна
+        # затирать накопленное с тех пор, как он был прочитан.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'views'
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -110,3 +124,179 @@ class Follow(models.Model):
                 name='unique_follow',
             )
         ]
+
+
+class Like(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name="Пользователь",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='likes',
+        verbose_name="Пост",
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name="Дата",
+    )
+
+    class Meta:
+        verbose_name = 'Лайк'
+        verbose_name_plural = 'Лайки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_like',
+            )
+        ]
+
+
+class LikeCounter(models.Model):
+    """Доля числа лайков поста, см. posts.likes."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='like_counters',
+        verbose_name="Пост",
+    )
+    shard = models.PositiveSmallIntegerField(verbose_name="Шард")
+    # Отдельный шард может уйти в минус: верна только сумма.
+    count = models.IntegerField(default=0, verbose_name="Лайки")
+
+    class Meta:
+        verbose_name = 'Счетчик лайков'
+        verbose_name_plural = 'Счетчики лайков'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'shard'],
+                name='unique_like_shard',
+            )
+        ]
+
+
+class BaseFeedItem(models.Model):
+    """Карточка поста для лент: все, что нужно post_list.html, в одной
+    строке без JOIN (см. posts.readmodel)."""
+    # Отдельные индексы по FK не нужны: их покрывают составные ниже.
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,
+        verbose_name="Автор поста",
+    )
+    group = models.ForeignKey(
+        Group,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        db_index=False,
+        verbose_name="Группа",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+    text = models.TextField(verbose_name="Текст поста")
+    image = models.ImageField(
+        upload_to='posts/',
+        blank=True,
+        verbose_name="Картинка",
+    )
+    thumbnail_url = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name="Адрес миниатюры",
+    )
+    author_username = models.CharField(max_length=150)
+    author_first_name = models.CharField(max_length=150, blank=True)
+    author_last_name = models.CharField(max_length=150, blank=True)
+    group_slug = models.SlugField(blank=True)
+    group_title = models.CharField(max_length=200, blank=True)
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Число комментариев",
+    )
+    views = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Просмотры",
+    )
+
+    class Meta:
+        abstract = True
+        # post_id, а не post: иначе Django сортирует по полям Post через JOIN.
+        ordering = ['-pub_date', '-post_id']
+
+    def __str__(self):
+        return self.text[:15]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Автор и группа собираются из своих колонок, без запросов.
+        item = super().from_db(db, field_names, values)
+        if 'author_username' in item.__dict__:
+            author = User(
+                id=item.author_id,
+                username=item.author_username,
+                first_name=item.author_first_name,
+                last_name=item.author_last_name,
+            )
+            author._state.adding, author._state.db = False, db
+            item.author = author
+        if item.group_id is not None and 'group_slug' in item.__dict__:
+            group = Group(
+                id=item.group_id, slug=item.group_slug, title=item.group_title)
+            group._state.adding, group._state.db = False, db
+            item.group = group
+        return item
+
+
+class FeedItem(BaseFeedItem):
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='feed_item',
+        verbose_name="Пост",
+    )
+
+    class Meta(BaseFeedItem.Meta):
+        verbose_name = 'Карточка ленты'
+        verbose_name_plural = 'Карточки ленты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-post'], name='feeditem_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-post'],
+                name='feeditem_author_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-post'],
+                name='feeditem_group_idx'),
+        ]
+
+
+class ArchivedFeedItem(BaseFeedItem):
+    """Карточка старого поста: холодный слой лент (см. posts.archive)."""
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='archived_feed_item',
+        verbose_name="Пост",
+    )
+
+    class Meta(BaseFeedItem.Meta):
+        verbose_name = 'Архивная карточка ленты'
+        verbose_name_plural = 'Архивные карточки ленты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-post'], name='archiveditem_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-post'],
+                name='archiveditem_author_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-post'],
+                name='archiveditem_group_idx'),
+        ]
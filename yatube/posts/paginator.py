@@ -0,0 +1,104 @@
+"""Постраничный вывод лент без COUNT(*) на каждый запрос и без
+ссылки на каждую страницу.
+
+Число постов берется из кэша, где хранится вместе с поколениями
+таблиц (см. core.generations), а для большой таблицы без фильтров на
+PostgreSQL - из статистики pg_class.reltuples. Навигация показывает
+только окно страниц вокруг текущей.
+"""
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from core import generations
+
+ON_EACH_SIDE = 2
+ON_ENDS = 1
+# С какого размера таблицы оценка статистики точнее не нужна.
+ESTIMATE_THRESHOLD = 100000
+COUNT_TIMEOUT = 60 * 60
+
+
+def cached_count(queryset):
+    """Точное число объектов, пересчитываемое только после записи."""
+    if not generations.caching_allowed(queryset.db):
+        return queryset.count()
+    try:
+        sql, tables = generations.describe(queryset)
+    except EmptyResultSet:
+        # Например, фильтр author__in по пустому списку подписок.
+        return 0
+    key = 'count:{}:{}'.format(
+        md5(sql.encode()).hexdigest(),
+        '.'.join(map(str, generations.current(*tables))),
+    )
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
+
+
+def _reltuples(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    query = queryset.query
+    if query.where or query.distinct or query.low_mark or query.high_mark:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def estimated_count(queryset):
+    """Оценка по статистике для огромных таблиц, иначе cached_count."""
+    estimate = _reltuples(queryset)
+    if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+        return int(estimate)
+    return cached_count(queryset)
+
+
+def page_window(number, num_pages, on_each_side=ON_EACH_SIDE,
+                on_ends=ON_ENDS):
+    """Номера страниц вокруг текущей и по краям; None - пропуск."""
+    if num_pages <= (on_each_side + on_ends) * 2 + 1:
+        return list(range(1, num_pages + 1))
+    window = []
+    if number > on_each_side + on_ends + 2:
+        window.extend(range(1, on_ends + 1))
+        window.append(None)
+        window.extend(range(number - on_each_side, number + 1))
+    else:
+        window.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        window.extend(range(number + 1, number + on_each_side + 1))
+        window.append(None)
+        window.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        window.extend(range(number + 1, num_pages + 1))
+    return window
+
+
+class ApproximatePaginator(Paginator):
+    """Paginator с оценкой числа объектов и окном страниц в page.window."""
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            return estimated_count(self.object_list)
+        return len(self.object_list)
+
+    def page(self, number):
+        page = super().page(number)
+        page.window = page_window(page.number, self.num_pages)
+        return page
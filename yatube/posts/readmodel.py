@@ -0,0 +1,268 @@
+"""Таблица FeedItem - готовые карточки лент.
+
+Карточки пишут обработчики сигналов в той же транзакции, что и
+исходные данные: сохранение поста, новый или удаленный комментарий,
+смена имени автора или названия группы, удаление группы; удаление
+поста удаляет и карточку каскадом. Миниатюру строит фоновая задача
+(core.jobs), до этого шаблон строит ее сам из image.
+
+Карточки старых постов лежат в архиве ArchivedFeedItem (posts.archive):
+обработчики правят ту таблицу, где карточка есть, а page() дочитывает
+из архива страницы за концом FeedItem.
+
+Запись в исходные таблицы в обход сигналов (bulk_create, update(),
+сырой SQL) поднимает их эпохи (core.generations), и таблице перестают
+верить: ленты читаются из Post, пока rebuild_feed_items ее не
+пересоберет. Отметка или эпоха, пропавшие из кэша, считаются свежими -
+загрузчики данных (seed, load_yatube) пересобирают таблицу сами. О
+пересборке узнают и соседние узлы: отметка идет по шине
+core.invalidation.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Subquery
+from sorl.thumbnail import get_thumbnail
+
+from core import generations, invalidation
+from core.jobs import task
+
+from . import archive
+from .cards import COLUMNS, from_rows
+from .models import ArchivedFeedItem, Comment, FeedItem, Group, Post, User
+
+SOURCES = (Post, Comment, User, Group)
+TABLES = (FeedItem, ArchivedFeedItem)
+MARKER = 'feeditem:synced'
+TOPIC = 'posts.readmodel'
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+BATCH_SIZE = 2000
+
+logger = logging.getLogger('yatube.readmodel')
+_reported = None
+
+
+def _names():
+    return [generations.epoch(model._meta.db_table) for model in SOURCES]
+
+
+def _epochs():
+    return generations.current(*_names())
+
+
+def _recreated(marker, epochs):
+    """Отличия от отметки - только заново созданные эпохи."""
+    if len(marker) != len(epochs):
+        return False
+    for name, old, new in zip(_names(), marker, epochs):
+        if old != new and not (new == generations.born(name) and new > old):
+            return False
+    return True
+
+
+def is_fresh():
+    """Можно ли читать ленты из FeedItem."""
+    global _reported
+    if not generations.caching_allowed():
+        return False
+    epochs = _epochs()
+    cache.add(MARKER, epochs, None)
+    marker = tuple(cache.get(MARKER) or ())
+    if marker == epochs:
+        return True
+    if _recreated(marker, epochs):
+        # Эпоху вытеснили из кэша: как и с пропавшей отметкой, записи
+        # в обход сигналов за это время не узнать.
+        cache.set(MARKER, epochs, None)
+        return True
+    if _reported != marker:
+        _reported = marker
+        logger.warning(
+            'FeedItem отстал от постов после записи в обход сигналов, '
+            'ленты читаются из Post; запустите rebuild_feed_items.')
+    return False
+
+
+def item_fields(post):
+    """Колонки карточки, кроме числа комментариев и просмотров."""
+    author, group = post.author, post.group
+    return {
+        'author_id': post.author_id,
+        'group_id': post.group_id,
+        'pub_date': post.pub_date,
+        'text': post.text,
+        'image': post.image.name or '',
+        'thumbnail_url': '',
+        'author_username': author.username,
+        'author_first_name': author.first_name,
+        'author_last_name': author.last_name,
+        'group_slug': group.slug if group else '',
+        'group_title': group.title if group else '',
+    }
+
+
+def _update(filters, **fields):
+    """Правит карточки в обеих таблицах; возвращает число строк."""
+    return sum(
+        model.objects.filter(**filters).update(**fields) for model in TABLES)
+
+
+def sync_post(post):
+    fields = item_fields(post)
+    if not _update({'pk': post.pk}, **fields):
+        archive.model_for(post.pub_date).objects.create(
+            post_id=post.pk, comment_count=post.comments.count(),
+            views=post.views, **fields)
+    if fields['image']:
+        update_thumbnail.enqueue(post.pk, using=post._state.db)
+
+
+@task
+def update_thumbnail(pk):
+    """Строит миниатюру карточки; ошибка - повод повторить задачу."""
+    item = (
+        FeedItem.objects.filter(pk=pk).only('image').first()
+        or ArchivedFeedItem.objects.filter(pk=pk).only('image').first()
+    )
+    if item is None or not item.image:
+        return
+    url = get_thumbnail(
+        item.image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS).url
+    if url:
+        type(item).objects.filter(pk=pk).update(thumbnail_url=url)
+
+
+def sync_comment_count(post_id):
+    _update(
+        {'pk': post_id},
+        comment_count=Comment.objects.filter(post_id=post_id).count())
+
+
+def sync_author(user):
+    _update(
+        {'author_id': user.pk},
+        author_username=user.username,
+        author_first_name=user.first_name,
+        author_last_name=user.last_name,
+    )
+
+
+def sync_group(group):
+    _update(
+        {'group_id': group.pk}, group_slug=group.slug, group_title=group.title)
+
+
+def drop_group(group):
+    _update(
+        {'group_id': group.pk}, group_id=None, group_slug='', group_title='')
+
+
+def rebuild(using='default', thumbnails=False):
+    """Пересобирает обе таблицы целиком и возвращает число карточек.
+
+    Граница архива сохраняется: карточки не новее нее снова идут в
+    ArchivedFeedItem.
+    """
+    # Эпохи берутся до чтения: запись во время пересборки ее устарит.
+    epochs = _epochs()
+    edge = archive.bound()
+    posts = (
+        Post.objects.using(using).order_by('pk')
+        .select_related('author', 'group')
+        .annotate(comment_count=Count('comments'))
+    )
+    total, last_pk = 0, 0
+    with transaction.atomic(using):
+        for model in TABLES:
+            model.objects.using(using).all().delete()
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:BATCH_SIZE])
+            if not batch:
+                break
+            for model in TABLES:
+                archived = model is ArchivedFeedItem
+                model.objects.using(using).bulk_create(
+                    (
+                        model(
+                            post_id=post.pk,
+                            comment_count=post.comment_count,
+                            views=post.views,
+                            **item_fields(post))
+                        for post in batch
+                        if archived == (
+                            edge is not None and post.pub_date <= edge)
+                    ),
+                    ignore_conflicts=True,
+                )
+            total += len(batch)
+            last_pk = batch[-1].pk
+    if thumbnails:
+        for model in TABLES:
+            images = model.objects.using(using).exclude(image='')
+            for pk in images.values_list('pk', flat=True).iterator():
+                try:
+                    update_thumbnail(pk)
+                except Exception:
+                    logger.exception(
+                        'Не удалось построить миниатюру поста %s', pk)
+    cache.set(MARKER, epochs, None)
+    invalidation.publish(TOPIC, None, using=using)
+    return total
+
+
+def synced(keys):
+    """Обработчик шины: таблицу пересобрали на другом узле.
+
+    Эпохи у каждого узла свои, поэтому отметкой становятся здешние:
+    записи в обход сигналов, разосланные раньше пересборки, шина уже
+    применила.
+    """
+    cache.set(MARKER, _epochs(), None)
+
+
+def _slice(model, filters, start, stop, boundary, cards):
+    items = model.objects.filter(**filters)
+    if boundary is not None:
+        date = Subquery(model.objects.filter(pk=boundary).values('pub_date'))
+        items = items.filter(
+            Q(pub_date__lt=date) | Q(pub_date=date, post_id__lte=boundary))
+        start, stop = 0, None if stop is None else stop - start
+    elif start:
+        # OFFSET дешевле пройти по индексу, не читая широкие строки.
+        ids = list(items.values_list('pk', flat=True)[start:stop])
+        items = model.objects.filter(pk__in=ids)
+        start, stop = 0, None
+    if cards:
+        return from_rows(items.values_list(*COLUMNS)[start:stop])
+    return list(items[start:stop])
+
+
+def page(filters, start, stop, boundary=None, cards=False):
+    """Срез ленты по индексу (дата, id).
+
+    boundary - id первого поста среза, если он известен: тогда вместо
+    OFFSET срез начинается прямо с него. Иначе id среза сначала берутся
+    по индексу, а карточки - вторым запросом. cards=True возвращает
+    легкие карточки из posts.cards вместо экземпляров модели.
+
+    Срез читается из FeedItem, а если тот кончился раньше, остаток
+    берется из архива: страницы целиком из FeedItem архив не трогают.
+    """
+    items = _slice(FeedItem, filters, start, stop, boundary, cards)
+    size = None if stop is None else stop - start
+    if len(items) == size or archive.bound() is None:
+        return items
+    rest = None if size is None else size - len(items)
+    if items:
+        offset, boundary = 0, None
+    elif boundary is not None:
+        # Пост-граница не найден в FeedItem: он в архиве.
+        offset = 0
+    else:
+        offset = start - FeedItem.objects.filter(**filters).count()
+    tail = _slice(
+        ArchivedFeedItem, filters, offset,
+        None if rest is None else offset + rest, boundary, cards)
+    return items + tail
@@ -0,0 +1,154 @@
+"""Поддержка списков лент (posts.feeds), кэша объектов (posts.identity),
+карточек лент (posts.readmodel) и кэша обратного прокси (core.surrogate)
+при изменении моделей."""
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core import invalidation, surrogate
+
+from . import feeds, identity, readmodel
+from .models import Comment, Follow, Group, Post, User
+from .surrogates import (author_key, follow_key, group_key, post_key,
+                         post_keys)
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw, **kwargs):
+    instance._previous_group_id = None
+    if raw or instance._state.adding:
+        return
+    instance._previous_group_id = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Post)
+def add_to_feeds(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    pk = instance.pk
+    timestamp = instance.pub_date.timestamp()
+    current = feeds.post_feeds(instance)
+    previous = getattr(instance, '_previous_group_id', None)
+
+    def update():
+        if previous is not None and previous != instance.group_id:
+            feeds.apply({'group_id': previous}, pk)
+        for filters in current:
+            feeds.apply(filters, pk, timestamp)
+    # Поколение таблицы поднимается при commit, списки правятся после.
+    transaction.on_commit(update, using=instance._state.db)
+    changed = list(current)
+    if previous is not None and previous != instance.group_id:
+        changed.append({'group_id': previous})
+    feeds.announce(changed, using=instance._state.db)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_feeds(sender, instance, **kwargs):
+    pk = instance.pk
+    current = feeds.post_feeds(instance)
+
+    def update():
+        for filters in current:
+            feeds.apply(filters, pk)
+    transaction.on_commit(update, using=instance._state.db)
+    feeds.announce(current, using=instance._state.db)
+
+
+def forget(sender, instance, **kwargs):
+    identity.invalidate(instance)
+
+
+for model in identity.MODELS:
+    uid = f'posts.identity:{model._meta.label}'
+    post_save.connect(forget, sender=model, dispatch_uid=uid)
+    post_delete.connect(forget, sender=model, dispatch_uid=uid)
+
+
+@receiver(post_save, sender=Post)
+def sync_feed_item(sender, instance, raw, **kwargs):
+    if not raw:
+        readmodel.sync_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def count_comments(sender, instance, raw=False, created=True, **kwargs):
+    if not raw and created:
+        readmodel.sync_comment_count(instance.post_id)
+
+
+@receiver(post_save, sender=User)
+def rename_author(sender, instance, raw, created, update_fields, **kwargs):
+    names = {'username', 'first_name', 'last_name'}
+    if raw or created or (update_fields and not names & set(update_fields)):
+        return
+    readmodel.sync_author(instance)
+    # Имя автора видно в карточках всех его постов и на их страницах.
+    db = instance._state.db
+    posts = Post.objects.using(db).filter(author=instance)
+    surrogate.purge(
+        author_key(instance.pk),
+        *map(post_key, posts.values_list('pk', flat=True)), using=db)
+
+
+@receiver(post_save, sender=Group)
+def rename_group(sender, instance, raw, created, **kwargs):
+    if not raw and not created:
+        readmodel.sync_group(instance)
+
+
+@receiver(pre_delete, sender=Group)
+def drop_group(sender, instance, **kwargs):
+    # Удаление обнулит group_id постов в обход сигналов Post; эпоха
+    # posts_post не растет (generations.bracket), поэтому карточки и
+    # кэш объектов правятся здесь.
+    instance._post_ids = list(
+        Post.objects.filter(group=instance).values_list('pk', flat=True))
+    readmodel.drop_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def forget_group_posts(sender, instance, **kwargs):
+    db = instance._state.db
+    for pk in getattr(instance, '_post_ids', ()):
+        post = Post(pk=pk)
+        post._state.db = db
+        identity.invalidate(post)
+        invalidation.publish(Post, pk, using=db)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_group_id', None)
+    surrogate.purge(
+        *post_keys(instance, previous), using=instance._state.db)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        surrogate.purge(post_key(instance.post_id), using=instance._state.db)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_follow(sender, instance, raw=False, **kwargs):
+    if not raw:
+        surrogate.purge(
+            follow_key(instance.user_id), using=instance._state.db)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group(sender, instance, raw=False, **kwargs):
+    if not raw:
+        surrogate.purge(group_key(instance.pk), using=instance._state.db)
@@ -0,0 +1,30 @@
+"""Ключи суррогатного кэша страниц posts (см. core.surrogate)."""
+INDEX = 'index'
+
+
+def post_key(pk):
+    return f'post-{pk}'
+
+
+def author_key(pk):
+    return f'author-{pk}'
+
+
+def group_key(pk):
+    return f'group-{pk}'
+
+
+def follow_key(user_pk):
+    return f'follow-{user_pk}'
+
+
+def page_keys(page):
+    return [post_key(post.pk) for post in page]
+
+
+def post_keys(post, previous_group_id=None):
+    """Все страницы, на которых пост появляется или пропадает."""
+    keys = [post_key(post.pk), INDEX, author_key(post.author_id)]
+    for group_id in {post.group_id, previous_group_id} - {None}:
+        keys.append(group_key(group_id))
+    return keys
@@ -0,0 +1,89 @@
+import datetime
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from posts import archive, feeds, readmodel
+from posts.models import (ArchivedFeedItem, Comment, FeedItem, Group, Post,
+                          User)
+
+
+class ArchiveTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        now = timezone.now()
+        for number in range(25):
+            post = Post.objects.create(
+                author=self.user, text=f'Пост {number}',
+                group=self.group if number % 2 else None)
+            # Половина постов - двухлетней давности.
+            days = 730 - number if number < 12 else 12 - number % 12
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - datetime.timedelta(days=days))
+        readmodel.rebuild()
+        out = StringIO()
+        call_command('archive_feed_items', days=365, stdout=out)
+        self.assertIn('карточек: 12', out.getvalue())
+
+    def expected(self, filters):
+        return list(feeds.ordered(
+            Post.objects.filter(**filters)).values_list('pk', flat=True))
+
+    def test_feeds_continue_into_archive(self):
+        """Ленты идут из FeedItem и без разрыва продолжаются в архиве."""
+        self.assertEqual(FeedItem.objects.count(), 13)
+        self.assertEqual(ArchivedFeedItem.objects.count(), 12)
+        self.assertTrue(readmodel.is_fresh())
+        for filters in ({}, {'group_id': self.group.pk},
+                        {'author_id': self.user.pk}):
+            posts = feeds.LatestPosts(**filters)
+            for size in (4, 10):
+                ids, offsets = [], []
+                for start in range(0, 30, size):
+                    ids += [card.id for card in posts[start:start + size]]
+                    offsets += [
+                        item.pk for item in
+                        readmodel.page(filters, start, start + size)]
+                self.assertEqual(ids, self.expected(filters), (filters, size))
+                self.assertEqual(offsets, ids)
+
+    def test_first_pages_skip_archive(self):
+        """Страницы целиком из FeedItem не читают архив."""
+        archive.bound()
+        with CaptureQueriesContext(connection) as queries:
+            page = feeds.LatestPosts()[0:10]
+        self.assertEqual(len(page), 10)
+        self.assertFalse(any(
+            ArchivedFeedItem._meta.db_table in query['sql']
+            for query in queries))
+
+    def test_archived_cards_stay_in_sync(self):
+        """Правки старых постов попадают в архивные карточки."""
+        post = Post.objects.get(text='Пост 0')
+        Comment.objects.create(post=post, author=self.user, text='Ответ')
+        post.text = 'Правка'
+        post.save()
+        item = ArchivedFeedItem.objects.get(pk=post.pk)
+        self.assertEqual((item.text, item.comment_count), ('Правка', 1))
+        self.assertFalse(FeedItem.objects.filter(pk=post.pk).exists())
+        call_command('rebuild_feed_items', stdout=StringIO())
+        self.assertEqual(ArchivedFeedItem.objects.count(), 12)
+        post.delete()
+        self.assertFalse(
+            ArchivedFeedItem.objects.filter(pk=post.pk).exists())
+
+    def test_roll_partitions_without_postgres(self):
+        """Вне Postgres секций нет, и команда ничего не создает."""
+        out = StringIO()
+        call_command('roll_feed_partitions', stdout=out)
+        if connection.vendor != 'postgresql':
+            self.assertIn('не секционирован', out.getvalue())
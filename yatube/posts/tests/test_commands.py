@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase
+
+from ..management.commands._bulk import Throughput
+from ..models import Comment, Follow, Group, Post, User
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class DumpLoadCommandsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='user')
+        cls.user2 = User.objects.create_user(username='user2')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='testgroup',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+        cls.pub_date = datetime(2015, 3, 1, 12, 0, tzinfo=timezone.utc)
+        Post.objects.filter(pk=cls.post.pk).update(pub_date=cls.pub_date)
+        Comment.objects.create(post=cls.post, author=cls.user2, text='Ком')
+        Follow.objects.create(user=cls.user2, author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def test_dump_and_load_roundtrip(self):
+        """Выгрузка и загрузка восстанавливают данные вместе с датами."""
+        path = os.path.join(TEMP_DIR, 'dump.ndjson')
+        call_command('dump_yatube', output=path, stdout=StringIO())
+        with open(path, encoding='utf-8') as dump:
+            self.assertEqual(len(dump.readlines()), 6)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertFalse(Post.objects.exists())
+        out = StringIO()
+        call_command('load_yatube', path, batch_size=2, stdout=out)
+        self.assertIn('строк/с', out.getvalue())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.group.slug, 'testgroup')
+        self.assertEqual(post.comments.get().author.username, 'user2')
+        self.assertTrue(Follow.objects.filter(
+            user__username='user2', author__username='user').exists())
+        new_post = Post.objects.create(author=post.author, text='Новый')
+        self.assertGreater(new_post.pk, post.pk)
+
+
+class DumpSnapshotTest(TransactionTestCase):
+
+    def test_dump_reads_in_one_transaction(self):
+        """Все таблицы выгружаются в одной транзакции."""
+        User.objects.create_user(username='user')
+        atomic = []
+        original = Throughput.start
+
+        def start(throughput, label):
+            atomic.append(connection.in_atomic_block)
+            original(throughput, label)
+
+        with mock.patch.object(Throughput, 'start', start):
+            call_command('dump_yatube', stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(atomic)
+        self.assertTrue(all(atomic))
+        self.assertFalse(connection.in_atomic_block)
+
+
+class SeedCommandTest(TestCase):
+    OPTIONS = {
+        'users': 30,
+        'groups': 3,
+        'posts': 120,
+        'comments': 60,
+        'follows': 200,
+        'seed': 7,
+        'years': 3,
+        'end': datetime(2022, 1, 1, tzinfo=timezone.utc),
+        'stdout': StringIO(),
+    }
+
+    def snapshot(self):
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug')),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username')),
+        )
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый seed дает одинаковые данные."""
+        call_command('seed', **self.OPTIONS)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command('seed', **self.OPTIONS)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_seed_shapes_data(self):
+        """Даты растянуты на годы, подписчики распределены неравномерно."""
+        call_command('seed', **self.OPTIONS)
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(Comment.objects.count(), 60)
+        dates = Post.objects.order_by('pub_date').values_list(
+            'pub_date', flat=True)
+        self.assertGreater((dates.last() - dates.first()).days, 2 * 365)
+        counts = list(
+            User.objects.annotate(followers=Count('following'))
+            .order_by('-followers').values_list('followers', flat=True)
+        )
+        self.assertGreater(counts[0], 4 * counts[len(counts) // 2])
+
+    def test_seed_reports_missing_follows(self):
+        """Нехватку уникальных подписок команда называет, а не скрывает."""
+        err = StringIO()
+        call_command(
+            'seed', **dict(self.OPTIONS, users=3, follows=50), stderr=err)
+        created = Follow.objects.count()
+        self.assertLessEqual(created, 3 * 2)
+        self.assertIn(f'создано {created} строк из 50', err.getvalue())
+
+
+class BenchFeedObjectsCommandTest(TestCase):
+
+    def test_renders_feed_pages(self):
+        """Сравнение собирает страницы ленты вместе с лайками."""
+        author = User.objects.create_user(username='author')
+        for number in range(3):
+            Post.objects.create(author=author, text=f'Пост {number}')
+        out = StringIO()
+        call_command('bench_feed_objects', pages=2, rounds=1, stdout=out)
+        for name in ('Post + select_related', 'FeedItem', 'posts.cards'):
+            self.assertIn(name, out.getvalue())
@@ -0,0 +1,100 @@
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core import generations
+from posts import counters
+from posts.models import FeedItem, Post, User
+
+
+def store(kind, **options):
+    return override_settings(
+        VIEW_COUNTS=dict(settings.VIEW_COUNTS, STORE=kind, **options))
+
+
+class ViewCountersTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        counters._store = None
+        self.addCleanup(setattr, counters, '_store', None)
+        self.author = User.objects.create_user(username='author')
+        self.posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(3)
+        ]
+
+    def views(self, post):
+        return (
+            Post.objects.get(pk=post.pk).views,
+            FeedItem.objects.get(pk=post.pk).views,
+        )
+
+    def test_views_flushed_in_one_update_per_table(self):
+        """Просмотры копятся в памяти и пишутся одним UPDATE на таблицу."""
+        first, second, _ = self.posts
+        with store('memory', FLUSH_INTERVAL=3600):
+            for post in (first, first, second):
+                response = self.client.get(f'/posts/{post.pk}/')
+                self.assertEqual(response.status_code, 200)
+            self.client.get('/posts/0/')
+            self.assertEqual(self.views(first), (0, 0))
+            tables = [model._meta.db_table for model in counters.MODELS]
+            before = generations.current(*tables)
+            with self.assertNumQueries(len(counters.MODELS)):
+                self.assertEqual(counters.flush(), 2)
+            self.assertEqual(generations.current(*tables), before)
+        self.assertEqual(self.views(first), (2, 2))
+        self.assertEqual(self.views(second), (1, 1))
+
+    def test_due_flush_after_response(self):
+        """Процесс сам сбрасывает MAX_PENDING просмотров после ответа."""
+        post = self.posts[0]
+        with store('memory', MAX_PENDING=2):
+            self.client.get(f'/posts/{post.pk}/')
+            self.assertEqual(self.views(post), (0, 0))
+            self.client.get(f'/posts/{post.pk}/')
+        self.assertEqual(self.views(post), (2, 2))
+        self.assertContains(
+            self.client.get(f'/profile/{self.author.username}/'),
+            'Просмотры: 2')
+
+    def test_failed_flush_keeps_views(self):
+        """Неудачный сброс не теряет просмотры."""
+        post = self.posts[0]
+        counters.hit(post.pk)
+        with mock.patch.object(counters, 'write', side_effect=OSError):
+            with self.assertRaises(OSError):
+                counters.flush()
+        counters.flush()
+        self.assertEqual(self.views(post), (1, 1))
+
+    def test_edit_keeps_views(self):
+        """Правка поста не затирает записанные после чтения просмотры."""
+        post = Post.objects.get(pk=self.posts[0].pk)
+        counters.write({post.pk: 5})
+        post.text = 'Правка'
+        post.save()
+        self.assertEqual(self.views(post), (5, 5))
+
+    def test_cache_store_rollup(self):
+        """С кэшем закрытые корзины сбрасывает rollup_view_counts."""
+        first, second, _ = self.posts
+        with store('cache'), mock.patch.object(
+                counters.time, 'time', return_value=1000.0):
+            for post in (first, second, second):
+                counters.hit(post.pk)
+            self.assertEqual(counters.flush(), 0)
+        later = 1000.0 + 2 * settings.VIEW_COUNTS['FLUSH_INTERVAL']
+        with store('cache'), mock.patch.object(
+                counters.time, 'time', return_value=later):
+            out = StringIO()
+            call_command('rollup_view_counts', stdout=out)
+            self.assertIn('2', out.getvalue())
+            self.assertEqual(counters.flush(), 0)
+        self.assertEqual(self.views(first), (1, 1))
+        self.assertEqual(self.views(second), (2, 2))
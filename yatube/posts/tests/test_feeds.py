@@ -0,0 +1,91 @@
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from posts import feeds, readmodel
+from posts.models import Group, Post, User
+
+
+class LatestPostsTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.other = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        for number in range(15):
+            Post.objects.create(
+                author=self.user, group=self.group, text=f'Пост {number}')
+
+    def ids(self, **filters):
+        return [pk for pk, _ in feeds.latest(filters)['items']]
+
+    def newest(self, count, **filters):
+        return list(
+            feeds.ordered(Post.objects.filter(**filters))
+            .values_list('pk', flat=True)[:count]
+        )
+
+    @mock.patch.object(readmodel, 'is_fresh', return_value=False)
+    def test_first_pages_come_from_list(self, is_fresh):
+        """Без карточек FeedItem страница из начала ленты собирается по id."""
+        posts = feeds.LatestPosts(group_id=self.group.pk)
+        len(posts)
+        # Посты, их авторы и группы по одному запросу, затем из кэша.
+        with self.assertNumQueries(3):
+            posts[settings.POSTS_PER_PAGE:2 * settings.POSTS_PER_PAGE]
+        with self.assertNumQueries(0):
+            page = posts[settings.POSTS_PER_PAGE:2 * settings.POSTS_PER_PAGE]
+        self.assertEqual(
+            [post.pk for post in page],
+            self.newest(15, group_id=self.group.pk)[settings.POSTS_PER_PAGE:])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(posts), 15)
+
+    def test_signals_update_lists_in_place(self):
+        """Создание, смена группы и удаление правят списки без пересборки."""
+        for filters in ({}, {'group_id': self.group.pk},
+                        {'group_id': self.other.pk}):
+            feeds.latest(filters)
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Новый')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids()[0], post.pk)
+            self.assertEqual(self.ids(group_id=self.group.pk)[0], post.pk)
+        post.group = self.other
+        post.save()
+        with self.assertNumQueries(0):
+            self.assertNotIn(post.pk, self.ids(group_id=self.group.pk))
+            self.assertEqual(self.ids(group_id=self.other.pk), [post.pk])
+        post.delete()
+        with self.assertNumQueries(0):
+            self.assertNotIn(post.pk, self.ids())
+            self.assertEqual(self.ids(group_id=self.other.pk), [])
+
+    def test_writes_without_signals_rebuild_list(self):
+        """bulk_create не шлет сигналов, но список все равно обновится."""
+        feeds.latest({})
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пачка {number}')
+            for number in range(3))
+        self.assertEqual(self.ids(), self.newest(feeds.length()))
+
+    def test_views_and_command(self):
+        """Ленты отдаются из списков, команда пересобирает их все."""
+        response = self.client.get(
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}))
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            self.newest(settings.POSTS_PER_PAGE, group_id=self.group.pk))
+        cache.clear()
+        out = StringIO()
+        call_command('rebuild_feeds', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertIsNotNone(cache.get(feeds.feed_key({})))
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.http import Http404
+from django.test import TransactionTestCase
+
+from posts.identity import get_post_or_404, hydrate
+from posts.models import Group, Post, User
+
+
+class HydrateTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='author', first_name='Лев', password='secret')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.posts = [
+            Post.objects.create(
+                author=self.user, group=self.group, text=f'Пост {number}')
+            for number in range(3)
+        ]
+
+    def test_order_and_cache(self):
+        """Посты возвращаются в порядке id, повторно - без запросов."""
+        ids = [post.pk for post in reversed(self.posts)] + [10 ** 6]
+        with self.assertNumQueries(3):
+            posts = hydrate(ids)
+        self.assertEqual([post.pk for post in posts], ids[:-1])
+        with self.assertNumQueries(0):
+            posts = hydrate(ids)
+            self.assertEqual(posts[0].author.get_full_name(), 'Лев')
+            self.assertEqual(posts[0].group.slug, 'group')
+
+    def test_save_and_update_invalidate(self):
+        """Сохранение и update() в обход сигналов сбрасывают кэш."""
+        post = self.posts[0]
+        hydrate([post.pk])
+        post.text = 'Исправлено'
+        post.save()
+        self.assertEqual(get_post_or_404(post.pk).text, 'Исправлено')
+        Group.objects.update(title='Новое название')
+        self.assertEqual(
+            get_post_or_404(post.pk).group.title, 'Новое название')
+        post.delete()
+        with self.assertRaises(Http404):
+            get_post_or_404(post.pk)
+
+    def test_user_secrets_not_cached(self):
+        """Пароль пользователя в кэш не попадает."""
+        hydrate([self.posts[0].pk])
+        for value in cache._cache.values():
+            self.assertNotIn(self.user.password.encode(), value)
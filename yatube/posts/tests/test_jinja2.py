@@ -0,0 +1,105 @@
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import engines
+from django.test import TransactionTestCase, override_settings
+
+from posts.models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def normalize(html):
+    # csrf-токен маскируется заново при каждом обращении.
+    html = re.sub(r'value="[^"]+" name="csrfmiddlewaretoken"|'
+                  r'name="csrfmiddlewaretoken" value="[^"]+"', 'csrf', html)
+    html = re.sub(r'>\s+<', '><', html)
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class Jinja2ParityTest(TransactionTestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', first_name='Анна', last_name='Каренина')
+        self.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание <b>группы</b>')
+        Follow.objects.create(user=self.user, author=self.author)
+        for number in range(25):
+            Post.objects.create(
+                author=self.author,
+                group=self.group if number % 2 else None,
+                text=f'Пост {number} & <i>разметка</i>',
+            )
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='С картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'))
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        self.client.force_login(self.user)
+
+    def assertSameRender(self, url, template):
+        """Jinja2 с тем же контекстом дает ту же страницу, что и Django."""
+        # Фрагмент {% cache %} главной не зависит от номера страницы.
+        cache.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertTemplateUsed(response, template)
+        context = response.context[0].flatten()
+        cache.clear()
+        jinja = engines['jinja2'].get_template(template).render(
+            context, request=response.wsgi_request)
+        self.assertEqual(
+            normalize(jinja), normalize(response.content.decode()), url)
+
+    def test_feed_pages(self):
+        """Ленты, включая пагинатор и миниатюры, совпадают с Django."""
+        pages = (
+            ('/', 'posts/index.html'),
+            ('/?page=2', 'posts/index.html'),
+            ('/group/group/', 'posts/group_list.html'),
+            ('/profile/author/', 'posts/profile.html'),
+            ('/profile/author/?page=3', 'posts/profile.html'),
+            ('/follow/', 'posts/follow.html'),
+        )
+        for url, template in pages:
+            with self.subTest(url=url):
+                self.assertSameRender(url, template)
+
+    def test_post_detail(self):
+        """Страница поста с формой комментария совпадает с Django."""
+        url = f'/posts/{self.post.pk}/'
+        self.assertSameRender(url, 'posts/post_detail.html')
+        self.client.logout()
+        self.assertSameRender(url, 'posts/post_detail.html')
+
+    def test_jinja2_first(self):
+        """С JINJA2_TEMPLATES ленты рендерит Jinja2, остальное - Django."""
+        with override_settings(TEMPLATES=settings.TEMPLATES[::-1]):
+            response = self.client.get('/')
+            self.assertContains(response, 'Пост 24 &amp; &lt;i&gt;')
+            self.assertIsNone(response.context)
+            response = self.client.get('/create/')
+            self.assertTemplateUsed(response, 'posts/create_post.html')
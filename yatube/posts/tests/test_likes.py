@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import generations
+from core.surrogate import LocalPurgeServer
+from posts import likes
+from posts.models import Like, LikeCounter, Post, User
+
+
+class LikesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.client.force_login(self.author)
+
+    def count(self):
+        return likes.counts([self.post.pk])[self.post.pk]
+
+    def test_toggle_is_idempotent(self):
+        """Повторный лайк и повторная отмена ничего не меняют."""
+        like = f'/posts/{self.post.pk}/like/'
+        unlike = f'/posts/{self.post.pk}/unlike/'
+        for _ in range(2):
+            response = self.client.post(like, HTTP_REFERER='/')
+            self.assertRedirects(response, '/')
+        self.assertEqual(Like.objects.count(), 1)
+        self.assertEqual(self.count(), 1)
+        for _ in range(2):
+            response = self.client.post(
+                unlike, HTTP_REFERER='http://evil.example/')
+            self.assertRedirects(response, f'/posts/{self.post.pk}/')
+        self.assertEqual(Like.objects.count(), 0)
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(self.client.get(like).status_code, 405)
+        self.assertEqual(self.client.post('/posts/0/like/').status_code, 404)
+        with self.assertRaises(IntegrityError):
+            Like.objects.create(user=self.author, post=self.post)
+            Like.objects.create(user=self.author, post=self.post)
+
+    @override_settings(LIKES=dict(settings.LIKES, SHARDS=4))
+    def test_counter_is_sharded(self):
+        """Лайки расходятся по шардам, число - их сумма."""
+        users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(30)
+        ]
+        for user in users:
+            likes.like(user, self.post.pk)
+        for user in users[:5]:
+            likes.unlike(user, self.post.pk)
+        shards = LikeCounter.objects.filter(post=self.post)
+        self.assertGreater(shards.count(), 1)
+        self.assertLessEqual(shards.count(), 4)
+        self.assertEqual(self.count(), 25)
+
+
+class FeedLikesTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        self.posts = [
+            Post.objects.create(author=author, text=f'Пост {number}')
+            for number in range(settings.POSTS_PER_PAGE)
+        ]
+        likes.like(self.user, self.posts[3].pk)
+        self.client.force_login(self.user)
+
+    def test_page_checks_likes_in_one_query(self):
+        """Лента узнает лайки всех постов страницы одним запросом."""
+        tables = (Like._meta.db_table, LikeCounter._meta.db_table)
+        for result in ('miss', 'hit'):
+            generations.bump(
+                *(likes.GENERATION.format(post.pk) for post in self.posts))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/')
+            self.assertEqual(response['X-Page-Cache'], result)
+            for table in tables:
+                used = [
+                    query for query in queries.captured_queries
+                    if f'"{table}"' in query['sql']
+                ]
+                self.assertEqual(len(used), 1, (result, table))
+            content = response.content.decode()
+            self.assertEqual(content.count('class="text-danger"'), 1)
+            self.assertEqual(content.count('class="text-muted"'), 9)
+            self.assertNotIn('csrfmiddlewaretoken', content)
+        # Суммы легли в кэш.
+        with self.assertNumQueries(0):
+            counts = likes.counts([post.pk for post in self.posts])
+        self.assertEqual(counts[self.posts[3].pk], 1)
+
+    def test_like_purges_and_drops_stale_sums(self):
+        """Лайк сбрасывает ключ поста, сумма до commit не оживает."""
+        post = self.posts[0]
+        stale = likes.cache_keys([post.pk])[post.pk]
+        with LocalPurgeServer() as server, override_settings(
+                SURROGATE=dict(
+                    settings.SURROGATE,
+                    TRANSPORT='core.surrogate.HTTPPurgeTransport',
+                    OPTIONS={'url': server.url}),
+                JOB_QUEUE=dict(settings.JOB_QUEUE, EAGER=True)):
+            likes.like(self.user, post.pk)
+            self.assertEqual(server.keys(), {f'post-{post.pk}'})
+        # Читатель посчитал сумму до commit и положил ее после.
+        cache.set(stale, 0)
+        self.assertEqual(likes.counts([post.pk])[post.pk], 1)
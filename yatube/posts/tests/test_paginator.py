@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from posts import views
+from posts.models import Post, User
+from posts.paginator import ApproximatePaginator, cached_count, page_window
+
+
+class PageWindowTest(TestCase):
+
+    def test_window(self):
+        """Окно вокруг текущей страницы с краями и пропусками."""
+        cases = (
+            (1, 5, [1, 2, 3, 4, 5]),
+            (1, 100, [1, 2, 3, None, 100]),
+            (50, 100, [1, None, 48, 49, 50, 51, 52, None, 100]),
+            (100, 100, [1, None, 98, 99, 100]),
+            (5, 100, [1, 2, 3, 4, 5, 6, 7, None, 100]),
+        )
+        for number, num_pages, window in cases:
+            with self.subTest(number=number, num_pages=num_pages):
+                self.assertEqual(page_window(number, num_pages), window)
+
+
+class CachedCountTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}') for i in range(35))
+
+    def test_count_cached_until_write(self):
+        """COUNT(*) повторяется только после записи в таблицу постов."""
+        posts = Post.objects.filter(author=self.user)
+        self.assertEqual(cached_count(posts), 35)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(posts), 35)
+        Post.objects.bulk_create([Post(author=self.user, text='Еще')])
+        self.assertEqual(cached_count(posts), 36)
+        Post.objects.filter(text='Еще').delete()
+        self.assertEqual(cached_count(posts), 35)
+
+    def test_paginator_renders_window(self):
+        """Навигация содержит окно страниц, а не ссылку на каждую."""
+        paginator = ApproximatePaginator(Post.objects.all(), 1)
+        self.assertEqual(paginator.get_page(20).window,
+                         [1, None, 18, 19, 20, 21, 22, None, 35])
+        response = self.client.get(reverse('posts:index'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 35)
+        self.assertEqual(page_obj.window, [1, 2, 3, 4])
+        # views берет размер страницы при импорте, а не из settings.
+        with mock.patch.object(views, 'POSTS_PER_PAGE', 1):
+            response = self.client.get(
+                reverse('posts:index'), {'page': 20})
+        self.assertEqual(response.context['page_obj'].window,
+                         [1, None, 18, 19, 20, 21, 22, None, 35])
+        self.assertContains(response, '?page=35')
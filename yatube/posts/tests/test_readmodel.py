@@ -0,0 +1,151 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from core import generations, jobs
+from core.models import Job
+from posts import archive, feeds, identity, readmodel
+from posts.cards import PostCard
+from posts.models import Comment, FeedItem, Group, Post, User
+from posts.tests.test_jinja2 import SMALL_GIF
+
+
+class ReadModelTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.posts = [
+            Post.objects.create(
+                author=self.user, group=self.group, text=f'Пост {number}')
+            for number in range(15)
+        ]
+
+    def item(self, post):
+        return FeedItem.objects.get(pk=post.pk)
+
+    def test_signals_keep_items_in_sync(self):
+        """Пост, комментарии, автор и группа меняют карточку сразу."""
+        post = self.posts[0]
+        self.assertEqual(self.item(post).group_slug, 'group')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий')
+        self.assertEqual(self.item(post).comment_count, 1)
+        comment.delete()
+        self.assertEqual(self.item(post).comment_count, 0)
+        self.user.first_name = 'Алексей'
+        self.user.save()
+        self.group.title = 'Переименована'
+        self.group.save()
+        post.text = 'Правка'
+        post.save()
+        item = self.item(post)
+        self.assertEqual(item.author.get_full_name(), 'Алексей Толстой')
+        self.assertEqual(item.group.title, 'Переименована')
+        self.assertEqual(item.text, 'Правка')
+        post.delete()
+        self.assertFalse(FeedItem.objects.filter(pk=post.pk).exists())
+        self.assertTrue(readmodel.is_fresh())
+
+    def test_group_delete_keeps_items_fresh(self):
+        """Удаление группы отвязывает карточки и кэш постов от нее."""
+        post = self.posts[0]
+        self.assertTrue(readmodel.is_fresh())
+        self.assertEqual(
+            identity.hydrate([post.pk])[0].group_id, self.group.pk)
+        self.group.delete()
+        self.assertTrue(readmodel.is_fresh())
+        item = self.item(post)
+        self.assertEqual(
+            (item.group_id, item.group_slug, item.group_title),
+            (None, '', ''))
+        self.assertIsNone(identity.hydrate([post.pk])[0].group_id)
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_pages_come_from_items(self):
+        """Страница ленты - один запрос к FeedItem, и в начале, и в глубине."""
+        posts = feeds.LatestPosts(group_id=self.group.pk)
+        newest = [post.pk for post in reversed(self.posts)]
+        step = settings.POSTS_PER_PAGE
+        feeds.latest({'group_id': self.group.pk})
+        archive.bound()
+        for start in (0, step):
+            with self.assertNumQueries(1):
+                page = posts[start:start + step]
+            self.assertEqual([item.pk for item in page],
+                             newest[start:start + step])
+        with self.assertNumQueries(0):
+            self.assertEqual(page[0].author.username, 'author')
+            self.assertEqual(page[0].group.slug, 'group')
+
+    def test_bypassing_writes_fall_back_until_rebuild(self):
+        """После bulk_create ленты читаются из Post до rebuild_feed_items."""
+        self.assertTrue(readmodel.is_fresh())
+        Post.objects.bulk_create([Post(author=self.user, text='Пачка')])
+        with self.assertLogs('yatube.readmodel', 'WARNING'):
+            self.assertFalse(readmodel.is_fresh())
+        self.assertEqual(len(feeds.LatestPosts()[:1]), 1)
+        self.assertIsInstance(feeds.LatestPosts()[0], Post)
+        out = StringIO()
+        call_command('rebuild_feed_items', stdout=out)
+        self.assertIn('16', out.getvalue())
+        self.assertTrue(readmodel.is_fresh())
+        self.assertEqual(FeedItem.objects.count(), 16)
+        self.assertEqual(feeds.LatestPosts()[0].text, 'Пачка')
+
+    def test_evicted_epoch_keeps_items(self):
+        """Вытесненная из кэша эпоха не отключает FeedItem."""
+        self.assertTrue(readmodel.is_fresh())
+        epoch = generations.epoch(Post._meta.db_table)
+        cache.delete(generations.KEY.format(epoch))
+        self.assertTrue(readmodel.is_fresh())
+        self.assertNotIsInstance(feeds.LatestPosts()[0], Post)
+        # Запись в обход сигналов после этого по-прежнему замечается.
+        cache.delete(generations.KEY.format(epoch))
+        Post.objects.bulk_create([Post(author=self.user, text='Пачка')])
+        with self.assertLogs('yatube.readmodel', 'WARNING'):
+            self.assertFalse(readmodel.is_fresh())
+        self.assertIsInstance(feeds.LatestPosts()[0], Post)
+
+    def test_views_render_cards(self):
+        """Главная, группа и профиль отдают посты карточками."""
+        for url in ('/', f'/group/{self.group.slug}/', '/profile/author/'):
+            response = self.client.get(url)
+            card = response.context['page_obj'][0]
+            self.assertIsInstance(card, PostCard, url)
+            self.assertEqual(card.author.get_full_name(), 'Лев Толстой')
+            self.assertContains(response, 'Пост 14')
+            self.assertContains(response, '/profile/author/')
+
+    @override_settings(FEED_CARDS=False)
+    def test_feed_items_without_cards(self):
+        """Без FEED_CARDS лента состоит из экземпляров FeedItem."""
+        response = self.client.get('/')
+        self.assertIsInstance(response.context['page_obj'][0], FeedItem)
+        self.assertContains(response, 'Пост 14')
+
+    def test_thumbnail_built_by_worker(self):
+        """Миниатюру карточки строит фоновая задача, а не запрос."""
+        media = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media):
+            post = Post.objects.create(
+                author=self.user, text='С картинкой',
+                image=SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, content_type='image/gif'))
+            self.assertEqual(self.item(post).thumbnail_url, '')
+            thumbnails = Job.objects.filter(
+                name='posts.readmodel.update_thumbnail')
+            self.assertEqual(thumbnails.count(), 1)
+            jobs.work_once('test')
+        self.assertEqual(thumbnails.get().status, Job.DONE)
+        self.assertIn('/cache/', self.item(post).thumbnail_url)
@@ -13,6 +13,9 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
+    path('posts/<int:post_id>/like/', views.post_like, name='post_like'),
+    path('posts/<int:post_id>/unlike/',
+         views.post_unlike, name='post_unlike'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow, name='profile_follow'),
@@ -1,71 +1,105 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.utils.http import is_safe_url
+from django.views.decorators.http import require_POST
+
+from core import generations, surrogate
+from core.replicas import use_replicas
+from core.pagecache import shared_page
+from core.querycache import cached
+from core.throttle import throttle
 from yatube.settings import POSTS_PER_PAGE
 
+from . import likes
+from .counters import counted
+from .feeds import LatestPosts
 from .forms import PostForm, CommentForm
-from .models import Follow, Group, Post, User
+from .identity import USER_FIELDS, get_post_or_404
+from .models import Comment, Follow, Group, Post, User
+from .paginator import ApproximatePaginator, cached_count
+from .surrogates import (INDEX, author_key, follow_key, group_key, page_keys,
+                         post_key)
+
+# Таблицы, из которых собрано общее тело страниц лент; пользователей
+# достаточно сверять с эпохой, см. core.pagecache.
+FEED_TABLES = (
+    Post._meta.db_table, Group._meta.db_table,
+    generations.epoch(User._meta.db_table),
+)
 
 
 def get_page_obj(post_list, page_number):
     """Получает заданную страницу из списка постов"""
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
+    paginator = ApproximatePaginator(post_list, POSTS_PER_PAGE)
     return paginator.get_page(page_number)
 
 
+@use_replicas
+@shared_page(*FEED_TABLES)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = LatestPosts()
     page_number = request.GET.get('page')
+    page_obj = get_page_obj(post_list, page_number)
+    likes.prefetch(request, [post.pk for post in page_obj])
+    surrogate.tag(request, INDEX, *page_keys(page_obj))
     context = {
-        'page_obj': get_page_obj(post_list, page_number),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@use_replicas
+@shared_page(*FEED_TABLES)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.filter(group=group)
+    group = get_object_or_404(cached(Group.objects), slug=slug)
+    post_list = LatestPosts(group_id=group.pk)
     page_number = request.GET.get('page')
+    page_obj = get_page_obj(post_list, page_number)
+    likes.prefetch(request, [post.pk for post in page_obj])
+    surrogate.tag(request, group_key(group.pk), *page_keys(page_obj))
     context = {
         'group': group,
-        'page_obj': get_page_obj(post_list, page_number),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@use_replicas
+@shared_page(*FEED_TABLES)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=user)
+    user = get_object_or_404(
+        cached(User.objects.only(*USER_FIELDS)), username=username)
+    post_list = LatestPosts(author_id=user.pk)
     page_number = request.GET.get('page')
-    can_follow = request.user.is_authenticated and user != request.user
-    following = Follow.objects.filter(
-        user=request.user, author=user).exists() if can_follow else False
+    page_obj = get_page_obj(post_list, page_number)
+    likes.prefetch(request, [post.pk for post in page_obj])
+    surrogate.tag(request, author_key(user.pk), *page_keys(page_obj))
     context = {
         'author': user,
-        'page_obj': get_page_obj(post_list, page_number),
-        'posts_count': post_list.count(),
-        'can_follow': can_follow,
-        'following': following,
+        'page_obj': page_obj,
+        'posts_count': page_obj.paginator.count,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@counted
+@use_replicas
+@shared_page(*FEED_TABLES, Comment._meta.db_table)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    posts_count = Post.objects.filter(author=post.author).count()
-    form = CommentForm(request.POST or None)
+    post = get_post_or_404(post_id)
+    posts_count = cached_count(Post.objects.filter(author=post.author))
     comments = post.comments.all()
+    surrogate.tag(request, post_key(post.pk), author_key(post.author_id))
     context = {
         'post': post,
         'posts_count': posts_count,
-        'form': form,
         'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@throttle('post_create')
 def post_create(request):
     form = PostForm(request.POST or None)
     if form.is_valid():
@@ -102,6 +136,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@throttle('add_comment')
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -114,18 +149,24 @@ def add_comment(request, post_id):
 
 
 @login_required
+@use_replicas
 def follow_index(request):
-    follows_set = Follow.objects.filter(user=request.user)
+    follows_set = cached(Follow.objects.filter(user=request.user))
     authors = list(follows_set.values_list('author', flat=True))
-    post_list = Post.objects.filter(author__in=authors)
+    post_list = Post.objects.filter(
+        author__in=authors).select_related('author', 'group')
     page_number = request.GET.get('page')
+    page_obj = get_page_obj(post_list, page_number)
+    likes.prefetch(request, [post.pk for post in page_obj])
+    surrogate.tag(request, follow_key(request.user.pk), *page_keys(page_obj))
     context = {
-        'page_obj': get_page_obj(post_list, page_number),
+        'page_obj': page_obj,
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@throttle('profile_follow', methods=None)
 def profile_follow(request, username):
     user = get_object_or_404(User, username=username)
     following = Follow.objects.filter(
@@ -136,7 +177,35 @@ def profile_follow(request, username):
 
 
 @login_required
+@throttle('profile_unfollow', methods=None)
 def profile_unfollow(request, username):
     user = get_object_or_404(User, username=username)
     Follow.objects.get(user=request.user, author=user).delete()
     return redirect('posts:profile', username=username)
+
+
+def _back(request, post_id):
+    # Назад на страницу с кнопкой, если она на этом сайте.
+    referer = request.META.get('HTTP_REFERER')
+    if is_safe_url(referer, allowed_hosts={request.get_host()},
+                   require_https=request.is_secure()):
+        return redirect(referer)
+    return redirect('posts:post_detail', post_id=post_id)
+
+
+@login_required
+@require_POST
+@throttle('post_like')
+def post_like(request, post_id):
+    get_post_or_404(post_id)
+    likes.like(request.user, post_id)
+    return _back(request, post_id)
+
+
+@login_required
+@require_POST
+@throttle('post_unlike')
+def post_unlike(request, post_id):
+    get_post_or_404(post_id)
+    likes.unlike(request.user, post_id)
+    return _back(request, post_id)
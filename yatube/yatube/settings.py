@@ -14,7 +14,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'rg-e!_)1+q%cgwh%uh$rrhfhsua)3s1l4^obqdhnfwo3_-q(gy'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', 'True').lower() in ('1', 'true', 'yes')
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -41,10 +41,14 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.InstrumentationMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.SurrogateKeyMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,34 +56,59 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.AdmissionMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма отправляет воркер очереди (run_worker) бэкендом
+# JOB_QUEUE['EMAIL_BACKEND'], см. core.mail.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+CONTEXT_PROCESSORS = [
+    'django.template.context_processors.debug',
+    'django.template.context_processors.request',
+    'django.contrib.auth.context_processors.auth',
+    'django.contrib.messages.context_processors.messages',
+    'core.context_processors.year.year',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-                'core.context_processors.year.year',
-            ],
+            'context_processors': CONTEXT_PROCESSORS,
+        },
+    },
+    # Копии горячих шаблонов лент, см. core.jinja2.
+    {
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [os.path.join(BASE_DIR, 'jinja2')],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            'environment': 'core.jinja2.environment',
+            'context_processors': CONTEXT_PROCESSORS,
         },
     },
 ]
 
+# Шаблоны ищутся по порядку движков: с JINJA2_TEMPLATES первым идет
+# Jinja2, а все, чего в jinja2/ нет, по-прежнему рендерит Django.
+JINJA2_TEMPLATES = os.getenv(
+    'JINJA2_TEMPLATES', '').lower() in ('1', 'true', 'yes')
+if JINJA2_TEMPLATES:
+    TEMPLATES.reverse()
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -99,6 +128,23 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения лент (DB_REPLICA_HOSTS=host1,host2), см.
+# core.replicas. В тестах они смотрят в тестовую базу default.
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICAS = {
+    'DATABASES': [],
+    'MAX_LAG': 2,
+    'CHECK_INTERVAL': 5,
+    'LAG_CHECK': 'core.replicas.replication_lag',
+    'PIN_SECONDS': 15,
+    'COOKIE': 'db_primary',
+}
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    REPLICAS['DATABASES'].append(f'replica{number}')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -153,3 +199,167 @@ INTERNAL_IPS = [
 ]
 
 POSTS_PER_PAGE = 10
+
+# Общий для всех пользователей кэш страниц лент с дырками под
+# пользовательские фрагменты, см. core.pagecache. С ESI дырки собирает
+# прокси (Varnish, Fastly) по тегам <esi:include>.
+PAGE_CACHE = {
+    'ENABLED': os.getenv('PAGE_CACHE', 'True').lower() in ('1', 'true', 'yes'),
+    'TIMEOUT': 60,
+    'STALE_TIMEOUT': 10 * 60,
+    'ESI': os.getenv('PAGE_CACHE_ESI', '').lower() in ('1', 'true', 'yes'),
+}
+
+# Сброс нагрузки, см. core.admission. Лимиты view задаются по имени
+# URL поверх DEFAULT; MAX_INFLIGHT верхнего уровня - на весь процесс.
+ADMISSION = {
+    'ENABLED': os.getenv('ADMISSION', 'True').lower() in ('1', 'true', 'yes'),
+    'MAX_INFLIGHT': 64,
+    'WINDOW': 10,
+    'RETRY_AFTER': 5,
+    'DEFAULT': {
+        'MAX_INFLIGHT': 16,
+        'MAX_LATENCY': 1.0,
+        'DEEP_PAGE': None,
+        'SHED_ANONYMOUS': False,
+        'PROTECTED': False,
+    },
+    'VIEWS': {
+        'posts:index': {'DEEP_PAGE': 10},
+        'posts:group_posts': {'DEEP_PAGE': 10},
+        'posts:profile': {
+            'MAX_INFLIGHT': 8, 'DEEP_PAGE': 5, 'SHED_ANONYMOUS': True},
+        'posts:follow_index': {'PROTECTED': True},
+    },
+}
+
+# Лимиты частоты записей по scope декоратора core.throttle.throttle:
+# RATE жетонов за период (s, m, h, d), не больше BURST подряд.
+THROTTLE = {
+    'ENABLED': os.getenv('THROTTLE', 'True').lower() in ('1', 'true', 'yes'),
+    'CACHE': 'default',
+    'RATES': {
+        'post_create': {'RATE': '30/h', 'BURST': 10},
+        'add_comment': {'RATE': '120/h', 'BURST': 20},
+        'profile_follow': {'RATE': '200/h', 'BURST': 30},
+        'profile_unfollow': {'RATE': '200/h', 'BURST': 30},
+        'post_like': {'RATE': '600/h', 'BURST': 60},
+        'post_unlike': {'RATE': '600/h', 'BURST': 60},
+    },
+}
+
+# Ключи суррогатного кэша для обратного прокси, см. core.surrogate.
+# С PURGE_URL ключи измененных страниц сбрасываются запросом PURGE.
+SURROGATE = {
+    'HEADER': 'Surrogate-Key',
+    'MAX_AGE': 24 * 60 * 60,
+    'BROWSER_MAX_AGE': 0,
+    'TRANSPORT': 'core.surrogate.NullTransport',
+    'OPTIONS': {},
+}
+
+if os.getenv('PURGE_URL'):
+    SURROGATE['TRANSPORT'] = 'core.surrogate.HTTPPurgeTransport'
+    SURROGATE['OPTIONS'] = {'url': os.getenv('PURGE_URL')}
+
+# Очередь фоновых задач в базе, см. core.jobs и команду run_worker.
+# С JOB_QUEUE=eager задачи выполняются сразу, без воркера.
+JOB_QUEUE = {
+    'EAGER': os.getenv('JOB_QUEUE', '').lower() == 'eager',
+    'CONCURRENCY': 2,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 10,
+    'MAX_BACKOFF': 60 * 60,
+    'LEASE': 10 * 60,
+    'POLL_INTERVAL': 1.0,
+    'CLAIM_BATCH': 10,
+    'RETENTION': 24 * 60 * 60,
+    'EMAIL_BACKEND': 'django.core.mail.backends.filebased.EmailBackend',
+}
+
+# Рассылка записей моделей процессам с локальным кэшем через таблицу
+# core.InvalidationEvent, см. core.invalidation. С общим кэшем не нужна.
+INVALIDATION_BUS = {
+    'ENABLED': os.getenv('INVALIDATION_BUS', '').lower() in (
+        '1', 'true', 'yes'),
+    'INTERVAL': 1.0,
+    'GRACE': 5,
+    'MAX_KEYS': 100,
+    'RETENTION': 60 * 60,
+}
+
+# Просмотры постов копятся в памяти процесса (memory) или в общем
+# кэше (cache, надежнее, сбрасывает rollup_view_counts) и пишутся в
+# базу пачками раз в FLUSH_INTERVAL секунд, см. posts.counters.
+VIEW_COUNTS = {
+    'STORE': os.getenv('VIEW_COUNTS', 'memory'),
+    'FLUSH_INTERVAL': 10,
+    'MAX_PENDING': 1000,
+    'RETENTION': 24 * 60 * 60,
+}
+
+# Число лайков поста разложено по SHARDS строкам LikeCounter, суммы
+# кэшируются на COUNT_TIMEOUT секунд, см. posts.likes.
+LIKES = {
+    'SHARDS': 8,
+    'COUNT_TIMEOUT': 5 * 60,
+}
+
+# Карточки лент старше стольких дней команда archive_feed_items
+# переносит в архив, см. posts.archive.
+FEED_ARCHIVE_DAYS = 365
+
+# Ленты из именованных кортежей posts.cards вместо экземпляров модели,
+# см. команду bench_feed_objects.
+FEED_CARDS = os.getenv('FEED_CARDS', 'True').lower() in ('1', 'true', 'yes')
+
+# Профилирование медленных запросов, см. core.profiling.
+PROFILING = {
+    'ENABLED': os.getenv('PROFILING', '').lower() in ('1', 'true', 'yes'),
+    'MODE': os.getenv('PROFILING_MODE', 'sampler'),
+    'VIEWS': ['posts:'],
+    'SAMPLE_RATE': float(os.getenv('PROFILING_SAMPLE_RATE', '0.0')),
+    'SLOW_MS': float(os.getenv('PROFILING_SLOW_MS', '500')),
+    'INTERVAL_MS': 5,
+    'DIR': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_FILES': 500,
+}
+
+# Метрики Prometheus на /metrics. DIR - общий каталог, через который
+# складываются метрики всех воркеров; без него - только текущий процесс.
+# TOKEN - секрет для заголовка Authorization: Bearer у Prometheus; без
+# него /metrics открыт лишь при DEBUG с адресов INTERNAL_IPS.
+METRICS = {
+    'DIR': os.getenv('METRICS_DIR'),
+    'TOKEN': os.getenv('METRICS_TOKEN'),
+    'FLUSH_INTERVAL': 5,
+}
+
+# Access log в JSON (поля см. core.accesslog). Пишется фоновым потоком
+# через ограниченную очередь; при переполнении записи отбрасываются.
+ACCESS_LOG = os.getenv('ACCESS_LOG')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.accesslog.JSONFormatter'},
+    },
+    'handlers': {},
+    'loggers': {},
+}
+
+if ACCESS_LOG:
+    LOGGING['handlers']['access'] = {
+        'class': 'core.accesslog.BufferedJSONHandler',
+        'formatter': 'json',
+        'filename': ACCESS_LOG,
+        'max_bytes': 50 * 1024 * 1024,
+        'backup_count': 5,
+        'capacity': 10000,
+    }
+    LOGGING['loggers']['yatube.request'] = {
+        'handlers': ['access'],
+        'level': 'INFO',
+        'propagate': False,
+    }
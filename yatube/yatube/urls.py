@@ -3,12 +3,16 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import fragment, metrics
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics', metrics, name='metrics'),
+    path('fragments/<str:name>/', fragment, name='fragment'),
 ]
 
 handler403 = 'core.views.permission_denied'
@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Писатель access log стартует в каждом воркере, а не на первом запросе.
+from core import accesslog  # noqa: E402
+
+accesslog.start()